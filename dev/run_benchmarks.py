@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Benchmark the Data Pipelines
+
+Runs get_dataframe_for_period, _clean_dataframe, analyze_dataframe and the
+merged pipelines on synthetic data (1 day, 30 days, 2 years, 10 years) in a
+local Parquet snapshot, prints wall time, peak memory and documents per
+second, and compares against a saved baseline.
+
+Run with:
+    uv run python dev/run_benchmarks.py --sizes 1d 30d 2y --save-baseline
+    uv run python dev/run_benchmarks.py --sizes 1d 30d 2y          # compare, exit 1 on regression
+
+Snapshots are kept in --data-dir (default: ~/.cache/sweetiepy/benchmarks)
+and regenerated once a day so the relative-period pipelines see data ending
+today. Baselines are machine specific; compare runs from the same machine.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from sweetiepy.utils.benchmark import SIZES, compare_results, load_results, run_suite, save_results
+
+DEFAULT_BASELINE = Path(__file__).parent / 'benchmarks' / 'baseline.json'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sweetiepy data pipelines")
+    parser.add_argument('--sizes', nargs='+', default=['1d', '30d', '2y'], choices=list(SIZES),
+                        help="Data sizes to run (10y takes several minutes to generate)")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per pipeline")
+    parser.add_argument('--only', nargs='+', help="Only run pipelines whose name contains one of these")
+    parser.add_argument('--data-dir', default=Path.home() / '.cache' / 'sweetiepy' / 'benchmarks',
+                        help="Where synthetic snapshots are kept")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help="Save this run as the baseline")
+    parser.add_argument('--output', help="Also save this run's results to a JSON file")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed relative slowdown or memory growth (default 0.25 = 25%%)")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("SWEETIEPY BENCHMARKS")
+    print("=" * 80)
+    results = run_suite(args.data_dir, sizes=args.sizes, repeat=args.repeat, only=args.only)
+
+    if args.output:
+        save_results(results, args.output)
+        print(f"\n✓ Results saved to {args.output}")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        save_results(results, baseline_path)
+        print(f"\n✓ Baseline saved to {baseline_path}")
+        return 0
+
+    if not baseline_path.exists():
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline to create one")
+        return 0
+
+    regressions = compare_results(results, load_results(baseline_path), threshold=args.threshold)
+    if not regressions:
+        print(f"\n✓ No regressions beyond {args.threshold:.0%} of {baseline_path}")
+        return 0
+
+    print(f"\n✗ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+    for r in regressions:
+        print(f"  - {r['benchmark']} {r['metric']}: {r['baseline']} -> {r['current']} (+{r['change']:.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,35 @@
 """SweetiePy - Type 1 Diabetes Data Analysis Package."""
 
+# Avoids importing typing at startup; type checkers treat this as True
+TYPE_CHECKING = False
+
 __version__ = "1.0.0"
 
-# Main data access classes
-from .data import CGMDataAccess, PumpDataAccess
-from .connection.mongodb import MongoDBConnection
+# Main data access classes, imported on first access so that importing the
+# package does not load pandas, numpy or pymongo
+_LAZY_EXPORTS = {
+    'CGMDataAccess': '.data.cgm',
+    'PumpDataAccess': '.data.pump',
+    'MongoDBConnection': '.connection.mongodb',
+}
+
+if TYPE_CHECKING:
+    from .connection.mongodb import MongoDBConnection
+    from .data.cgm import CGMDataAccess
+    from .data.pump import PumpDataAccess
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        from importlib import import_module
+        value = getattr(import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_EXPORTS))
+
 
 __all__ = ['CGMDataAccess', 'PumpDataAccess', 'MongoDBConnection']
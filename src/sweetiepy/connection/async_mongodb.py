@@ -0,0 +1,108 @@
+"""
+Async MongoDB Connection
+
+Counterpart of ``MongoDBConnection`` on PyMongo's native asyncio client
+(``AsyncMongoClient``, PyMongo 4.13+), for web backends that should not
+block a thread per round trip. Settings come from the same environment
+variables as ``MongoDBConnection``.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Optional
+
+from .instrumentation import event_listeners
+from .mongodb import MongoDBConnection
+
+if TYPE_CHECKING:
+    from pymongo import AsyncMongoClient
+
+
+class AsyncMongoDBConnection:
+    """Asyncio MongoDB connection for the async data access classes.
+
+    An AsyncMongoClient belongs to the event loop it was created on, so each
+    connection owns its client (not the process-wide registry); share one
+    connection between data access classes to share its pool.
+
+    Example:
+        conn = AsyncMongoDBConnection()
+        async with AsyncMergedDataAccess(db_conn=conn) as merged:
+            df = await merged.get_merged_cgm_and_settings(days=7)
+    """
+
+    def __init__(self, max_pool_size: Optional[int] = None, min_pool_size: Optional[int] = None,
+                 max_idle_time_ms: Optional[int] = None) -> None:
+        """Initialize connection settings from environment variables.
+
+        Args:
+            max_pool_size: Maximum pooled connections (default 100)
+            min_pool_size: Connections kept open while idle (default 0)
+            max_idle_time_ms: Close pooled connections idle this long
+        """
+        settings = MongoDBConnection(shared=False, max_pool_size=max_pool_size,
+                                     min_pool_size=min_pool_size, max_idle_time_ms=max_idle_time_ms)
+        self.connection_string = settings.connection_string
+        self.database_name = settings.database_name
+        self.username = settings.username
+        self.max_pool_size = settings.max_pool_size
+        self.min_pool_size = settings.min_pool_size
+        self.max_idle_time_ms = settings.max_idle_time_ms
+        self.client: Optional[AsyncMongoClient] = None
+        self.database = None
+
+    async def connect(self) -> bool:
+        """Establish the connection (a no-op when already connected).
+
+        Returns:
+            True if connection successful, False otherwise
+        """
+        if self.client is not None and self.database is not None:
+            return True
+
+        from pymongo import AsyncMongoClient
+
+        client = None
+        try:
+            print(f"Attempting connection to database: {self.database_name}")
+            print(f"Username: {self.username}")
+            client = AsyncMongoClient(
+                self.connection_string,
+                maxPoolSize=self.max_pool_size,
+                minPoolSize=self.min_pool_size,
+                maxIdleTimeMS=self.max_idle_time_ms,
+                serverSelectionTimeoutMS=5000,  # 5 second timeout
+                event_listeners=event_listeners(),
+            )
+            await client.admin.command('ping')
+            self.client = client
+            self.database = client[self.database_name]
+            print(f"✓ Connected to MongoDB database: {self.database_name}")
+            return True
+        except Exception as e:
+            if client is not None:
+                await client.close()
+            print(f"✗ Failed to connect to MongoDB: {e}")
+            return False
+
+    async def disconnect(self) -> None:
+        """Close the connection and its pool."""
+        if self.client:
+            await self.client.close()
+            self.client = None
+            self.database = None
+            print("✓ Disconnected from MongoDB")
+
+    async def list_collections(self) -> List[str]:
+        """List all collections in the current database."""
+        if self.database is None:
+            print("✗ Not connected to database")
+            return []
+
+        try:
+            collections = await self.database.list_collection_names()
+            print(f"Collections in {self.database_name}: {collections}")
+            return collections
+        except Exception as e:
+            print(f"✗ Error listing collections: {e}")
+            return []
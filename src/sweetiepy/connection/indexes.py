@@ -0,0 +1,185 @@
+"""
+Index Advisor
+
+Self-hosted Nightscout databases often lack indexes for the queries this
+library issues, so a time-range query scans the whole collection and sorts
+in memory. This module runs ``explain()`` for each query shape the data
+access classes use, reports collection scans and in-memory sorts, and can
+create the recommended compound indexes.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _query_shapes() -> List[Dict[str, Any]]:
+    """Get the query shapes issued by the data access classes.
+
+    Filters and sorts are built with the same helpers the data access
+    classes use, so the advisor follows any change to their queries. Filter
+    values are representative (the last week); only the shape matters to the
+    query planner.
+    """
+    # Imported here: the data modules import the connection package
+    from ..data.cgm import CGMDataAccess
+    from ..data.pump import _PROFILE_NEWEST_FIRST, PumpDataAccess
+
+    now = datetime.now(timezone.utc)
+    week_ago = now - timedelta(days=7)
+    treatments_by_type, _ = PumpDataAccess._period_query('UTC', None, ['Temp Basal', 'Correction Bolus'],
+                                                         None, week_ago, now, timedelta(0))
+
+    return [
+        {
+            'name': 'CGM readings by time range',
+            'collection': 'entries',
+            'filter': CGMDataAccess._time_range_query(week_ago, now),
+            'sort': [('date', 1)],
+            'index': [('type', 1), ('date', -1)],
+        },
+        {
+            'name': 'Treatments by event type and time range',
+            'collection': 'treatments',
+            'filter': treatments_by_type,
+            'sort': [('timestamp', -1)],
+            'index': [('eventType', 1), ('timestamp', -1)],
+        },
+        {
+            'name': 'Treatments by time range',
+            'collection': 'treatments',
+            'filter': PumpDataAccess._treatments_query('UTC', start_date=week_ago, end_date=now),
+            'sort': [('timestamp', -1)],
+            'index': [('timestamp', -1)],
+        },
+        {
+            'name': 'Latest pump status',
+            'collection': 'devicestatus',
+            'filter': {'pump': {'$exists': True}},
+            'sort': [('created_at', -1)],
+            'limit': 1,
+            'index': [('created_at', -1)],
+        },
+        {
+            'name': 'Latest loop status',
+            'collection': 'devicestatus',
+            'filter': {'loop': {'$exists': True}},
+            'sort': [('created_at', -1)],
+            'limit': 1,
+            'index': [('created_at', -1)],
+        },
+        {
+            'name': 'Profiles by start date',
+            'collection': 'profile',
+            'filter': {},
+            'sort': list(_PROFILE_NEWEST_FIRST),
+            'limit': 1,
+            # The _id tie-break is part of the sort, so the index covers it too
+            'index': list(_PROFILE_NEWEST_FIRST),
+        },
+    ]
+
+
+def plan_stages(plan: Dict[str, Any]) -> List[Tuple[str, Optional[str]]]:
+    """Flatten an explain() plan tree into (stage, index name) pairs.
+
+    Handles both the classic plan format and the slot-based engine format
+    that nests the plan under 'queryPlan'.
+
+    Args:
+        plan: A winning plan from explain() output
+
+    Returns:
+        List of (stage name, index name or None), root first
+    """
+    stages = []
+    pending = [plan]
+    while pending:
+        node = pending.pop(0)
+        if 'queryPlan' in node:
+            node = node['queryPlan']
+        if 'stage' in node:
+            stages.append((node['stage'], node.get('indexName')))
+        if 'inputStage' in node:
+            pending.append(node['inputStage'])
+        pending.extend(node.get('inputStages', []))
+    return stages
+
+
+def _has_index(collection: Any, keys: List[Tuple[str, int]]) -> bool:
+    """Check whether a collection already has an index with exactly these keys."""
+    return any(list(info['key']) == keys for info in collection.index_information().values())
+
+
+def explain_query(collection: Any, shape: Dict[str, Any]) -> Dict[str, Any]:
+    """Explain one query shape and summarize its plan.
+
+    Args:
+        collection: pymongo collection
+        shape: Query shape with 'filter', 'sort' and optional 'limit'
+
+    Returns:
+        Dict with the plan 'stages', 'collscan', 'in_memory_sort' and the
+        'index_used' (None without an index scan)
+    """
+    cursor = collection.find(shape['filter']).sort(shape['sort'])
+    if shape.get('limit'):
+        cursor = cursor.limit(shape['limit'])
+    explain = cursor.explain()
+    stages = plan_stages(explain.get('queryPlanner', {}).get('winningPlan', {}))
+    names = [stage for stage, _ in stages]
+    indexes = [index for stage, index in stages if index]
+    return {
+        'stages': names,
+        'collscan': 'COLLSCAN' in names,
+        'in_memory_sort': 'SORT' in names,
+        'index_used': indexes[0] if indexes else None,
+    }
+
+
+def check_indexes(database: Any, create: bool = False) -> List[Dict[str, Any]]:
+    """Check every query shape against the database's indexes.
+
+    Args:
+        database: pymongo Database
+        create: Create the recommended index for each shape that scans the
+            collection or sorts in memory
+
+    Returns:
+        One report per query shape with 'name', 'collection', the explain()
+        summary, 'recommended_index', 'ok' and 'created'
+    """
+    existing = set(database.list_collection_names())
+    reports = []
+    for shape in _query_shapes():
+        name = shape['collection']
+        report = {'name': shape['name'], 'collection': name,
+                  'recommended_index': shape['index'], 'created': False}
+        if name not in existing:
+            print(f"- {shape['name']}: collection '{name}' not found, skipped")
+            continue
+
+        collection = database[name]
+        try:
+            report.update(explain_query(collection, shape))
+        except Exception as e:
+            print(f"✗ {shape['name']}: explain failed: {e}")
+            continue
+
+        report['ok'] = not (report['collscan'] or report['in_memory_sort'])
+        if report['ok']:
+            print(f"✓ {shape['name']}: uses index {report['index_used']}")
+        else:
+            problems = [p for p, bad in (('COLLSCAN', report['collscan']),
+                                         ('in-memory SORT', report['in_memory_sort'])) if bad]
+            print(f"✗ {shape['name']}: {' + '.join(problems)}; recommended index on {name}: {shape['index']}")
+            if create and not _has_index(collection, shape['index']):
+                try:
+                    index_name = collection.create_index(shape['index'])
+                    report['created'] = True
+                    print(f"  ✓ Created index {index_name}")
+                except Exception as e:
+                    print(f"  ✗ Could not create index: {e}")
+        reports.append(report)
+    return reports
@@ -0,0 +1,235 @@
+"""
+Query Instrumentation
+
+Opt-in metrics for finding slow queries: a ``pymongo.monitoring``
+CommandListener (listener.py) records every command the shared clients
+send (latency, documents returned, getMore round trips, failures, and
+optionally reply sizes in bytes), and stage timers record the time spent
+in the DataFrame builders (fetching, building the frame, cleaning,
+timezone correction, merging).
+
+Enable it before connecting, so new clients are created with the listener
+(or set ``SWEETIEPY_INSTRUMENT=1``)::
+
+    metrics = enable_instrumentation()
+    with CGMDataAccess() as cgm:
+        df = cgm.get_dataframe_for_period('last_month')
+    print(metrics.summary())
+    metrics.to_csv('queries.csv')
+
+Command latency is measured by the driver and includes the network round
+trip and decoding the reply; the '*.fetch' stages add cursor iteration on
+top, and the remaining stages are pandas work.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+# Upper edges (ms) of the latency histogram buckets; the last bucket is open
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+RECORD_FIELDS = ('time', 'kind', 'name', 'collection', 'duration_ms', 'docs', 'bytes', 'ok')
+
+
+def _empty_stats() -> Dict[str, Any]:
+    return {'count': 0, 'failures': 0, 'total_ms': 0.0, 'min_ms': None, 'max_ms': 0.0,
+            'docs': 0, 'bytes': 0, 'histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+
+
+def _bucket(duration_ms: float) -> int:
+    for index, edge in enumerate(LATENCY_BUCKETS_MS):
+        if duration_ms <= edge:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+class QueryMetrics:
+    """Thread-safe collector of command and stage metrics.
+
+    Aggregates are kept per (command, collection) and per stage; the most
+    recent individual calls are kept as records for export.
+
+    Attributes:
+        measure_bytes: Re-encode replies to count their size in bytes
+    """
+
+    def __init__(self, max_records: int = 100_000, measure_bytes: bool = False) -> None:
+        """Create an empty collector.
+
+        Args:
+            max_records: Individual calls kept for to_csv()/to_json()
+            measure_bytes: Count reply sizes. Off by default: the driver does
+                not expose the wire size, so each reply is re-encoded to BSON,
+                which adds noticeable CPU time to large replies
+        """
+        self.measure_bytes = measure_bytes
+        self._lock = threading.Lock()
+        self._commands: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._records: Deque[Dict[str, Any]] = deque(maxlen=max_records)
+
+    def configure(self, max_records: int, measure_bytes: bool) -> None:
+        """Change the record limit and byte counting, keeping what was recorded.
+
+        Args:
+            max_records: Individual calls kept for to_csv()/to_json(); the
+                oldest records are dropped when lowering the limit
+            measure_bytes: Count reply sizes from now on
+        """
+        with self._lock:
+            self.measure_bytes = measure_bytes
+            if self._records.maxlen != max_records:
+                self._records = deque(self._records, maxlen=max_records)
+
+    def _add(self, table: Dict, key: Any, record: Dict[str, Any]) -> None:
+        with self._lock:
+            stats = table.setdefault(key, _empty_stats())
+            duration = record['duration_ms']
+            stats['count'] += 1
+            stats['failures'] += 0 if record['ok'] else 1
+            stats['total_ms'] += duration
+            stats['min_ms'] = duration if stats['min_ms'] is None else min(stats['min_ms'], duration)
+            stats['max_ms'] = max(stats['max_ms'], duration)
+            stats['docs'] += record['docs'] or 0
+            stats['bytes'] += record['bytes'] or 0
+            stats['histogram'][_bucket(duration)] += 1
+            self._records.append(record)
+
+    def record_command(self, name: str, collection: str, duration_ms: float, docs: int = 0,
+                       nbytes: int = 0, ok: bool = True) -> None:
+        """Record one database command."""
+        self._add(self._commands, (name, collection),
+                  {'time': time.time(), 'kind': 'command', 'name': name, 'collection': collection,
+                   'duration_ms': duration_ms, 'docs': docs, 'bytes': nbytes, 'ok': ok})
+
+    def record_stage(self, name: str, duration_ms: float, ok: bool = True) -> None:
+        """Record one timed stage."""
+        self._add(self._stages, name,
+                  {'time': time.time(), 'kind': 'stage', 'name': name, 'collection': '',
+                   'duration_ms': duration_ms, 'docs': 0, 'bytes': 0, 'ok': ok})
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._commands.clear()
+            self._stages.clear()
+            self._records.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        """Get the aggregated metrics.
+
+        Returns:
+            Dict with 'commands' ('<command> <collection>' -> stats, where
+            stats hold count, failures, total/min/max/mean ms, docs, bytes and
+            a latency 'histogram' keyed by bucket upper edge), 'stages'
+            (stage -> the same stats) and 'histogram_buckets_ms'
+        """
+        def finish(stats):
+            result = dict(stats)
+            result['mean_ms'] = stats['total_ms'] / stats['count'] if stats['count'] else 0.0
+            labels = [f'<={edge}' for edge in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}']
+            result['histogram'] = dict(zip(labels, stats['histogram']))
+            return result
+
+        with self._lock:
+            commands = {f'{name} {collection}'.strip(): finish(stats)
+                        for (name, collection), stats in self._commands.items()}
+            stages = {name: finish(stats) for name, stats in self._stages.items()}
+        return {'commands': commands, 'stages': stages, 'histogram_buckets_ms': list(LATENCY_BUCKETS_MS)}
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Get the recorded individual calls, oldest first."""
+        with self._lock:
+            return list(self._records)
+
+    def to_json(self, path: Union[str, Path]) -> None:
+        """Write the summary and the individual calls to a JSON file."""
+        Path(path).write_text(json.dumps({'summary': self.summary(), 'records': self.records()}, indent=2))
+
+    def to_csv(self, path: Union[str, Path]) -> None:
+        """Write the individual calls to a CSV file, one row per call."""
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=RECORD_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records())
+
+
+_metrics: Optional[QueryMetrics] = None
+
+
+def enable_instrumentation(max_records: int = 100_000, measure_bytes: bool = False) -> QueryMetrics:
+    """Start collecting metrics.
+
+    Clients created afterwards (the next connect() with new pool settings,
+    or after close_shared_clients()) carry the command listener; stage
+    timers start recording immediately.
+    When a collector is already active (e.g. from SWEETIEPY_INSTRUMENT=1)
+    it is kept and reconfigured with these arguments.
+
+    Args:
+        max_records: Individual calls kept for export
+        measure_bytes: Count reply sizes in bytes (re-encodes every reply;
+            'bytes' stays 0 otherwise)
+
+    Returns:
+        The active QueryMetrics collector
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = QueryMetrics(max_records=max_records, measure_bytes=measure_bytes)
+    else:
+        _metrics.configure(max_records=max_records, measure_bytes=measure_bytes)
+    return _metrics
+
+
+def disable_instrumentation() -> None:
+    """Stop collecting metrics (instrumented clients keep their listener but record nothing)."""
+    global _metrics
+    _metrics = None
+
+
+def get_metrics() -> Optional[QueryMetrics]:
+    """Get the active collector, or None when instrumentation is off."""
+    return _metrics
+
+
+def event_listeners() -> List[Any]:
+    """Listeners to pass to a new MongoClient (empty when instrumentation is off)."""
+    if _metrics is None:
+        return []
+    # pymongo is only needed once a client is created
+    from .listener import MetricsCommandListener
+    return [MetricsCommandListener()]
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as a named stage when instrumentation is on.
+
+    Args:
+        name: Stage name, e.g. 'cgm.dataframe'
+    """
+    metrics = _metrics
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        metrics.record_stage(name, (time.perf_counter() - start) * 1000, ok=ok)
+
+
+if os.getenv('SWEETIEPY_INSTRUMENT', '').lower() in ('1', 'true', 'yes'):
+    enable_instrumentation()
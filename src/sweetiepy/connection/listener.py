@@ -0,0 +1,75 @@
+"""
+PyMongo Command Listener
+
+Feeds command events from instrumented clients into a ``QueryMetrics``
+collector (see instrumentation.py). Kept separate so pymongo and bson are
+only imported when an instrumented client is created.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import bson
+from pymongo import monitoring
+
+from . import instrumentation
+from .instrumentation import QueryMetrics
+
+
+def _reply_docs(reply: Dict[str, Any]) -> int:
+    """Count the documents in a command reply."""
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', ())))
+    if 'n' in reply and isinstance(reply['n'], int):
+        return reply['n']
+    return 0
+
+
+class MetricsCommandListener(monitoring.CommandListener):
+    """Records pymongo command events in a QueryMetrics collector.
+
+    Without an explicit collector, events go to the active one, so disabling
+    instrumentation takes effect on clients that already carry the listener.
+    """
+
+    def __init__(self, metrics: Optional[QueryMetrics] = None) -> None:
+        self.metrics = metrics
+        self._pending: Dict[Tuple[Any, int], str] = {}
+        self._lock = threading.Lock()
+
+    def _target(self) -> Optional[QueryMetrics]:
+        return self.metrics if self.metrics is not None else instrumentation.get_metrics()
+
+    def started(self, event: Any) -> None:
+        if self._target() is None:
+            return
+        command = event.command
+        if event.command_name == 'getMore':
+            collection = command.get('collection', '')
+        else:
+            collection = command.get(event.command_name, '')
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ''
+
+    def _collection(self, event: Any) -> str:
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), '')
+
+    def succeeded(self, event: Any) -> None:
+        metrics = self._target()
+        collection = self._collection(event)
+        if metrics is None:
+            return
+        reply = event.reply
+        nbytes = len(bson.encode(reply)) if metrics.measure_bytes else 0
+        metrics.record_command(event.command_name, collection, event.duration_micros / 1000,
+                               docs=_reply_docs(reply), nbytes=nbytes)
+
+    def failed(self, event: Any) -> None:
+        metrics = self._target()
+        collection = self._collection(event)
+        if metrics is not None:
+            metrics.record_command(event.command_name, collection, event.duration_micros / 1000, ok=False)
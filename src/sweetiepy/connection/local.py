@@ -0,0 +1,576 @@
+"""
+Local Parquet Backend
+
+Runs the data access classes against Parquet snapshots instead of MongoDB,
+e.g. for offline batch jobs, benchmarks and tests. ``LocalConnection`` has
+the same surface as ``MongoDBConnection`` (``connect()``, ``disconnect()``
+and a ``database`` whose collections support the ``find`` queries the data
+access classes issue), so it can be passed anywhere a ``db_conn`` is
+accepted::
+
+    conn = LocalConnection('~/nightscout-snapshot')
+    with CGMDataAccess(db_conn=conn) as cgm:
+        df = cgm.get_dataframe_for_period('last_week')
+
+Each collection is one ``<root>/<collection>.parquet`` file, read memory
+mapped on first use. Top-level scalar fields are typed columns. Nested
+documents and arrays (devicestatus ``loop``/``pump``, profile ``store``),
+and fields whose type differs between documents (e.g. numbers stored as
+strings by some uploaders), are stored as JSON text and decoded when
+documents are returned, so every value keeps its original type.
+
+Supported filters: equality and ``$eq``, ``$ne``, ``$gt``, ``$gte``, ``$lt``,
+``$lte``, ``$in``, ``$nin`` and ``$exists`` on top-level fields. Filters and
+sorts on JSON fields compare the decoded values the way MongoDB does: values
+of different types are ordered by type (null, numbers, strings, objects,
+arrays, booleans) and range operators only match values of the operand's
+type. Aggregation pipelines are not supported; callers fall back to
+client-side computation when ``supports_aggregation`` is False.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Parquet metadata key listing the columns stored as JSON text
+JSON_COLUMNS_KEY = b'sweetiepy.json_columns'
+
+DEFAULT_COLLECTIONS = ('entries', 'treatments', 'devicestatus', 'profile')
+
+_COMPARISONS = {
+    '$eq': pc.equal,
+    '$ne': pc.not_equal,
+    '$gt': pc.greater,
+    '$gte': pc.greater_equal,
+    '$lt': pc.less,
+    '$lte': pc.less_equal,
+}
+
+
+# MongoDB's comparison order of value types (null first, then numbers, ...)
+_TYPE_ORDER = ((type(None), 0), (bool, 5), ((int, float), 1), (str, 2), (dict, 3), (list, 4))
+
+
+def _type_order(value: Any) -> int:
+    """Rank of a decoded value's type in MongoDB's comparison order."""
+    for kinds, order in _TYPE_ORDER:
+        if isinstance(value, kinds):
+            return order
+    return len(_TYPE_ORDER)
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    """Key that orders decoded values like MongoDB, across value types."""
+    order = _type_order(value)
+    if order == 0:
+        return order, 0
+    if isinstance(value, (dict, list)):
+        return order, json.dumps(value, sort_keys=True, default=str)
+    return order, value
+
+
+def _value_matches(values: List[Any], op: str, operand: Any) -> List[bool]:
+    """Evaluate one operator on decoded values with MongoDB's type rules."""
+    if op in ('$in', '$nin'):
+        keys = [_sort_key(v) for v in operand]
+        found = [_sort_key(v) in keys for v in values]
+        return found if op == '$in' else [not f for f in found]
+    if op not in _COMPARISONS:
+        raise NotImplementedError(f"Unsupported query operator '{op}' in local backend")
+    target = _sort_key(operand)
+    if op == '$eq':
+        return [_sort_key(v) == target for v in values]
+    if op == '$ne':
+        return [_sort_key(v) != target for v in values]
+    compare = {'$gt': lambda a, b: a > b, '$gte': lambda a, b: a >= b,
+               '$lt': lambda a, b: a < b, '$lte': lambda a, b: a <= b}[op]
+    # Range operators never match across types, e.g. {'$gte': 20} skips '5'
+    return [key[0] == target[0] and compare(key, target) for key in map(_sort_key, values)]
+
+
+def _scalar_for(column: pa.ChunkedArray, value: Any) -> pa.Scalar:
+    """Build a comparison scalar of the column's type where possible."""
+    try:
+        return pa.scalar(value).cast(column.type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, TypeError):
+        return pa.scalar(value)
+
+
+def _field_mask(column: Optional[pa.ChunkedArray], condition: Any, num_rows: int,
+                decoded: Optional[List[Any]] = None) -> pa.ChunkedArray:
+    """Evaluate one field's condition to a boolean mask.
+
+    Args:
+        column: The field's column, or None if no document has the field
+        condition: Equality value or operator document
+        num_rows: Number of documents
+        decoded: Decoded values of a JSON column, compared in Python
+    """
+    if not isinstance(condition, dict) or not any(key.startswith('$') for key in condition):
+        condition = {'$eq': condition}
+
+    mask = pa.chunked_array([pa.array([True] * num_rows, pa.bool_())])
+    for op, value in condition.items():
+        if op == '$exists':
+            present = (pc.is_valid(column) if column is not None
+                       else pa.chunked_array([pa.array([False] * num_rows, pa.bool_())]))
+            term = present if value else pc.invert(present)
+        elif column is None:
+            # A missing field only matches "not equal" style conditions
+            matches = op in ('$ne', '$nin')
+            term = pa.chunked_array([pa.array([matches] * num_rows, pa.bool_())])
+        elif decoded is not None:
+            term = pa.chunked_array([pa.array(_value_matches(decoded, op, value), pa.bool_())])
+        elif op in ('$in', '$nin'):
+            values = pa.array(list(value))
+            try:
+                values = values.cast(column.type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                pass
+            term = pc.is_in(column, value_set=values)
+            if op == '$nin':
+                term = pc.invert(term)
+        elif op in _COMPARISONS:
+            term = _COMPARISONS[op](column, _scalar_for(column, value))
+        else:
+            raise NotImplementedError(f"Unsupported query operator '{op}' in local backend")
+        mask = pc.and_(mask, pc.fill_null(term, op in ('$ne', '$nin')))
+    return mask
+
+
+def _json_array(values: List[Any]) -> pa.Array:
+    """Encode values as JSON text, keeping nulls."""
+    return pa.array([None if v is None else json.dumps(v, default=str) for v in values], pa.string())
+
+
+def _encode_column(values: List[Any]) -> Tuple[pa.Array, bool]:
+    """Convert a field's values to an Arrow array, as JSON text if needed.
+
+    Returns:
+        Tuple of (array, stored_as_json)
+    """
+    if any(isinstance(v, (dict, list)) for v in values):
+        return _json_array(values), True
+    try:
+        return pa.array(values), False
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        # Mixed types (e.g. numbers stored as strings in some documents)
+        return _json_array(values), True
+
+
+def _encode_batch(docs: List[Dict[str, Any]]) -> Tuple[pa.Table, List[str]]:
+    """Convert a batch of documents to an Arrow table.
+
+    Returns:
+        Tuple of (table, fields stored as JSON text)
+    """
+    fields = list(dict.fromkeys(field for doc in docs for field in doc))
+    arrays = []
+    json_columns = []
+    for field in fields:
+        values = [doc.get(field) for doc in docs]
+        if field == '_id':
+            values = [None if v is None else str(v) for v in values]
+        array, is_json = _encode_column(values)
+        arrays.append(array)
+        if is_json:
+            json_columns.append(field)
+    return pa.Table.from_arrays(arrays, names=fields), json_columns
+
+
+def _batches(documents: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Group documents into lists of at most batch_size."""
+    batch: List[Dict[str, Any]] = []
+    for doc in documents:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _common_type(types: List[pa.DataType]) -> Optional[pa.DataType]:
+    """Type that every batch's column can be cast to (None if only JSON text fits)."""
+    try:
+        return pa.unify_schemas([pa.schema([('value', t)]) for t in types],
+                                promote_options='permissive').field('value').type
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None
+
+
+def _conform_column(column: pa.ChunkedArray, target: Optional[pa.DataType],
+                    as_json: bool, is_json: bool) -> pa.ChunkedArray:
+    """Convert one batch's column to the collection-wide column type.
+
+    Values are converted the way write_collection would have encoded them had
+    it seen all documents at once: JSON text if any batch held nested values
+    or the batches' types cannot be unified.
+    """
+    if as_json and not is_json:
+        return pa.chunked_array([_json_array(column.to_pylist())], pa.string())
+    return column.cast(target)
+
+
+def write_collection(root: Union[str, Path], name: str, documents: Iterable[Dict[str, Any]],
+                     batch_size: int = 10_000) -> int:
+    """Write documents as a local collection, replacing any existing one.
+
+    Documents are consumed batch by batch, so a cursor over a large
+    collection is never held in memory at once. Each batch is encoded and
+    spilled to a temporary Parquet part; once every field's type is known the
+    parts are conformed to one schema and streamed into the collection file,
+    one part at a time.
+
+    Args:
+        root: Directory holding the local collections
+        name: Collection name
+        documents: Documents to store (``_id`` values are stored as text)
+        batch_size: Documents encoded at a time
+
+    Returns:
+        Number of documents written
+    """
+    path = Path(root).expanduser()
+    path.mkdir(parents=True, exist_ok=True)
+    tmp_path = path / f'{name}.parquet.tmp'
+
+    count = 0
+    field_types: Dict[str, List[pa.DataType]] = {}
+    json_columns: Dict[str, None] = {}
+    with tempfile.TemporaryDirectory(dir=path, prefix=f'.{name}.') as parts_dir:
+        parts = []
+        for index, batch in enumerate(_batches(documents, batch_size)):
+            table, batch_json = _encode_batch(batch)
+            part = Path(parts_dir) / f'{index:06d}.parquet'
+            pq.write_table(table, part)
+            parts.append((part, batch_json))
+            for field in table.schema:
+                field_types.setdefault(field.name, []).append(field.type)
+            json_columns.update(dict.fromkeys(batch_json))
+            count += len(batch)
+
+        targets = {field: pa.string() if field in json_columns else _common_type(types)
+                   for field, types in field_types.items()}
+        # Types that cannot be unified across batches are kept as JSON too
+        json_columns.update(dict.fromkeys(field for field, target in targets.items() if target is None))
+        targets = {field: target or pa.string() for field, target in targets.items()}
+        schema = pa.schema(list(targets.items()),
+                           metadata={JSON_COLUMNS_KEY: json.dumps(list(json_columns)).encode()})
+
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            for part, batch_json in parts:
+                table = pq.read_table(part)
+                columns = []
+                for field, target in targets.items():
+                    if field in table.column_names:
+                        columns.append(_conform_column(table.column(field), target,
+                                                       field in json_columns, field in batch_json))
+                    else:
+                        columns.append(pa.nulls(table.num_rows, schema.field(field).type))
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                part.unlink()
+
+    os.replace(tmp_path, path / f'{name}.parquet')
+    return count
+
+
+def snapshot_database(database: Any, root: Union[str, Path],
+                      collections: Sequence[str] = DEFAULT_COLLECTIONS,
+                      query: Optional[Dict[str, Dict[str, Any]]] = None,
+                      batch_size: int = 10_000) -> Dict[str, int]:
+    """Copy collections from a MongoDB database into a local snapshot.
+
+    Each collection is streamed from its cursor into the Parquet writer in
+    batches (see write_collection), so memory use depends on ``batch_size``
+    rather than on the collection size.
+
+    Args:
+        database: pymongo Database (e.g. ``MongoDBConnection().database``)
+        root: Directory to write the snapshot to
+        collections: Collection names to copy
+        query: Optional filter per collection name
+        batch_size: Documents fetched and encoded at a time
+
+    Returns:
+        Number of documents written per collection
+    """
+    counts = {}
+    for name in collections:
+        cursor = database[name].find((query or {}).get(name, {})).batch_size(batch_size)
+        try:
+            counts[name] = write_collection(root, name, cursor, batch_size=batch_size)
+        finally:
+            cursor.close()
+        print(f"✓ Wrote {counts[name]} documents to {name}.parquet")
+    return counts
+
+
+class LocalCursor:
+    """Lazy query result with the pymongo cursor methods the library uses."""
+
+    def __init__(self, collection: LocalCollection, query: Dict[str, Any],
+                 projection: Optional[Dict[str, Any]]) -> None:
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._limit = 0
+        self._skip = 0
+
+    def sort(self, key_or_list: Union[str, List[Tuple[str, int]]], direction: int = 1) -> LocalCursor:
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def limit(self, limit: int) -> LocalCursor:
+        self._limit = limit
+        return self
+
+    def skip(self, skip: int) -> LocalCursor:
+        self._skip = skip
+        return self
+
+    def batch_size(self, batch_size: int) -> LocalCursor:
+        return self
+
+    def close(self) -> None:
+        pass
+
+    def to_table(self) -> pa.Table:
+        """Run the query and return the matching rows as an Arrow table."""
+        return self._collection._run(self._query, self._projection, self._sort, self._skip, self._limit)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._collection._to_documents(self.to_table()))
+
+
+class LocalCollection:
+    """A collection stored in one Parquet file, queried with Arrow compute."""
+
+    def __init__(self, path: Path, name: str) -> None:
+        self.path = path
+        self.name = name
+        self._table: Optional[pa.Table] = None
+        self._json_columns: List[str] = []
+        self._decoded: Dict[str, List[Any]] = {}
+
+    @property
+    def table(self) -> pa.Table:
+        """The whole collection (memory mapped, loaded on first use)."""
+        if self._table is None:
+            if self.path.exists():
+                self._table = pq.read_table(self.path, memory_map=True)
+                metadata = self._table.schema.metadata or {}
+                self._json_columns = json.loads(metadata.get(JSON_COLUMNS_KEY, b'[]'))
+            else:
+                self._table = pa.table({})
+        return self._table
+
+    def _values(self, table: pa.Table, field: str) -> List[Any]:
+        """Get a column as Python values, decoding JSON text."""
+        values = table.column(field).to_pylist()
+        if field in self._json_columns:
+            values = [None if v is None else json.loads(v) for v in values]
+        return values
+
+    def _mask(self, query: Dict[str, Any]) -> Optional[pa.ChunkedArray]:
+        table = self.table
+        mask = None
+        for field, condition in (query or {}).items():
+            if field.startswith('$'):
+                raise NotImplementedError(f"Unsupported top-level operator '{field}' in local backend")
+            column = table.column(field) if field in table.column_names else None
+            decoded = None
+            if column is not None and field in self._json_columns:
+                if field not in self._decoded:
+                    self._decoded[field] = self._values(table, field)
+                decoded = self._decoded[field]
+            term = _field_mask(column, condition, table.num_rows, decoded)
+            mask = term if mask is None else pc.and_(mask, term)
+        return mask
+
+    def _run(self, query: Dict[str, Any], projection: Optional[Dict[str, Any]],
+             sort: List[Tuple[str, int]], skip: int, limit: int) -> pa.Table:
+        table = self.table
+        mask = self._mask(query)
+        if mask is not None:
+            table = table.filter(mask)
+
+        sort = [(field, direction) for field, direction in sort if field in table.column_names]
+        if sort and table.num_rows:
+            if any(field in self._json_columns for field, _ in sort):
+                # Mixed value types are ordered in Python, least significant key first
+                order = list(range(table.num_rows))
+                for field, direction in reversed(sort):
+                    keys = [_sort_key(v) for v in self._values(table, field)]
+                    order.sort(key=keys.__getitem__, reverse=direction < 0)
+                table = table.take(order)
+            else:
+                table = table.sort_by([(field, 'ascending' if direction >= 0 else 'descending')
+                                       for field, direction in sort])
+        if skip:
+            table = table.slice(skip)
+        if limit:
+            table = table.slice(0, limit)
+
+        if projection:
+            included = [f for f, keep in projection.items() if keep and f in table.column_names]
+            if included:
+                if projection.get('_id', 1) and '_id' in table.column_names and '_id' not in included:
+                    included.insert(0, '_id')
+                table = table.select(included)
+            else:
+                excluded = {f for f, keep in projection.items() if not keep}
+                table = table.select([c for c in table.column_names if c not in excluded])
+        return table
+
+    def _to_documents(self, table: pa.Table) -> List[Dict[str, Any]]:
+        docs = table.to_pylist()
+        json_columns = [c for c in self._json_columns if c in table.column_names]
+        for doc in docs:
+            for field in list(doc):
+                value = doc[field]
+                if value is None:
+                    # Parquet has no "missing" field; drop nulls like MongoDB would
+                    del doc[field]
+                elif field in json_columns:
+                    doc[field] = json.loads(value)
+        return docs
+
+    def find(self, filter: Optional[Dict[str, Any]] = None,
+             projection: Optional[Dict[str, Any]] = None) -> LocalCursor:
+        """Query documents (see the module docstring for supported filters)."""
+        return LocalCursor(self, filter or {}, projection)
+
+    def find_one(self, filter: Optional[Dict[str, Any]] = None,
+                 projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        docs = list(self.find(filter, projection).limit(1))
+        return docs[0] if docs else None
+
+    def find_columnar(self, query: Dict[str, Any], schema: Dict[str, str],
+                      sort: Optional[List[Tuple[str, int]]] = None,
+                      limit: Optional[int] = None) -> pd.DataFrame:
+        """Decode a query straight into typed columns (used by columnar.find_columnar)."""
+        table = self._run(query, None, sort or [], 0, limit or 0)
+        columns = {}
+        for field, kind in schema.items():
+            if field in self._json_columns and field in table.column_names:
+                values = pd.Series(self._values(table, field), dtype=object)
+                columns[field] = (pd.to_numeric(values, errors='coerce').astype('float64')
+                                  if kind == 'float64' else values)
+            elif field in table.column_names:
+                column = table.column(field)
+                if kind == 'float64':
+                    columns[field] = pd.to_numeric(column.to_pandas(), errors='coerce').astype('float64')
+                else:
+                    columns[field] = column.cast(pa.string()).to_pandas().astype(object)
+            else:
+                columns[field] = pd.Series([None] * table.num_rows,
+                                           dtype='float64' if kind == 'float64' else object)
+        return pd.DataFrame(columns)
+
+    def count_documents(self, filter: Dict[str, Any]) -> int:
+        mask = self._mask(filter)
+        return self.table.num_rows if mask is None else pc.sum(mask).as_py() or 0
+
+    def estimated_document_count(self) -> int:
+        return self.table.num_rows
+
+    def list_indexes(self) -> List[Dict[str, Any]]:
+        return []
+
+    def index_information(self) -> Dict[str, Any]:
+        return {}
+
+    def aggregate(self, pipeline: List[Dict[str, Any]]) -> Any:
+        raise NotImplementedError("Aggregation pipelines are not supported by the local backend")
+
+
+class LocalDatabase:
+    """Directory of local collections, accessed like a pymongo Database."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.name = root.name
+        self._collections: Dict[str, LocalCollection] = {}
+
+    def __getitem__(self, name: str) -> LocalCollection:
+        if name not in self._collections:
+            self._collections[name] = LocalCollection(self.root / f'{name}.parquet', name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> LocalCollection:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def list_collection_names(self) -> List[str]:
+        return sorted(path.name[:-len('.parquet')] for path in self.root.glob('*.parquet'))
+
+
+class LocalConnection:
+    """Drop-in replacement for MongoDBConnection backed by local Parquet files.
+
+    Attributes:
+        root: Snapshot directory
+        database: LocalDatabase once connected
+        database_name: Name of the snapshot directory
+    """
+
+    # Aggregation pipelines are not available; callers compute client-side
+    supports_aggregation = False
+
+    def __init__(self, root: Union[str, Path]) -> None:
+        """Initialize a connection to a snapshot directory.
+
+        Args:
+            root: Directory holding ``<collection>.parquet`` files
+        """
+        self.root = Path(root).expanduser()
+        self.client = None
+        self.database: Optional[LocalDatabase] = None
+        self.database_name = self.root.name
+
+    def connect(self) -> bool:
+        """Open the snapshot directory.
+
+        Returns:
+            True if the directory exists, False otherwise
+        """
+        if self.database is not None:
+            return True
+        if not self.root.is_dir():
+            print(f"✗ Local data directory not found: {self.root}")
+            return False
+        self.database = LocalDatabase(self.root)
+        print(f"✓ Opened local data: {self.root}")
+        return True
+
+    def disconnect(self) -> None:
+        """Release the loaded collections."""
+        if self.database is not None:
+            self.database = None
+            print("✓ Closed local data")
+
+    def list_databases(self) -> List[str]:
+        return [self.database_name]
+
+    def list_collections(self) -> List[str]:
+        if self.database is None:
+            print("✗ Not connected to database")
+            return []
+        collections = self.database.list_collection_names()
+        print(f"Collections in {self.database_name}: {collections}")
+        return collections
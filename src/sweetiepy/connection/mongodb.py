@@ -1,19 +1,186 @@
+from __future__ import annotations
+
+import atexit
 import os
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import quote_plus
-from dotenv import load_dotenv
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 
-# Load environment variables from .env file
-load_dotenv()
+from .indexes import check_indexes
+from .instrumentation import event_listeners
+
+if TYPE_CHECKING:
+    from pymongo import MongoClient
+
+# pymongo and python-dotenv are imported on first use, so importing the
+# package stays cheap for short-lived workers
+_env_loaded = False
+
+
+def load_environment() -> None:
+    """Load environment variables from a .env file, once per process.
+    
+    Variables already set in the environment take precedence.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    _env_loaded = True
+
+# Process-wide registry of MongoClients, so every data access class talking to
+# the same cluster shares one connection pool instead of opening its own.
+_client_registry: Dict[Tuple, MongoClient] = {}
+_registry_lock = threading.Lock()
+_registry_pid = os.getpid()
+
+
+def _reset_registry_after_fork() -> None:
+    """Forget inherited clients in a forked child.
+    
+    MongoClient is not fork-safe: a child must open its own pools rather than
+    reuse (or close) the parent's sockets.
+    """
+    global _registry_lock, _registry_pid
+    _client_registry.clear()
+    _registry_lock = threading.Lock()
+    _registry_pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_registry_after_fork)
+
+
+def get_shared_client(connection_string: str, max_pool_size: int = 100, min_pool_size: int = 0,
+                      max_idle_time_ms: Optional[int] = None,
+                      server_selection_timeout_ms: int = 5000,
+                      ping: bool = True) -> Tuple[MongoClient, bool]:
+    """Get the process-wide MongoClient for a connection string.
+    
+    Clients are keyed by connection string and pool options, created on
+    first use and reused afterwards. While instrumentation is enabled, new
+    clients carry its command listener (see instrumentation.py).
+    
+    A new client is pinged before it is registered, while the registry lock
+    is held, so a concurrent caller never gets a client that has not been
+    checked yet: it waits for the ping and then reuses the client. A client
+    whose ping fails is closed and never registered.
+    
+    Args:
+        connection_string: MongoDB connection URI
+        max_pool_size: Maximum connections in the pool (maxPoolSize)
+        min_pool_size: Connections kept open while idle (minPoolSize)
+        max_idle_time_ms: Close pooled connections idle this long (maxIdleTimeMS)
+        server_selection_timeout_ms: Server selection timeout
+        ping: Ping a new client before registering it
+        
+    Returns:
+        Tuple of (client, created) where created is True for a new client
+        
+    Raises:
+        pymongo.errors.PyMongoError: If the ping of a new client fails
+    """
+    if os.getpid() != _registry_pid:
+        # Fallback for platforms without os.register_at_fork
+        _reset_registry_after_fork()
+    
+    from pymongo import MongoClient
+    
+    listeners = event_listeners()
+    key = (connection_string, max_pool_size, min_pool_size, max_idle_time_ms, bool(listeners))
+    with _registry_lock:
+        client = _client_registry.get(key)
+        if client is not None:
+            return client, False
+        
+        client = MongoClient(
+            connection_string,
+            maxPoolSize=max_pool_size,
+            minPoolSize=min_pool_size,
+            maxIdleTimeMS=max_idle_time_ms,
+            serverSelectionTimeoutMS=server_selection_timeout_ms,
+            event_listeners=listeners,
+        )
+        if ping:
+            try:
+                client.admin.command('ping')
+            except Exception:
+                client.close()
+                raise
+        _client_registry[key] = client
+        return client, True
+
+
+def discard_shared_client(client: MongoClient) -> None:
+    """Remove a client from the process-wide registry and close it.
+    
+    Args:
+        client: Client previously returned by get_shared_client
+    """
+    with _registry_lock:
+        for key, registered in list(_client_registry.items()):
+            if registered is client:
+                del _client_registry[key]
+    client.close()
+
+
+def close_shared_clients() -> None:
+    """Close every client in the process-wide registry."""
+    with _registry_lock:
+        clients = list(_client_registry.values())
+        _client_registry.clear()
+    for client in clients:
+        client.close()
+
+
+atexit.register(close_shared_clients)
+
+
+def build_projection(fields: Optional[Iterable[str]]) -> Optional[Dict[str, int]]:
+    """Build a MongoDB projection that returns only the given fields.
+    
+    Args:
+        fields: Field names to return, or None for whole documents
+        
+    Returns:
+        Projection dict (excluding '_id' unless requested), or None
+    """
+    if fields is None:
+        return None
+    
+    projection = {field: 1 for field in fields}
+    if '_id' not in projection:
+        projection['_id'] = 0
+    return projection
 
 
 class MongoDBConnection:
-    """Handle MongoDB connection and basic operations for diabetes data analysis."""
+    """Handle MongoDB connection and basic operations for diabetes data analysis.
+    
+    By default connections share a process-wide MongoClient (see
+    get_shared_client), so several data access classes reuse one pool and
+    only the first connect() pays for the ping round trip.
+    
+    Pool sizes can be passed in or set with the MONGODB_MAX_POOL_SIZE,
+    MONGODB_MIN_POOL_SIZE and MONGODB_MAX_IDLE_TIME_MS environment variables.
+    """
     
-    def __init__(self):
+    def __init__(self, shared: bool = True, max_pool_size: Optional[int] = None,
+                 min_pool_size: Optional[int] = None, max_idle_time_ms: Optional[int] = None):
+        """Initialize connection settings from environment variables.
+        
+        Args:
+            shared: Use the process-wide client registry (False opens a
+                private client that disconnect() closes)
+            max_pool_size: Maximum pooled connections (default 100)
+            min_pool_size: Connections kept open while idle (default 0)
+            max_idle_time_ms: Close pooled connections idle this long
+        """
+        load_environment()
         self.client = None
         self.database = None
+        self.shared = shared
         self.username = os.getenv('MONGODB_USERNAME')
         self.password = os.getenv('MONGODB_PW')
         self.uri_template = os.getenv('MONGODB_URI')
@@ -22,22 +189,60 @@ class MongoDBConnection:
         if not all([self.username, self.password, self.uri_template]):
             raise ValueError("MONGODB_USERNAME, MONGODB_PW, and MONGODB_URI environment variables are required")
         
+        # Explicit arguments win, including 0 (an unbounded pool for maxPoolSize)
+        if max_pool_size is None:
+            max_pool_size = int(os.getenv('MONGODB_MAX_POOL_SIZE', 100))
+        if min_pool_size is None:
+            min_pool_size = int(os.getenv('MONGODB_MIN_POOL_SIZE', 0))
+        if max_idle_time_ms is None:
+            idle_env = os.getenv('MONGODB_MAX_IDLE_TIME_MS')
+            max_idle_time_ms = int(idle_env) if idle_env else None
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self.max_idle_time_ms = max_idle_time_ms
+        
         # Build connection string with URL-encoded credentials
         encoded_username = quote_plus(self.username)
         encoded_password = quote_plus(self.password)
         self.connection_string = self.uri_template.replace('<username>', encoded_username).replace('<password>', encoded_password)
     
     def connect(self):
-        """Establish connection to MongoDB."""
+        """Establish connection to MongoDB.
+        
+        Calling connect() on an already connected instance is a no-op, so one
+        connection can be handed to several data access classes.
+        """
+        if self.client is not None and self.database is not None:
+            return True
+        
         try:
             print(f"Attempting connection to database: {self.database_name}")
             print(f"Username: {self.username}")
-            self.client = MongoClient(
-                self.connection_string,
-                serverSelectionTimeoutMS=5000  # 5 second timeout
-            )
-            # Test the connection
-            self.client.admin.command('ping')
+            if self.shared:
+                # A new shared client is pinged inside the registry
+                client, _ = get_shared_client(
+                    self.connection_string,
+                    max_pool_size=self.max_pool_size,
+                    min_pool_size=self.min_pool_size,
+                    max_idle_time_ms=self.max_idle_time_ms,
+                )
+            else:
+                from pymongo import MongoClient
+                client = MongoClient(
+                    self.connection_string,
+                    maxPoolSize=self.max_pool_size,
+                    minPoolSize=self.min_pool_size,
+                    maxIdleTimeMS=self.max_idle_time_ms,
+                    serverSelectionTimeoutMS=5000,  # 5 second timeout
+                    event_listeners=event_listeners(),
+                )
+                # Test the connection
+                try:
+                    client.admin.command('ping')
+                except Exception:
+                    client.close()
+                    raise
+            self.client = client
             self.database = self.client[self.database_name]
             print(f"✓ Connected to MongoDB database: {self.database_name}")
             return True
@@ -46,9 +251,16 @@ class MongoDBConnection:
             return False
     
     def disconnect(self):
-        """Close the MongoDB connection."""
+        """Close the MongoDB connection.
+        
+        A shared client stays open in the registry for reuse; its idle
+        connections are pruned by the pool.
+        """
         if self.client:
-            self.client.close()
+            if not self.shared:
+                self.client.close()
+            self.client = None
+            self.database = None
             print("✓ Disconnected from MongoDB")
     
     def list_databases(self):
@@ -79,6 +291,32 @@ class MongoDBConnection:
             print(f"✗ Error listing collections: {e}")
             return []
 
+    def check_indexes(self, create: bool = False) -> List[Dict[str, Any]]:
+        """Explain the library's query shapes and report missing indexes.
+        
+        Reports queries that scan a whole collection (COLLSCAN) or sort in
+        memory, with the compound index that would serve them.
+        
+        Args:
+            create: Also create the recommended indexes that are missing
+            
+        Returns:
+            One report dict per query shape (see indexes.check_indexes)
+        """
+        if self.database is None:
+            print("✗ Not connected to database")
+            return []
+        
+        return check_indexes(self.database, create=create)
+    
+    def ensure_indexes(self) -> List[Dict[str, Any]]:
+        """Create the recommended indexes for queries that need them.
+        
+        Returns:
+            One report dict per query shape
+        """
+        return self.check_indexes(create=True)
+
 
 def test_connection():
     """Test the MongoDB connection setup."""
@@ -1,6 +1,30 @@
 """Loopy data access modules for CGM and pump data."""
 
-from .cgm import CGMDataAccess
-from .pump import PumpDataAccess
+# Avoids importing typing at startup; type checkers treat this as True
+TYPE_CHECKING = False
 
-__all__ = ['CGMDataAccess', 'PumpDataAccess']
\ No newline at end of file
+# Imported on first access (see the package __init__)
+_LAZY_EXPORTS = {
+    'CGMDataAccess': '.cgm',
+    'PumpDataAccess': '.pump',
+}
+
+if TYPE_CHECKING:
+    from .cgm import CGMDataAccess
+    from .pump import PumpDataAccess
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        from importlib import import_module
+        value = getattr(import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_EXPORTS))
+
+
+__all__ = ['CGMDataAccess', 'PumpDataAccess']
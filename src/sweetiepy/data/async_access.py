@@ -0,0 +1,763 @@
+"""
+Async Data Access
+
+Asyncio counterparts of ``CGMDataAccess``, ``PumpDataAccess`` and
+``MergedDataAccess`` on PyMongo's ``AsyncMongoClient``, for web backends
+that should not block a thread per MongoDB round trip.
+
+Methods that talk to the database are coroutines with the same names and
+arguments as their synchronous versions. Query building and DataFrame
+processing are shared with the synchronous classes, so both return the same
+results. DataFrame building, cleaning and the merged feature columns are
+CPU-bound, so they run in a worker thread (``asyncio.to_thread``) instead of
+blocking the event loop. ``AsyncMergedDataAccess`` fetches CGM readings and
+the profile history concurrently. Treatments cover the readings' exact span,
+so they are fetched as soon as the readings arrive, while the profiles may
+still be loading; a merged dataset takes about as long as the readings plus
+the treatments instead of the sum of every query.
+
+``AsyncPumpDataAccess`` covers every ``PumpDataAccess`` query, including
+``get_treatment_tables``, ``get_delivery_timeline`` and
+``get_daily_insulin_totals``. Only the synchronous classes have the schema
+helpers (``explore_schema``, ``get_collection_info``), the single-timestamp
+``get_active_*_at_time`` lookups, ``columnar`` decoding and the Parquet
+entries store.
+
+Example:
+    async with AsyncMergedDataAccess() as merged:
+        df = await merged.get_merged_with_recent_treatments(days=7)
+"""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from ..connection.async_mongodb import AsyncMongoDBConnection
+from ..connection.instrumentation import stage
+from ..connection.mongodb import build_projection
+from .cgm import (DEFAULT_DOWNSAMPLE_STATS, DEFAULT_ENTRY_FIELDS, PERIODS, CGMDataAccess,
+                  _CLEAN_REQUIRED_FIELDS, _downsample_buckets_frame, _downsample_locally,
+                  _downsample_pipeline, _downsample_result, _downsample_spec, _histogram_bounds,
+                  _histogram_pipeline, _period_analysis, _temporal_facets_pipeline)
+from .delivery import DeliveryTimeline, daily_insulin_totals
+from .merged import (add_settings_columns, add_treatment_context, analyze_settings_correlation,
+                     reading_span, treatment_padding)
+from .pump import (DEFAULT_TREATMENT_FIELDS, DELIVERY_EVENT_TYPES, PumpDataAccess,
+                   _PROFILE_HISTORY_PROJECTION, _PROFILE_NEWEST_FIRST, _PROFILE_OLDEST_FIRST,
+                   _current_profile_pipeline, _profile_history_pipeline, _split_by_event_type)
+from .schedule import ProfileSchedule, ProfileSnapshot, ProfileTimeline, profile_version
+
+
+class AsyncCGMDataAccess:
+    """Async access to CGM readings in the entries collection.
+
+    Example:
+        async with AsyncCGMDataAccess() as cgm:
+            df = await cgm.get_dataframe_for_period('last_week')
+    """
+
+    def __init__(self, db_conn: Optional[AsyncMongoDBConnection] = None) -> None:
+        """Initialize CGM data access.
+
+        Args:
+            db_conn: Optional existing async connection (e.g. one shared with
+                other async data access classes)
+        """
+        self.db_conn = db_conn if db_conn is not None else AsyncMongoDBConnection()
+        self.collection = None
+        # Query building and DataFrame processing are shared with the sync class
+        self._sync = CGMDataAccess(db_conn=self.db_conn)
+
+    async def __aenter__(self) -> AsyncCGMDataAccess:
+        """Async context manager entry - connect to database."""
+        if not await self.connect():
+            raise ConnectionError("Failed to connect to MongoDB database")
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """Async context manager exit - disconnect from database."""
+        await self.disconnect()
+
+    async def connect(self) -> bool:
+        """Connect to the database and entries collection.
+
+        Returns:
+            True if connection successful, False otherwise
+        """
+        if await self.db_conn.connect():
+            self.collection = self.db_conn.database['entries']
+            print("✓ Connected to CGM entries collection")
+            return True
+        return False
+
+    async def disconnect(self) -> None:
+        """Disconnect from the database."""
+        await self.db_conn.disconnect()
+        self.collection = None
+
+    async def get_recent_readings(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the most recent CGM readings, newest first."""
+        if self.collection is None:
+            print("✗ Not connected to collection")
+            return []
+
+        try:
+            readings = await self.collection.find().sort("date", -1).limit(limit).to_list(None)
+            print(f"✓ Retrieved {len(readings)} recent readings")
+            return readings
+        except Exception as e:
+            print(f"✗ Error retrieving readings: {e}")
+            return []
+
+    async def get_readings_by_time_range(self, start_time: Union[datetime, int], end_time: Union[datetime, int],
+                                         limit: Optional[int] = None,
+                                         fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Get CGM readings within a time range (see CGMDataAccess.get_readings_by_time_range)."""
+        if self.collection is None:
+            print("✗ Not connected to collection")
+            return []
+
+        query = self._sync._time_range_query(start_time, end_time)
+        try:
+            cursor = self.collection.find(query, build_projection(fields)).sort("date", 1)
+            if limit:
+                cursor = cursor.limit(limit)
+            with stage('cgm.fetch'):
+                readings = await cursor.to_list(None)
+            print(f"✓ Retrieved {len(readings)} readings from "
+                  f"{datetime.fromtimestamp(query['date']['$gte'] / 1000)} to "
+                  f"{datetime.fromtimestamp(query['date']['$lte'] / 1000)}")
+            return readings
+        except Exception as e:
+            print(f"✗ Error querying time range: {e}")
+            return []
+
+    async def get_readings_for_date(self, target_date: Any,
+                                    fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Get all CGM readings for a local calendar day (a date or datetime)."""
+        start_time, end_time = self._sync._day_window(target_date)
+        return await self.get_readings_by_time_range(start_time, end_time, fields=fields)
+
+    def get_readings_summary(self, readings: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Summarize a list of readings (no I/O, see CGMDataAccess.get_readings_summary)."""
+        return self._sync.get_readings_summary(readings)
+
+    async def get_last_24_hours(self, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Get readings from the last 24 hours."""
+        end_time = datetime.now()
+        return await self.get_readings_by_time_range(end_time - PERIODS['last_24h'], end_time, fields=fields)
+
+    async def get_last_week(self, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Get readings from the last 7 days."""
+        end_time = datetime.now()
+        return await self.get_readings_by_time_range(end_time - PERIODS['last_week'], end_time, fields=fields)
+
+    async def get_last_month(self, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Get readings from the last 30 days."""
+        end_time = datetime.now()
+        return await self.get_readings_by_time_range(end_time - PERIODS['last_month'], end_time, fields=fields)
+
+    async def get_dataframe_for_period(self, period_type: str = 'last_week', start_date: Optional[datetime] = None,
+                                       end_date: Optional[datetime] = None, clean_data: bool = True,
+                                       fields: Optional[Sequence[str]] = DEFAULT_ENTRY_FIELDS) -> pd.DataFrame:
+        """Get a cleaned DataFrame for a period (see CGMDataAccess.get_dataframe_for_period).
+
+        Args:
+            period_type: 'last_24h', 'last_week', 'last_month', or 'custom'
+            start_date: For custom period (datetime object)
+            end_date: For custom period (datetime object)
+            clean_data: Whether to apply data cleaning
+            fields: Fields to fetch from the server; None fetches whole documents
+
+        Returns:
+            pandas.DataFrame: CGM data for the period
+        """
+        if fields is not None and clean_data:
+            fields = list(fields) + [f for f in _CLEAN_REQUIRED_FIELDS if f not in fields]
+
+        window = self._sync._resolve_period(period_type, start_date, end_date)
+        if window is None:
+            print("✗ Invalid period_type or missing dates for custom period")
+            return pd.DataFrame()
+
+        readings = await self.get_readings_by_time_range(window[0], window[1], fields=fields)
+        return await asyncio.to_thread(self.to_dataframe, readings, clean_data, fields)
+
+    def iter_readings(self, start_time: Union[datetime, int], end_time: Union[datetime, int],
+                      chunk_size: int = 10000, clean_data: bool = False,
+                      fields: Optional[Sequence[str]] = DEFAULT_ENTRY_FIELDS) -> AsyncIterator[pd.DataFrame]:
+        """Stream readings in a time range as bounded-size DataFrame chunks.
+
+        Use with ``async for`` (see CGMDataAccess.iter_readings).
+
+        Raises:
+            ValueError: If chunk_size is not positive (raised on the call,
+                before iteration starts)
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        return self._iter_readings(start_time, end_time, chunk_size, clean_data, fields)
+
+    async def _iter_readings(self, start_time: Union[datetime, int], end_time: Union[datetime, int],
+                             chunk_size: int, clean_data: bool,
+                             fields: Optional[Sequence[str]]) -> AsyncIterator[pd.DataFrame]:
+        if self.collection is None:
+            print("✗ Not connected to collection")
+            return
+
+        if fields is not None and clean_data:
+            fields = list(fields) + [f for f in _CLEAN_REQUIRED_FIELDS if f not in fields]
+        columns = list(fields) if fields is not None else None
+
+        query = self._sync._time_range_query(start_time, end_time)
+        cursor = self.collection.find(query, build_projection(fields)).sort("date", 1).batch_size(chunk_size)
+        fetched = kept = chunks = 0
+        try:
+            chunk = []
+            async for doc in cursor:
+                chunk.append(doc)
+                if len(chunk) >= chunk_size:
+                    df = await asyncio.to_thread(self._sync._readings_chunk, chunk, columns, clean_data)
+                    fetched, kept, chunks = fetched + len(chunk), kept + len(df), chunks + 1
+                    yield df
+                    chunk = []
+            if chunk:
+                df = await asyncio.to_thread(self._sync._readings_chunk, chunk, columns, clean_data)
+                fetched, kept, chunks = fetched + len(chunk), kept + len(df), chunks + 1
+                yield df
+        finally:
+            await cursor.close()
+        self._sync._print_stream_summary(fetched, kept, chunks)
+
+    def iter_dataframe_for_period(self, period_type: str = 'last_week', start_date: Optional[datetime] = None,
+                                  end_date: Optional[datetime] = None, chunk_size: int = 10000,
+                                  clean_data: bool = False,
+                                  fields: Optional[Sequence[str]] = DEFAULT_ENTRY_FIELDS) -> AsyncIterator[pd.DataFrame]:
+        """Stream CGM data for a period as DataFrame chunks (see CGMDataAccess.iter_dataframe_for_period).
+
+        Raises:
+            ValueError: If chunk_size is not positive
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        return self._iter_period(period_type, start_date, end_date, chunk_size, clean_data, fields)
+
+    async def _iter_period(self, period_type: str, start_date: Optional[datetime],
+                           end_date: Optional[datetime], chunk_size: int, clean_data: bool,
+                           fields: Optional[Sequence[str]]) -> AsyncIterator[pd.DataFrame]:
+        window = self._sync._resolve_period(period_type, start_date, end_date)
+        if window is None:
+            print("✗ Invalid period_type or missing dates for custom period")
+            return
+
+        async for chunk in self._iter_readings(window[0], window[1], chunk_size, clean_data, fields):
+            yield chunk
+
+    async def _aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        cursor = await self.collection.aggregate(pipeline)
+        return await cursor.to_list(None)
+
+    async def analyze_period(self, period_type: str = 'last_week', start_date: Optional[datetime] = None,
+                             end_date: Optional[datetime] = None, server_side: bool = True) -> Dict[str, Any]:
+        """Analyze a period with aggregation pipelines (see CGMDataAccess.analyze_period).
+
+        Returns:
+            dict: Analysis summary with the same keys as analyze_dataframe
+        """
+        if not server_side or not getattr(self.db_conn, 'supports_aggregation', True):
+            df = await self.get_dataframe_for_period(period_type, start_date, end_date)
+            return await asyncio.to_thread(self.analyze_dataframe, df)
+
+        if self.collection is None:
+            print("✗ Not connected to collection")
+            return {"error": "Not connected"}
+
+        window = self._sync._resolve_period(period_type, start_date, end_date)
+        if window is None:
+            print("✗ Invalid period_type or missing dates for custom period")
+            return {"error": "Invalid period"}
+
+        query = self._sync._time_range_query(*window)
+        histogram = await self._aggregate(_histogram_pipeline(query))
+        bounds = _histogram_bounds(histogram)
+        if bounds is None:
+            return {"error": "Empty DataFrame"}
+
+        facets = (await self._aggregate(_temporal_facets_pipeline(query, *bounds)))[0]
+        return _period_analysis(histogram, bounds, facets)
+
+    async def get_downsampled(self, start_date: datetime, end_date: datetime, bucket: str = '1h',
+                              stats: Sequence[str] = DEFAULT_DOWNSAMPLE_STATS,
+                              server_side: bool = True) -> pd.DataFrame:
+        """Get glucose statistics per time bucket (see CGMDataAccess.get_downsampled).
+
+        Raises:
+            ValueError: If the bucket or a statistic is not supported
+        """
+        from pymongo.errors import OperationFailure
+
+        bucket_ms, columns, quantiles = _downsample_spec(bucket, stats)
+
+        if self.collection is None:
+            print("✗ Not connected to collection")
+            return pd.DataFrame(columns=columns)
+
+        query = self._sync._time_range_query(start_date, end_date)
+
+        if not server_side or not getattr(self.db_conn, 'supports_aggregation', True):
+            docs = await self.collection.find(query, build_projection(['date', 'sgv'])).to_list(None)
+            df = pd.DataFrame(docs, columns=['date', 'sgv']).apply(pd.to_numeric, errors='coerce').astype('float64')
+            result = await asyncio.to_thread(_downsample_locally, df, bucket_ms, columns[2:], quantiles)
+        else:
+            with stage('cgm.downsample'):
+                try:
+                    buckets = await self._aggregate(
+                        _downsample_pipeline(query, bucket_ms, columns[2:], quantiles, percentile=True))
+                except OperationFailure:
+                    # $percentile needs MongoDB 7.0
+                    buckets = await self._aggregate(
+                        _downsample_pipeline(query, bucket_ms, columns[2:], quantiles, percentile=False))
+            result = _downsample_buckets_frame(buckets, columns[2:], quantiles)
+
+        print(f"✓ Downsampled to {len(result)} {bucket} buckets")
+        return _downsample_result(result, columns)
+
+    def to_dataframe(self, readings: List[Dict[str, Any]], clean_data: bool = True,
+                     fields: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Convert readings to a DataFrame (no I/O, see CGMDataAccess.to_dataframe)."""
+        return self._sync.to_dataframe(readings, clean_data=clean_data, fields=fields)
+
+    def analyze_dataframe(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Summarize a CGM DataFrame (no I/O, see CGMDataAccess.analyze_dataframe)."""
+        return self._sync.analyze_dataframe(df)
+
+
+class AsyncPumpDataAccess:
+    """Async access to pump treatments, profiles and device status.
+
+    Example:
+        async with AsyncPumpDataAccess() as pump:
+            df = await pump.get_dataframe_for_period('last_week')
+    """
+
+    def __init__(self, db_conn: Optional[AsyncMongoDBConnection] = None,
+                 timezone: Optional[str] = None,
+                 dst_ambiguous: Union[bool, str] = False,
+                 dst_nonexistent: str = 'shift_forward',
+                 profile_check_interval: float = 60.0) -> None:
+        """Initialize pump data access.
+
+        Args:
+            db_conn: Optional existing async connection
+            timezone: The pump's local timezone (see PumpDataAccess)
+            dst_ambiguous: How to resolve repeated wall-clock times when DST ends
+            dst_nonexistent: How to resolve skipped wall-clock times when DST starts
+            profile_check_interval: Seconds a cached profile is trusted before
+                its version is checked again (see PumpDataAccess)
+        """
+        self.db_conn = db_conn if db_conn is not None else AsyncMongoDBConnection()
+        self.database = None
+        # Query building, timestamp correction and the profile caches are
+        # shared with the sync class
+        self._sync = PumpDataAccess(db_conn=self.db_conn, timezone=timezone,
+                                    dst_ambiguous=dst_ambiguous, dst_nonexistent=dst_nonexistent,
+                                    profile_check_interval=profile_check_interval)
+        self.timezone = self._sync.timezone
+
+    async def __aenter__(self) -> AsyncPumpDataAccess:
+        """Async context manager entry - connect to database."""
+        if not await self.connect():
+            raise ConnectionError("Failed to connect to MongoDB database")
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """Async context manager exit - disconnect from database."""
+        await self.disconnect()
+
+    async def connect(self) -> bool:
+        """Connect to the MongoDB database.
+
+        Returns:
+            bool: True if connection successful, False otherwise
+        """
+        if not await self.db_conn.connect():
+            return False
+
+        self.database = self.db_conn.database
+        return True
+
+    async def disconnect(self) -> None:
+        """Disconnect from the MongoDB database."""
+        await self.db_conn.disconnect()
+        self.database = None
+
+    def _require_connection(self) -> None:
+        if self.database is None:
+            raise ConnectionError("Not connected to database. Call connect() first.")
+
+    async def get_treatments(self, limit: int = 10, event_type: Optional[str] = None,
+                             start_date: Optional[datetime] = None,
+                             end_date: Optional[datetime] = None,
+                             fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Get treatment documents, newest first (see PumpDataAccess.get_treatments)."""
+        self._require_connection()
+        query = self._sync._treatments_query(self._sync.timezone, event_type, start_date, end_date)
+        cursor = self.database.treatments.find(query, build_projection(fields)).sort('timestamp', -1).limit(limit)
+        return await cursor.to_list(None)
+
+    async def _recent_treatments(self, event_type: str, days: int) -> List[Dict[str, Any]]:
+        end_date = self._sync._to_utc(datetime.now())
+        return await self.get_treatments(event_type=event_type, start_date=end_date - timedelta(days=days),
+                                         end_date=end_date, limit=1000)
+
+    async def get_bolus_data(self, days: int = 7) -> List[Dict[str, Any]]:
+        """Get bolus documents for the last ``days`` days."""
+        return await self._recent_treatments('Correction Bolus', days)
+
+    async def get_basal_data(self, days: int = 7) -> List[Dict[str, Any]]:
+        """Get temp basal documents for the last ``days`` days."""
+        return await self._recent_treatments('Temp Basal', days)
+
+    async def get_carb_data(self, days: int = 7) -> List[Dict[str, Any]]:
+        """Get carb documents for the last ``days`` days."""
+        return await self._recent_treatments('Carb Correction', days)
+
+    async def get_site_change_data(self, days: int = 30) -> List[Dict[str, Any]]:
+        """Get site change documents for the last ``days`` days."""
+        return await self._recent_treatments('Site Change', days)
+
+    async def get_dataframe_for_period(self, period: Optional[str] = None,
+                                       event_types: Optional[List[str]] = None,
+                                       fields: Optional[Sequence[str]] = DEFAULT_TREATMENT_FIELDS,
+                                       start_date: Optional[datetime] = None,
+                                       end_date: Optional[datetime] = None,
+                                       padding: timedelta = timedelta(0)) -> pd.DataFrame:
+        """Get treatments as a DataFrame (see PumpDataAccess.get_dataframe_for_period).
+
+        Returns:
+            pandas.DataFrame: Treatment data with corrected 'dateTime' values
+        """
+        query, fields = self._sync._period_query(self._sync.timezone, period, event_types, fields,
+                                                 start_date, end_date, padding)
+        self._require_connection()
+
+        cursor = self.database.treatments.find(query, build_projection(fields)).sort('timestamp', -1)
+        with stage('pump.fetch'):
+            treatments = await cursor.to_list(None)
+        return await asyncio.to_thread(self._sync._treatments_frame, treatments, fields)
+
+    async def get_treatment_tables(self, event_types: Optional[Sequence[str]] = None,
+                                   days: int = 7,
+                                   start_date: Optional[datetime] = None,
+                                   end_date: Optional[datetime] = None,
+                                   fields_by_type: Optional[Dict[str, Sequence[str]]] = None
+                                   ) -> Dict[str, pd.DataFrame]:
+        """Get several treatment types in one query, one table per type (see
+        PumpDataAccess.get_treatment_tables).
+
+        Returns:
+            Dict mapping each requested event type to a DataFrame
+        """
+        self._require_connection()
+        query, columns, union_fields = self._sync._treatment_tables_query(event_types, days, start_date,
+                                                                          end_date, fields_by_type)
+
+        cursor = self.database.treatments.find(query, build_projection(union_fields)).sort('timestamp', -1)
+        with stage('pump.fetch'):
+            docs = await cursor.to_list(None)
+
+        def build() -> Dict[str, pd.DataFrame]:
+            return self._sync._treatment_tables(_split_by_event_type(docs, columns), columns)
+
+        return await asyncio.to_thread(build)
+
+    async def _fetch_delivery(self, days: int, start_date: Optional[datetime],
+                              end_date: Optional[datetime]) -> Tuple[DeliveryTimeline, pd.DataFrame]:
+        """Build the delivery timeline and return it with the bolus table."""
+        start_date, end_date = self._sync._delivery_window(days, start_date, end_date)
+        # The day before the window catches temp basals already running at its start
+        tables, profile_timeline = await asyncio.gather(
+            self.get_treatment_tables(DELIVERY_EVENT_TYPES, start_date=start_date - timedelta(days=1),
+                                      end_date=end_date),
+            self.get_profile_timeline(),
+        )
+        timeline = await asyncio.to_thread(self._sync._delivery_timeline, profile_timeline, tables,
+                                           start_date, end_date)
+        return timeline, tables['Correction Bolus']
+
+    async def get_delivery_timeline(self, days: int = 7, start_date: Optional[datetime] = None,
+                                    end_date: Optional[datetime] = None) -> DeliveryTimeline:
+        """Get the basal insulin the pump actually delivered (see PumpDataAccess.get_delivery_timeline)."""
+        timeline, _ = await self._fetch_delivery(days, start_date, end_date)
+        return timeline
+
+    async def get_daily_insulin_totals(self, days: int = 7, start_date: Optional[datetime] = None,
+                                       end_date: Optional[datetime] = None) -> pd.DataFrame:
+        """Get delivered basal, bolus and total insulin per local day (see
+        PumpDataAccess.get_daily_insulin_totals).
+        """
+        timeline, boluses = await self._fetch_delivery(days, start_date, end_date)
+        return await asyncio.to_thread(daily_insulin_totals, timeline, boluses, timezone=self.timezone)
+
+    async def get_current_profile(self) -> Optional[Dict[str, Any]]:
+        """Get the most recent profile document, or None."""
+        self._require_connection()
+        profile = await self.database.profile.find().sort(_PROFILE_NEWEST_FIRST).limit(1).to_list(None)
+        return profile[0] if profile else None
+
+    async def get_profile_version(self) -> Optional[Tuple[Any, Any]]:
+        """Get (startDate, _id) of the newest stored profile, or None."""
+        self._require_connection()
+        cursor = self.database.profile.find({}, {'startDate': 1}).sort(_PROFILE_NEWEST_FIRST).limit(1)
+        latest = await cursor.to_list(None)
+        return profile_version(latest[0]) if latest else None
+
+    async def _checked_profile_version(self) -> Optional[Tuple[Any, Any]]:
+        """Get the newest profile version, querying at most once per check interval."""
+        fresh, version = self._sync._recent_profile_version()
+        if not fresh:
+            version = await self.get_profile_version()
+            self._sync._record_profile_version(version)
+        return version
+
+    async def _load_current_profile(self) -> Optional[Dict[str, Any]]:
+        if not getattr(self.db_conn, 'supports_aggregation', True):
+            cursor = self.database.profile.find({}, _PROFILE_HISTORY_PROJECTION).sort(_PROFILE_NEWEST_FIRST).limit(1)
+        else:
+            cursor = await self.database.profile.aggregate(_current_profile_pipeline())
+        latest = await cursor.to_list(None)
+        return latest[0] if latest else None
+
+    async def get_profile_snapshot(self) -> ProfileSnapshot:
+        """Get the current profile's compiled schedules (see PumpDataAccess.get_profile_snapshot)."""
+        self._require_connection()
+        snapshot = self._sync._profile_snapshot
+        if snapshot is None or snapshot.version != await self._checked_profile_version():
+            snapshot = ProfileSnapshot.from_profile(await self._load_current_profile())
+            self._sync._profile_snapshot = snapshot
+            self._sync._record_profile_version(snapshot.version)
+        return snapshot
+
+    async def get_profile_history(self) -> List[Dict[str, Any]]:
+        """Get every profile document, oldest first, projected to the schedules."""
+        self._require_connection()
+
+        if not getattr(self.db_conn, 'supports_aggregation', True):
+            cursor = self.database.profile.find({}, _PROFILE_HISTORY_PROJECTION).sort(_PROFILE_OLDEST_FIRST)
+            return await cursor.to_list(None)
+
+        cursor = await self.database.profile.aggregate(_profile_history_pipeline())
+        return await cursor.to_list(None)
+
+    async def get_profile_timeline(self) -> ProfileTimeline:
+        """Get the compiled history of profile settings, reloaded when a newer profile is stored."""
+        sync = self._sync
+        if (sync._profile_timeline is not None and
+                sync._profile_timeline_version == await self._checked_profile_version()):
+            return sync._profile_timeline
+
+        history = await self.get_profile_history()
+        sync._profile_timeline = ProfileTimeline.from_profiles(history)
+        sync._profile_timeline_version = profile_version(history[-1]) if history else None
+        sync._record_profile_version(sync._profile_timeline_version)
+        return sync._profile_timeline
+
+    async def get_basal_profile(self) -> List[Dict[str, Any]]:
+        """Get the basal schedule of the current profile."""
+        return (await self.get_profile_snapshot()).basal
+
+    async def get_carb_ratio_profile(self) -> List[Dict[str, Any]]:
+        """Get the carb ratio schedule of the current profile."""
+        return (await self.get_profile_snapshot()).carb_ratio
+
+    async def get_insulin_sensitivity_profile(self) -> List[Dict[str, Any]]:
+        """Get the insulin sensitivity schedule of the current profile."""
+        return (await self.get_profile_snapshot()).isf
+
+    async def _recent_status(self, field: str, limit: int) -> List[Dict[str, Any]]:
+        self._require_connection()
+        cursor = self.database.devicestatus.find({field: {'$exists': True}}).sort('created_at', -1).limit(limit)
+        return await cursor.to_list(None)
+
+    async def get_recent_pump_status(self, limit: int = 1) -> List[Dict[str, Any]]:
+        """Get the most recent pump status documents."""
+        return await self._recent_status('pump', limit)
+
+    async def get_recent_loop_status(self, limit: int = 1) -> List[Dict[str, Any]]:
+        """Get the most recent loop status documents."""
+        return await self._recent_status('loop', limit)
+
+    async def _loop_value(self, section: str, key: str) -> Optional[float]:
+        status = await self.get_recent_loop_status(1)
+        if not status or 'loop' not in status[0] or section not in status[0]['loop']:
+            return None
+        return status[0]['loop'][section].get(key)
+
+    async def get_insulin_on_board(self) -> Optional[float]:
+        """Get the current insulin on board (IOB) reported by Loop."""
+        return await self._loop_value('iob', 'iob')
+
+    async def get_carbs_on_board(self) -> Optional[float]:
+        """Get the current carbs on board (COB) reported by Loop."""
+        return await self._loop_value('cob', 'cob')
+
+    async def get_current_basal_rate(self) -> Optional[float]:
+        """Get the basal rate Loop last enacted."""
+        return await self._loop_value('enacted', 'rate')
+
+    def analyze_treatments(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Summarize a treatment DataFrame (no I/O, see PumpDataAccess.analyze_treatments)."""
+        return self._sync.analyze_treatments(df)
+
+
+class AsyncMergedDataAccess:
+    """Async CGM data merged with the pump settings in effect at each reading.
+
+    CGM readings, treatments and the profile history are fetched
+    concurrently over one shared connection.
+
+    Example:
+        async with AsyncMergedDataAccess() as merged:
+            df = await merged.get_merged_cgm_and_settings(days=7)
+    """
+
+    def __init__(self, db_conn: Optional[AsyncMongoDBConnection] = None,
+                 profile_check_interval: float = 60.0) -> None:
+        """Initialize merged data access.
+
+        Args:
+            db_conn: Optional existing async connection shared by CGM and pump access
+            profile_check_interval: Seconds cached profiles are trusted before
+                the newest profile version is checked again
+        """
+        self.db_conn = db_conn if db_conn is not None else AsyncMongoDBConnection()
+        self.cgm = AsyncCGMDataAccess(db_conn=self.db_conn)
+        self.pump = AsyncPumpDataAccess(db_conn=self.db_conn, profile_check_interval=profile_check_interval)
+        self.database = None
+
+    async def __aenter__(self) -> AsyncMergedDataAccess:
+        """Async context manager entry - connect to database."""
+        if not await self.connect():
+            raise ConnectionError("Failed to connect to MongoDB database")
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """Async context manager exit - disconnect from database."""
+        await self.disconnect()
+
+    async def connect(self) -> bool:
+        """Connect the shared connection and both data sources.
+
+        Returns:
+            bool: True if connection successful, False otherwise
+        """
+        if not await self.db_conn.connect():
+            return False
+        if not await self.cgm.connect() or not await self.pump.connect():
+            await self.db_conn.disconnect()
+            return False
+
+        self.database = self.db_conn.database
+        return True
+
+    async def disconnect(self) -> None:
+        """Disconnect from the database."""
+        await self.db_conn.disconnect()
+        self.cgm.collection = None
+        self.pump.database = None
+        self.database = None
+
+    async def _load_settings(self) -> Tuple[Optional[ProfileTimeline],
+                                            Tuple[ProfileSchedule, ProfileSchedule, ProfileSchedule]]:
+        """Load the profile history, or the current profile's schedules without one."""
+        try:
+            timeline = await self.pump.get_profile_timeline()
+        except Exception as e:
+            print(f"Warning: Could not load profile history: {e}")
+            timeline = None
+
+        snapshot = ProfileSnapshot({})
+        if not timeline:
+            try:
+                snapshot = await self.pump.get_profile_snapshot()
+            except Exception as e:
+                print(f"Warning: Could not load current profile: {e}")
+        return timeline, tuple(snapshot.schedules[key] for key in ProfileSnapshot.SETTINGS)
+
+    async def get_merged_cgm_and_settings(self, days: int = 7) -> pd.DataFrame:
+        """Get CGM data with the settings in effect at each reading.
+
+        The readings and the profile history are fetched concurrently; see
+        MergedDataAccess.get_merged_cgm_and_settings for the columns.
+
+        Args:
+            days: Number of days of data to retrieve
+
+        Returns:
+            DataFrame of CGM readings with active settings
+        """
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        cgm_df, (timeline, schedules) = await asyncio.gather(
+            self.cgm.get_dataframe_for_period('custom', start_date=start_date, end_date=end_date),
+            self._load_settings(),
+        )
+
+        if cgm_df.empty:
+            return pd.DataFrame()
+
+        with stage('merged.settings'):
+            return await asyncio.to_thread(add_settings_columns, cgm_df, timeline, schedules,
+                                           self.pump.timezone)
+
+    async def get_merged_with_recent_treatments(self, days: int = 7,
+                                                lookback_hours: Union[int, Sequence[int]] = 4,
+                                                include_onboard: bool = False) -> pd.DataFrame:
+        """Get CGM data with settings and recent treatment context.
+
+        Readings and the profile history are fetched concurrently. Treatments
+        cover the readings' exact span plus the longest lookback, and are
+        fetched as soon as the readings arrive.
+
+        Args:
+            days: Number of days of data to retrieve
+            lookback_hours: Lookback window(s) in hours for the treatment totals
+            include_onboard: Also add reconstructed 'iob' and 'cob' columns
+
+        Returns:
+            DataFrame as returned by MergedDataAccess.get_merged_with_recent_treatments
+        """
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        settings_task = asyncio.create_task(self._load_settings())
+        try:
+            cgm_df = await self.cgm.get_dataframe_for_period('custom', start_date=start_date, end_date=end_date)
+        except BaseException:
+            settings_task.cancel()
+            raise
+        if cgm_df.empty:
+            settings_task.cancel()
+            return pd.DataFrame()
+
+        first, last = reading_span(cgm_df)
+        treatments_task = asyncio.create_task(self.pump.get_dataframe_for_period(
+            start_date=first, end_date=last, padding=treatment_padding(lookback_hours, include_onboard)))
+        try:
+            timeline, schedules = await settings_task
+            with stage('merged.settings'):
+                df = await asyncio.to_thread(add_settings_columns, cgm_df, timeline, schedules,
+                                             self.pump.timezone)
+        except BaseException:
+            treatments_task.cancel()
+            raise
+        treatments_df = await treatments_task
+        return await asyncio.to_thread(add_treatment_context, df, treatments_df, lookback_hours,
+                                       include_onboard, timeline or schedules[0], self.pump.timezone)
+
+    def analyze_settings_correlation(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Analyze settings against glucose outcomes (no I/O, see analyze_settings_correlation)."""
+        return analyze_settings_correlation(df)
@@ -0,0 +1,402 @@
+"""
+Local CGM Data Caches
+
+Almost all CGM readings are immutable history, so repeatedly pulling the same
+period from MongoDB wastes network time. This module keeps readings locally:
+
+- EntriesParquetStore: an on-disk store partitioned by UTC day in Parquet
+  files. It remembers which range it covers and only fetches readings newer
+  than its high-water mark of ``date`` (plus a small overlap for late
+  backfilled readings).
+- DayPartitionCache: an in-process cache of whole UTC days. Days that closed
+  long enough ago are immutable and kept under an LRU memory budget; only the
+  open days at the end of a rolling window are re-queried, incrementally.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from ..connection.mongodb import build_projection
+from .columnar import ENTRY_SCHEMA, schema_for
+
+# pyarrow is imported by the store methods on first use, so importing the
+# data access classes does not load the Parquet reader and writer
+
+MS_PER_DAY = 86400 * 1000
+
+# Columns kept in the local store
+STORE_FIELDS = ('date', 'dateString', 'sgv', 'direction', 'trend', 'type')
+_STORE_SCHEMA = schema_for(STORE_FIELDS, ENTRY_SCHEMA)
+
+
+def _normalize_entries(df: pd.DataFrame) -> pd.DataFrame:
+    """Give a frame the stored columns and types."""
+    df = df.reindex(columns=list(_STORE_SCHEMA))
+    for field, kind in _STORE_SCHEMA.items():
+        if kind == 'float64':
+            df[field] = pd.to_numeric(df[field], errors='coerce').astype('float64')
+        else:
+            df[field] = df[field].astype(object).where(df[field].notna(), None)
+    return df
+
+
+def _fetch_entries(collection: Any, query: Dict[str, Any]) -> pd.DataFrame:
+    """Fetch sensor readings with the stored columns, sorted by date."""
+    cursor = collection.find(query, build_projection(STORE_FIELDS)).sort('date', 1)
+    return pd.DataFrame(list(cursor), columns=list(STORE_FIELDS))
+
+
+class EntriesParquetStore:
+    """On-disk store of CGM entries, partitioned by UTC day in Parquet files.
+
+    Layout::
+
+        <root>/_meta.json                 covered range and high-water mark
+        <root>/day=2024-03-01/part.parquet
+        <root>/day=2024-03-02/part.parquet
+        ...
+
+    The store covers every reading from ``low_water_mark`` onwards. Syncing
+    fetches only readings with ``date`` after the high-water mark (minus
+    ``overlap_ms`` to pick up readings the CGM uploads late), plus any older
+    range a query asks for that is not yet covered. Partitions are rewritten
+    atomically, so a crash never leaves a half-written file. The store
+    assumes a single writer process.
+
+    Attributes:
+        root: Store directory
+        overlap_ms: How far behind the high-water mark each sync re-reads
+
+    Example:
+        store = EntriesParquetStore('~/.cache/sweetiepy/entries')
+        store.sync(cgm.collection, start_ms)
+        df = store.read(start_ms, end_ms)
+    """
+
+    def __init__(self, root: Union[str, Path], overlap_ms: int = 3 * 3600 * 1000) -> None:
+        """Initialize the store.
+
+        Args:
+            root: Directory holding the store (created if needed)
+            overlap_ms: How far behind the high-water mark each sync re-reads
+                (default 3 hours, the longest Dexcom backfill)
+        """
+        self.root = Path(root).expanduser()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.overlap_ms = overlap_ms
+        import pyarrow as pa
+        self._arrow_schema = pa.schema([
+            (field, pa.float64() if kind == 'float64' else pa.string())
+            for field, kind in _STORE_SCHEMA.items()
+        ])
+        self._meta = self._load_meta()
+
+    @property
+    def low_water_mark(self) -> Optional[int]:
+        """Earliest time (ms) from which the store holds every reading."""
+        return self._meta.get('low_water_mark')
+
+    @property
+    def high_water_mark(self) -> Optional[int]:
+        """Latest reading time (ms) in the store."""
+        return self._meta.get('high_water_mark')
+
+    def _load_meta(self) -> Dict[str, Any]:
+        meta_path = self.root / '_meta.json'
+        if meta_path.exists():
+            with open(meta_path) as f:
+                return json.load(f)
+        return {}
+
+    def _save_meta(self) -> None:
+        meta_path = self.root / '_meta.json'
+        tmp_path = meta_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def _partition_path(self, day: int) -> Path:
+        day_str = pd.Timestamp(day * MS_PER_DAY, unit='ms').strftime('%Y-%m-%d')
+        return self.root / f'day={day_str}' / 'part.parquet'
+
+    def write(self, df: pd.DataFrame) -> int:
+        """Merge readings into their day partitions.
+
+        Args:
+            df: Readings with at least 'date' (ms) and 'sgv'
+
+        Returns:
+            Number of readings written
+        """
+        if df.empty:
+            return 0
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        df = _normalize_entries(df).dropna(subset=['date'])
+        days = (df['date'].to_numpy() // MS_PER_DAY).astype(np.int64)
+
+        for day in np.unique(days):
+            part = df[days == day]
+            path = self._partition_path(int(day))
+            if path.exists():
+                part = pd.concat([pd.read_parquet(path), part], ignore_index=True)
+            part = part.drop_duplicates(subset=['date'], keep='last').sort_values('date')
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            pq.write_table(pa.Table.from_pandas(part, schema=self._arrow_schema, preserve_index=False),
+                           tmp_path)
+            os.replace(tmp_path, path)
+
+        return len(df)
+
+    def sync(self, collection: Any, start_ms: Optional[int] = None) -> int:
+        """Bring the store up to date with the entries collection.
+
+        Args:
+            collection: pymongo entries collection
+            start_ms: Earliest time (ms) the caller needs; older uncovered
+                readings are fetched once. Defaults to the current coverage
+                (or the whole history for an empty store).
+
+        Returns:
+            Number of readings fetched from the server
+        """
+        low = self.low_water_mark
+        high = self.high_water_mark
+        fetched = 0
+
+        if low is None:
+            # Empty store: fetch everything from the requested start
+            query: Dict[str, Any] = {'type': 'sgv'}
+            if start_ms is not None:
+                query['date'] = {'$gte': start_ms}
+            df = _fetch_entries(collection, query)
+            fetched += self.write(df)
+            self._meta['low_water_mark'] = int(start_ms) if start_ms is not None else 0
+            self._meta['high_water_mark'] = int(df['date'].max()) if not df.empty else self._meta['low_water_mark']
+            self._save_meta()
+            return fetched
+
+        if start_ms is not None and start_ms < low:
+            # Backfill history older than anything stored so far
+            df = _fetch_entries(collection, {'type': 'sgv', 'date': {'$gte': start_ms, '$lt': low}})
+            fetched += self.write(df)
+            self._meta['low_water_mark'] = int(start_ms)
+
+        # New readings since the high-water mark
+        df = _fetch_entries(collection, {'type': 'sgv', 'date': {'$gt': high - self.overlap_ms}})
+        fetched += self.write(df)
+        if not df.empty:
+            self._meta['high_water_mark'] = max(high, int(df['date'].max()))
+        self._save_meta()
+        return fetched
+
+    def covers(self, start_ms: int) -> bool:
+        """Check whether the store holds every reading from ``start_ms`` on."""
+        return self.low_water_mark is not None and self.low_water_mark <= start_ms
+
+    def read(self, start_ms: int, end_ms: int, fields: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Read readings in a time range from the local partitions.
+
+        Args:
+            start_ms: Range start (Unix ms, inclusive)
+            end_ms: Range end (Unix ms, inclusive)
+            fields: Columns to read (default: all stored columns)
+
+        Returns:
+            pandas.DataFrame of readings sorted by date
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = list(fields) if fields is not None else list(STORE_FIELDS)
+        read_columns = columns if 'date' in columns else columns + ['date']
+
+        tables: List[pa.Table] = []
+        for day in range(int(start_ms // MS_PER_DAY), int(end_ms // MS_PER_DAY) + 1):
+            path = self._partition_path(day)
+            if path.exists():
+                tables.append(pq.read_table(path, columns=read_columns, memory_map=True))
+
+        if not tables:
+            return pd.DataFrame(columns=columns)
+
+        df = pa.concat_tables(tables).to_pandas()
+        df = df[(df['date'] >= start_ms) & (df['date'] <= end_ms)].sort_values('date')
+        return df[columns].reset_index(drop=True)
+
+
+class DayPartitionCache:
+    """In-process cache of CGM entries split into whole UTC days.
+
+    Rolling windows such as "last 7 days" start at a different instant on
+    every call, so the query itself can never be reused. The days inside the
+    window can: a day is *closed* once it ended more than ``settle_ms`` ago
+    (late CGM backfills have arrived by then) and its readings never change.
+
+    - Closed days are fetched once (consecutive missing days in one query)
+      and kept in an LRU under ``max_bytes``.
+    - Open days are kept too, but refreshed on every call with only the
+      readings after the newest one already held.
+    - When an open day closes, it is fetched once more in full, so any
+      readings backfilled late are included before it is frozen.
+
+    The cache assumes a single thread per instance.
+
+    Attributes:
+        max_bytes: Memory budget for closed days
+        settle_ms: Time after a day ends before it is treated as closed
+
+    Example:
+        cache = DayPartitionCache(max_bytes=64 * 2**20)
+        df = cache.get(cgm.collection, start_ms, end_ms)
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20, settle_ms: int = 3 * 3600 * 1000) -> None:
+        """Initialize an empty cache.
+
+        Args:
+            max_bytes: Memory budget for closed days (default 64 MiB, about
+                two years of readings)
+            settle_ms: Time after a day ends before it is treated as closed
+                (default 3 hours, the longest Dexcom backfill)
+        """
+        self.max_bytes = max_bytes
+        self.settle_ms = settle_ms
+        self._closed: OrderedDict[int, pd.DataFrame] = OrderedDict()
+        self._closed_bytes = 0
+        self._open: Dict[int, pd.DataFrame] = {}
+        self._open_high_water: Optional[int] = None
+        self.stats = {'hits': 0, 'misses': 0, 'fetched': 0}
+
+    def __len__(self) -> int:
+        return len(self._closed) + len(self._open)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by closed days."""
+        return self._closed_bytes
+
+    def clear(self) -> None:
+        """Drop every cached day."""
+        self._closed.clear()
+        self._closed_bytes = 0
+        self._open.clear()
+        self._open_high_water = None
+
+    def _split_days(self, df: pd.DataFrame, days: range) -> Dict[int, pd.DataFrame]:
+        """Split readings into per-day frames (empty frames for days without any)."""
+        df = _normalize_entries(df).dropna(subset=['date'])
+        day_of = (df['date'].to_numpy() // MS_PER_DAY).astype(np.int64)
+        return {day: df[day_of == day].reset_index(drop=True) for day in days}
+
+    def _store_closed(self, day: int, df: pd.DataFrame) -> None:
+        self._closed[day] = df
+        self._closed_bytes += int(df.memory_usage(deep=True).sum())
+
+    def _evict(self) -> None:
+        while self._closed_bytes > self.max_bytes and len(self._closed) > 1:
+            _, df = self._closed.popitem(last=False)
+            self._closed_bytes -= int(df.memory_usage(deep=True).sum())
+
+    def _load_closed(self, collection: Any, days: List[int]) -> None:
+        """Fetch missing closed days, one query per run of consecutive days."""
+        missing = [day for day in days if day not in self._closed]
+        self.stats['hits'] += len(days) - len(missing)
+        self.stats['misses'] += len(missing)
+
+        runs: List[List[int]] = []
+        for day in missing:
+            if runs and day == runs[-1][-1] + 1:
+                runs[-1].append(day)
+            else:
+                runs.append([day])
+
+        for run in runs:
+            df = _fetch_entries(collection, {'type': 'sgv', 'date': {
+                '$gte': run[0] * MS_PER_DAY, '$lt': (run[-1] + 1) * MS_PER_DAY}})
+            self.stats['fetched'] += len(df)
+            for day, part in self._split_days(df, range(run[0], run[-1] + 1)).items():
+                self._open.pop(day, None)
+                self._store_closed(day, part)
+
+        for day in days:
+            self._closed.move_to_end(day)
+
+    def _refresh_open(self, collection: Any, first_open_day: int, now_ms: int) -> None:
+        """Bring the open days up to date, fetching only readings not yet held."""
+        # Days that closed since the last call get re-fetched in full as closed days
+        for day in [day for day in self._open if day < first_open_day]:
+            del self._open[day]
+
+        if not self._open or min(self._open) > first_open_day or self._open_high_water is None:
+            query = {'type': 'sgv', 'date': {'$gte': first_open_day * MS_PER_DAY}}
+            self._open.clear()
+        else:
+            query = {'type': 'sgv', 'date': {'$gt': self._open_high_water}}
+
+        df = _fetch_entries(collection, query)
+        self.stats['fetched'] += len(df)
+        last_day = int(now_ms // MS_PER_DAY)
+        if not df.empty:
+            last_day = max(last_day, int(df['date'].max() // MS_PER_DAY))
+            self._open_high_water = int(df['date'].max())
+        elif self._open_high_water is None:
+            self._open_high_water = first_open_day * MS_PER_DAY - 1
+
+        for day, part in self._split_days(df, range(first_open_day, last_day + 1)).items():
+            if day in self._open:
+                if part.empty:
+                    continue
+                part = pd.concat([self._open[day], part], ignore_index=True)
+                part = part.drop_duplicates(subset=['date'], keep='last').sort_values('date')
+            self._open[day] = part
+
+    def get(self, collection: Any, start_ms: int, end_ms: int,
+            fields: Optional[Sequence[str]] = None, now_ms: Optional[int] = None) -> pd.DataFrame:
+        """Get the readings in a time range, fetching only what is not cached.
+
+        Args:
+            collection: pymongo entries collection
+            start_ms: Range start (Unix ms, inclusive)
+            end_ms: Range end (Unix ms, inclusive)
+            fields: Columns to return (default: all stored columns)
+            now_ms: Current time (default: the system clock)
+
+        Returns:
+            pandas.DataFrame of readings sorted by date
+        """
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        columns = list(fields) if fields is not None else list(STORE_FIELDS)
+
+        first_open_day = int((now_ms - self.settle_ms) // MS_PER_DAY)
+        days = range(int(start_ms // MS_PER_DAY), int(end_ms // MS_PER_DAY) + 1)
+        closed_days = [day for day in days if day < first_open_day]
+
+        self._load_closed(collection, closed_days)
+        if days[-1] >= first_open_day:
+            self._refresh_open(collection, first_open_day, now_ms)
+
+        frames = [self._closed[day] for day in closed_days]
+        frames += [self._open[day] for day in days if day >= first_open_day and day in self._open]
+        self._evict()
+
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat(frames, ignore_index=True)
+        df = df[(df['date'] >= start_ms) & (df['date'] <= end_ms)]
+        return df[columns].reset_index(drop=True)
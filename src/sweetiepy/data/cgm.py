@@ -1,19 +1,148 @@
 from __future__ import annotations
 
-from ..connection.mongodb import MongoDBConnection
+from ..connection.instrumentation import stage
+from ..connection.mongodb import MongoDBConnection, build_projection
+from .cache import STORE_FIELDS, DayPartitionCache, EntriesParquetStore
+from .columnar import ENTRY_SCHEMA, find_columnar, schema_for
 from datetime import datetime, timedelta
 import json
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple, Union
 
-# Configure pandas to use PyArrow backend for better performance
-try:
-    pd.options.mode.dtype_backend = "pyarrow"
-except:
-    # Fallback if PyArrow backend isn't available in this pandas version
-    print("PyArrow backend not available, using default pandas backend")
+# Fields fetched for DataFrame analysis (everything else stays on the server)
+DEFAULT_ENTRY_FIELDS = ('date', 'dateString', 'sgv', 'direction', 'trend', 'type')
 
+# Fields that _clean_dataframe cannot work without
+_CLEAN_REQUIRED_FIELDS = ('date', 'sgv')
+
+# Look-back length of the predefined periods
+PERIODS = {
+    'last_24h': timedelta(hours=24),
+    'last_week': timedelta(days=7),
+    'last_month': timedelta(days=30),
+}
+
+# Bucket widths (milliseconds) for get_downsampled; buckets are aligned to UTC
+DOWNSAMPLE_BUCKETS = {
+    '15min': 15 * 60_000,
+    '1h': 3_600_000,
+    '1d': 86_400_000,
+}
+
+DEFAULT_DOWNSAMPLE_STATS = ('mean', 'min', 'max', 'p10', 'p90')
+
+# Simple per-bucket statistics and their $group accumulators
+_DOWNSAMPLE_ACCUMULATORS = {
+    'mean': '$avg',
+    'min': '$min',
+    'max': '$max',
+    'std': '$stdDevSamp',
+}
+
+
+def _percentile_stats(stats: Sequence[str]) -> Dict[str, float]:
+    """Map the percentile statistics ('median', 'p10', ...) to quantiles.
+    
+    Args:
+        stats: Requested statistic names
+        
+    Returns:
+        Dict of statistic name -> quantile between 0 and 1
+        
+    Raises:
+        ValueError: If a statistic is not supported
+    """
+    quantiles = {}
+    for name in stats:
+        if name in _DOWNSAMPLE_ACCUMULATORS or name == 'count':
+            continue
+        if name == 'median':
+            quantiles[name] = 0.5
+        elif name.startswith('p') and name[1:].isdigit() and 0 < int(name[1:]) < 100:
+            quantiles[name] = int(name[1:]) / 100
+        else:
+            raise ValueError(f"Unsupported statistic: {name!r} (use count, mean, min, max, "
+                             f"std, median or pNN)")
+    return quantiles
+
+
+def _downsample_spec(bucket: str, stats: Sequence[str]) -> Tuple[int, List[str], Dict[str, float]]:
+    """Validate a downsampling request.
+    
+    Returns:
+        Tuple of (bucket width in ms, result columns, percentile quantiles)
+        
+    Raises:
+        ValueError: If the bucket or a statistic is not supported
+    """
+    if bucket not in DOWNSAMPLE_BUCKETS:
+        raise ValueError(f"Unsupported bucket: {bucket!r} (use {', '.join(DOWNSAMPLE_BUCKETS)})")
+    quantiles = _percentile_stats(stats)
+    columns = ['datetime', 'count'] + [name for name in dict.fromkeys(stats) if name != 'count']
+    return DOWNSAMPLE_BUCKETS[bucket], columns, quantiles
+
+
+def _downsample_pipeline(query: Dict[str, Any], bucket_ms: int, stats: List[str],
+                         quantiles: Dict[str, float], percentile: bool) -> List[Dict[str, Any]]:
+    """Aggregation that groups readings by time bucket.
+    
+    Args:
+        query: Entries query for the time range
+        bucket_ms: Bucket width in milliseconds
+        stats: Statistics to compute
+        quantiles: Percentile statistics -> quantile (see _percentile_stats)
+        percentile: Use $percentile (MongoDB 7.0+) rather than pushing each
+            bucket's values for local percentiles
+    """
+    group = {'_id': {'$subtract': ['$date', {'$mod': ['$date', bucket_ms]}]},
+             'count': {'$sum': 1}}
+    for name in stats:
+        if name in _DOWNSAMPLE_ACCUMULATORS:
+            group[name] = {_DOWNSAMPLE_ACCUMULATORS[name]: '$sgv'}
+    if quantiles and percentile:
+        group['percentiles'] = {'$percentile': {'input': '$sgv', 'p': list(quantiles.values()),
+                                                'method': 'approximate'}}
+    elif quantiles:
+        group['values'] = {'$push': '$sgv'}
+    return [{'$match': dict(query, sgv={'$gt': 0})}, {'$group': group}, {'$sort': {'_id': 1}}]
+
+
+def _downsample_buckets_frame(buckets: List[Dict[str, Any]], stats: List[str],
+                              quantiles: Dict[str, float]) -> pd.DataFrame:
+    """Build the bucket statistics from _downsample_pipeline results."""
+    result = pd.DataFrame({'bucket': [b['_id'] for b in buckets],
+                           'count': [b['count'] for b in buckets]})
+    for name in stats:
+        if name in _DOWNSAMPLE_ACCUMULATORS:
+            result[name] = [b.get(name) for b in buckets]
+    for index, (name, q) in enumerate(quantiles.items()):
+        if buckets and 'percentiles' in buckets[0]:
+            result[name] = [b['percentiles'][index] for b in buckets]
+        else:
+            result[name] = [float(np.quantile(b['values'], q)) for b in buckets]
+    return result
+
+
+def _downsample_locally(df: pd.DataFrame, bucket_ms: int, stats: List[str],
+                        quantiles: Dict[str, float]) -> pd.DataFrame:
+    """Group downloaded 'date'/'sgv' columns by time bucket."""
+    df = df[df['sgv'] > 0]
+    df = df.assign(bucket=df['date'] - df['date'] % bucket_ms)
+    grouped = df.groupby('bucket')['sgv']
+    result = pd.DataFrame({'count': grouped.size()})
+    for name in stats:
+        if name in quantiles:
+            result[name] = grouped.quantile(quantiles[name])
+        else:
+            result[name] = grouped.agg(name)
+    return result.reset_index()
+
+
+def _downsample_result(result: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """Convert bucket starts to UTC datetimes and order the columns."""
+    result['datetime'] = pd.to_datetime(result['bucket'].astype('int64'), unit='ms', utc=True)
+    return result[columns].reset_index(drop=True)
 
 class CGMDataAccess:
     """Access and query CGM/blood glucose data from the entries collection.
@@ -25,6 +154,7 @@ class CGMDataAccess:
     Attributes:
         db_conn: MongoDB connection instance
         collection: MongoDB collection reference for CGM entries
+        store: Optional local Parquet store that period queries read first
         
     Example:
         Basic usage:
@@ -36,12 +166,33 @@ class CGMDataAccess:
         Context manager (recommended):
             with CGMDataAccess() as cgm:
                 df = cgm.get_dataframe_for_period('last_week')
+                
+        With a local Parquet cache (only new readings are fetched):
+            with CGMDataAccess(cache_dir='~/.cache/sweetiepy/entries') as cgm:
+                df = cgm.get_dataframe_for_period('last_month')
     """
 
-    def __init__(self) -> None:
-        """Initialize CGM data access with MongoDB connection."""
-        self.db_conn = MongoDBConnection()
+    def __init__(self, cache_dir: Optional[str] = None,
+                 db_conn: Optional[MongoDBConnection] = None,
+                 memory_cache_mb: Optional[float] = None) -> None:
+        """Initialize CGM data access with MongoDB connection.
+        
+        Args:
+            cache_dir: Optional directory for a local Parquet store of entries.
+                When set, period DataFrames are read from local disk after
+                fetching only readings newer than the store's high-water mark.
+            db_conn: Optional existing connection to use (e.g. one shared with
+                other data access classes)
+            memory_cache_mb: Optional memory budget for an in-process cache of
+                whole days. When set, period DataFrames reuse cached closed
+                days and only re-query the open days at the end of the
+                window (takes precedence over cache_dir).
+        """
+        self.db_conn = db_conn if db_conn is not None else MongoDBConnection()
         self.collection = None
+        self.store = EntriesParquetStore(cache_dir) if cache_dir else None
+        self.memory_cache = (DayPartitionCache(max_bytes=int(memory_cache_mb * 2**20))
+                             if memory_cache_mb else None)
     
     def __enter__(self) -> CGMDataAccess:
         """Context manager entry - connect to database.
@@ -159,18 +310,17 @@ class CGMDataAccess:
         except Exception as e:
             print(f"Could not determine date range: {e}")
 
-    def get_readings_by_time_range(self, start_time: Union[datetime, int], end_time: Union[datetime, int], limit: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Get CGM readings within a specific time range.
+    @staticmethod
+    def _time_range_query(start_time: Union[datetime, int], end_time: Union[datetime, int]) -> Dict[str, Any]:
+        """Build the entries query for sensor glucose values in a time range.
 
         Args:
             start_time: datetime object or Unix timestamp (milliseconds)
             end_time: datetime object or Unix timestamp (milliseconds)
-            limit: Optional limit on number of results
-        """
-        if self.collection is None:
-            print("✗ Not connected to collection")
-            return []
 
+        Returns:
+            MongoDB query dict
+        """
         # Convert datetime objects to Unix timestamps if needed
         if isinstance(start_time, datetime):
             start_timestamp = int(start_time.timestamp() * 1000)
@@ -183,7 +333,7 @@ class CGMDataAccess:
             end_timestamp = int(end_time)
 
         # Query with date range filter
-        query = {
+        return {
             "date": {
                 "$gte": start_timestamp,
                 "$lte": end_timestamp
@@ -191,49 +341,72 @@ class CGMDataAccess:
             "type": "sgv"  # Only sensor glucose values
         }
 
+    def get_readings_by_time_range(self, start_time: Union[datetime, int], end_time: Union[datetime, int], limit: Optional[int] = None, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Get CGM readings within a specific time range.
+
+        Args:
+            start_time: datetime object or Unix timestamp (milliseconds)
+            end_time: datetime object or Unix timestamp (milliseconds)
+            limit: Optional limit on number of results
+            fields: Optional list of fields to return (e.g. DEFAULT_ENTRY_FIELDS);
+                None returns whole documents
+        """
+        if self.collection is None:
+            print("✗ Not connected to collection")
+            return []
+
+        query = self._time_range_query(start_time, end_time)
+        start_timestamp = query['date']['$gte']
+        end_timestamp = query['date']['$lte']
+
         try:
-            cursor = self.collection.find(query).sort("date", 1)  # Sort ascending by date
+            cursor = self.collection.find(query, build_projection(fields)).sort("date", 1)  # Sort ascending by date
             if limit:
                 cursor = cursor.limit(limit)
 
-            readings = list(cursor)
+            with stage('cgm.fetch'):
+                readings = list(cursor)
             print(f"✓ Retrieved {len(readings)} readings from {datetime.fromtimestamp(start_timestamp/1000)} to {datetime.fromtimestamp(end_timestamp/1000)}")
             return readings
         except Exception as e:
             print(f"✗ Error querying time range: {e}")
             return []
 
-    def get_last_24_hours(self):
+    def get_last_24_hours(self, fields: Optional[Sequence[str]] = None):
         """Get CGM readings from the last 24 hours."""
         end_time = datetime.now()
         start_time = end_time - timedelta(hours=24)
-        return self.get_readings_by_time_range(start_time, end_time)
+        return self.get_readings_by_time_range(start_time, end_time, fields=fields)
 
-    def get_last_week(self):
+    def get_last_week(self, fields: Optional[Sequence[str]] = None):
         """Get CGM readings from the last 7 days."""
         end_time = datetime.now()
         start_time = end_time - timedelta(days=7)
-        return self.get_readings_by_time_range(start_time, end_time)
+        return self.get_readings_by_time_range(start_time, end_time, fields=fields)
 
-    def get_last_month(self):
+    def get_last_month(self, fields: Optional[Sequence[str]] = None):
         """Get CGM readings from the last 30 days."""
         end_time = datetime.now()
         start_time = end_time - timedelta(days=30)
-        return self.get_readings_by_time_range(start_time, end_time)
+        return self.get_readings_by_time_range(start_time, end_time, fields=fields)
 
-    def get_readings_for_date(self, target_date):
+    def get_readings_for_date(self, target_date, fields: Optional[Sequence[str]] = None):
         """Get all CGM readings for a specific date.
 
         Args:
             target_date: datetime.date object or datetime object
+            fields: Optional list of fields to return (None for whole documents)
         """
+        start_time, end_time = self._day_window(target_date)
+        return self.get_readings_by_time_range(start_time, end_time, fields=fields)
+
+    @staticmethod
+    def _day_window(target_date) -> Tuple[datetime, datetime]:
+        """Get the first and last moment of a local calendar day."""
         if hasattr(target_date, 'date'):
             target_date = target_date.date()
-
-        start_time = datetime.combine(target_date, datetime.min.time())
-        end_time = datetime.combine(target_date, datetime.max.time())
-
-        return self.get_readings_by_time_range(start_time, end_time)
+        return (datetime.combine(target_date, datetime.min.time()),
+                datetime.combine(target_date, datetime.max.time()))
 
     def get_readings_summary(self, readings):
         """Get summary statistics for a list of readings."""
@@ -256,12 +429,14 @@ class CGMDataAccess:
             }
         }
     
-    def to_dataframe(self, readings: List[Dict[str, Any]], clean_data: bool = True) -> pd.DataFrame:
-        """Convert MongoDB readings to pandas DataFrame with PyArrow backend.
+    def to_dataframe(self, readings: List[Dict[str, Any]], clean_data: bool = True,
+                     fields: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Convert MongoDB readings to a pandas DataFrame.
         
         Args:
             readings: List of MongoDB documents from CGM collection
             clean_data: Whether to apply data cleaning and validation
+            fields: Optional list of columns to build (None for all fields)
             
         Returns:
             pandas.DataFrame: Cleaned and processed CGM data
@@ -271,33 +446,41 @@ class CGMDataAccess:
             return pd.DataFrame()
         
         # Convert to DataFrame
-        df = pd.DataFrame(readings)
+        with stage('cgm.dataframe'):
+            df = pd.DataFrame(readings, columns=list(fields) if fields is not None else None)
         
         if clean_data:
-            df = self._clean_dataframe(df)
+            with stage('cgm.clean'):
+                df = self._clean_dataframe(df)
         
         print(f"✓ Created DataFrame with {len(df)} rows and {len(df.columns)} columns")
         return df
     
-    def _clean_dataframe(self, df):
+    def _clean_dataframe(self, df, verbose=True):
         """Clean and validate CGM DataFrame.
         
         Args:
             df: Raw DataFrame from MongoDB documents
+            verbose: Print progress and a summary of the cleaned data
             
         Returns:
             pandas.DataFrame: Cleaned DataFrame
         """
-        print("🧹 Cleaning DataFrame...")
+        if verbose:
+            print("🧹 Cleaning DataFrame...")
         
         # Filter to only sensor glucose values
-        df = df[df['type'] == 'sgv'].copy()
+        if 'type' in df.columns:
+            df = df[df['type'] == 'sgv'].copy()
+        else:
+            df = df.copy()
         
         # Convert date column to datetime with timezone handling
         df['datetime'] = pd.to_datetime(df['date'], unit='ms', utc=True)
         
         # Convert dateString to datetime for validation
-        df['dateString_parsed'] = pd.to_datetime(df['dateString'])
+        if 'dateString' in df.columns:
+            df['dateString_parsed'] = pd.to_datetime(df['dateString'])
         
         # Remove rows with missing or invalid glucose values
         df = df.dropna(subset=['sgv'])
@@ -312,7 +495,7 @@ class CGMDataAccess:
         outliers_removed = len(df) - len(df[(df['sgv'] >= lower_bound) & (df['sgv'] <= upper_bound)])
         df = df[(df['sgv'] >= lower_bound) & (df['sgv'] <= upper_bound)]
         
-        if outliers_removed > 0:
+        if outliers_removed > 0 and verbose:
             print(f"  📊 Removed {outliers_removed} outlier readings")
         
         # Sort by timestamp
@@ -331,13 +514,14 @@ class CGMDataAccess:
             right=False
         )
         
-        print(f"  ✓ Cleaned data: {len(df)} valid readings")
-        print(f"  📈 Glucose range: {df['sgv'].min()}-{df['sgv'].max()} mg/dL")
-        print(f"  📅 Time range: {df['datetime'].min()} to {df['datetime'].max()}")
+        if verbose:
+            print(f"  ✓ Cleaned data: {len(df)} valid readings")
+            print(f"  📈 Glucose range: {df['sgv'].min()}-{df['sgv'].max()} mg/dL")
+            print(f"  📅 Time range: {df['datetime'].min()} to {df['datetime'].max()}")
         
         return df
     
-    def get_dataframe_for_period(self, period_type: str = 'last_week', start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, clean_data: bool = True) -> pd.DataFrame:
+    def get_dataframe_for_period(self, period_type: str = 'last_week', start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, clean_data: bool = True, fields: Optional[Sequence[str]] = DEFAULT_ENTRY_FIELDS, columnar: bool = False) -> pd.DataFrame:
         """Get cleaned DataFrame for a specific time period.
         
         Args:
@@ -345,23 +529,422 @@ class CGMDataAccess:
             start_date: For custom period (datetime object)
             end_date: For custom period (datetime object)
             clean_data: Whether to apply data cleaning
+            fields: Fields to fetch from the server (default: DEFAULT_ENTRY_FIELDS);
+                None fetches whole documents
+            columnar: Decode results straight into typed columns (pymongoarrow if
+                installed, otherwise server-grouped field arrays or raw BSON
+                batches) instead of building one dict per document. Faster and
+                lighter for large ranges.
             
         Returns:
             pandas.DataFrame: Cleaned CGM data for the specified period
+        
+        Note:
+            When a memory_cache or store is configured and the requested fields
+            are all cached columns, the period is served from the cache and
+            ``columnar`` has no effect: cached periods are already held as typed
+            columns, so there is nothing left to decode.
         """
+        if fields is not None and clean_data:
+            fields = list(fields) + [f for f in _CLEAN_REQUIRED_FIELDS if f not in fields]
+        
+        cacheable = fields is not None and set(fields) <= set(STORE_FIELDS)
+        if self.memory_cache is not None and cacheable:
+            return self._get_memory_cached_dataframe(period_type, start_date, end_date, clean_data, fields)
+        
+        if self.store is not None and cacheable:
+            return self._get_cached_dataframe(period_type, start_date, end_date, clean_data, fields)
+        
+        if columnar:
+            return self._get_columnar_dataframe(period_type, start_date, end_date, clean_data,
+                                                fields if fields is not None else DEFAULT_ENTRY_FIELDS)
+        
         if period_type == 'last_24h':
-            readings = self.get_last_24_hours()
+            readings = self.get_last_24_hours(fields=fields)
         elif period_type == 'last_week':
-            readings = self.get_last_week()
+            readings = self.get_last_week(fields=fields)
         elif period_type == 'last_month':
-            readings = self.get_last_month()
+            readings = self.get_last_month(fields=fields)
         elif period_type == 'custom' and start_date and end_date:
-            readings = self.get_readings_by_time_range(start_date, end_date)
+            readings = self.get_readings_by_time_range(start_date, end_date, fields=fields)
         else:
             print("✗ Invalid period_type or missing dates for custom period")
             return pd.DataFrame()
         
-        return self.to_dataframe(readings, clean_data=clean_data)
+        return self.to_dataframe(readings, clean_data=clean_data, fields=fields)
+    
+    def _get_cached_dataframe(self, period_type: str, start_date: Optional[datetime],
+                              end_date: Optional[datetime], clean_data: bool,
+                              fields: Sequence[str]) -> pd.DataFrame:
+        """Get a period's DataFrame from the local Parquet store.
+        
+        The store is synced first, which fetches only readings newer than its
+        high-water mark (and any older range it does not cover yet).
+        
+        Args:
+            period_type: 'last_24h', 'last_week', 'last_month', or 'custom'
+            start_date: For custom period (datetime object)
+            end_date: For custom period (datetime object)
+            clean_data: Whether to apply data cleaning
+            fields: Columns to read
+            
+        Returns:
+            pandas.DataFrame: CGM data for the specified period
+        """
+        window = self._resolve_period(period_type, start_date, end_date)
+        if window is None:
+            print("✗ Invalid period_type or missing dates for custom period")
+            return pd.DataFrame()
+        
+        query = self._time_range_query(*window)
+        start_ms = query['date']['$gte']
+        end_ms = query['date']['$lte']
+        
+        if self.collection is not None:
+            try:
+                fetched = self.store.sync(self.collection, start_ms)
+                print(f"✓ Synced local store ({fetched} readings fetched)")
+            except Exception as e:
+                print(f"✗ Error syncing local store: {e}")
+        elif not self.store.covers(start_ms):
+            print("✗ Not connected to collection")
+            return pd.DataFrame()
+        
+        df = self.store.read(start_ms, end_ms, fields)
+        print(f"✓ Read {len(df)} readings from local store")
+        if df.empty:
+            return pd.DataFrame()
+        if clean_data:
+            df = self._clean_dataframe(df)
+        return df
+    
+    def _get_memory_cached_dataframe(self, period_type: str, start_date: Optional[datetime],
+                                     end_date: Optional[datetime], clean_data: bool,
+                                     fields: Sequence[str]) -> pd.DataFrame:
+        """Get a period's DataFrame through the in-process day cache.
+        
+        Args:
+            period_type: 'last_24h', 'last_week', 'last_month', or 'custom'
+            start_date: For custom period (datetime object)
+            end_date: For custom period (datetime object)
+            clean_data: Whether to apply data cleaning
+            fields: Columns to return
+            
+        Returns:
+            pandas.DataFrame: CGM data for the specified period
+        """
+        if self.collection is None:
+            print("✗ Not connected to collection")
+            return pd.DataFrame()
+        
+        window = self._resolve_period(period_type, start_date, end_date)
+        if window is None:
+            print("✗ Invalid period_type or missing dates for custom period")
+            return pd.DataFrame()
+        
+        query = self._time_range_query(*window)
+        try:
+            df = self.memory_cache.get(self.collection, query['date']['$gte'], query['date']['$lte'], fields)
+        except Exception as e:
+            print(f"✗ Error reading through day cache: {e}")
+            return pd.DataFrame()
+        
+        if df.empty:
+            return pd.DataFrame()
+        if clean_data:
+            df = self._clean_dataframe(df)
+        return df
+    
+    def _get_columnar_dataframe(self, period_type: str, start_date: Optional[datetime],
+                                end_date: Optional[datetime], clean_data: bool,
+                                fields: Sequence[str]) -> pd.DataFrame:
+        """Get a period's DataFrame through the columnar decoder.
+        
+        Args:
+            period_type: 'last_24h', 'last_week', 'last_month', or 'custom'
+            start_date: For custom period (datetime object)
+            end_date: For custom period (datetime object)
+            clean_data: Whether to apply data cleaning
+            fields: Fields to decode
+            
+        Returns:
+            pandas.DataFrame: CGM data for the specified period
+        """
+        if self.collection is None:
+            print("✗ Not connected to collection")
+            return pd.DataFrame()
+        
+        window = self._resolve_period(period_type, start_date, end_date)
+        if window is None:
+            print("✗ Invalid period_type or missing dates for custom period")
+            return pd.DataFrame()
+        
+        try:
+            df = find_columnar(self.collection, self._time_range_query(*window),
+                               schema_for(fields, ENTRY_SCHEMA), sort=[('date', 1)])
+        except Exception as e:
+            print(f"✗ Error querying time range: {e}")
+            return pd.DataFrame()
+        
+        print(f"✓ Retrieved {len(df)} readings (columnar)")
+        if df.empty:
+            return pd.DataFrame()
+        if clean_data:
+            df = self._clean_dataframe(df)
+        return df
+    
+    def iter_readings(self, start_time: Union[datetime, int], end_time: Union[datetime, int],
+                      chunk_size: int = 10000, clean_data: bool = False,
+                      fields: Optional[Sequence[str]] = DEFAULT_ENTRY_FIELDS) -> Iterator[pd.DataFrame]:
+        """Stream CGM readings in a time range as bounded-size DataFrame chunks.
+        
+        Documents are read straight from the cursor and converted one chunk at a
+        time, so memory use depends on ``chunk_size`` rather than on the length
+        of the range.
+        
+        Args:
+            start_time: datetime object or Unix timestamp (milliseconds)
+            end_time: datetime object or Unix timestamp (milliseconds)
+            chunk_size: Maximum number of readings per chunk
+            clean_data: Whether to clean each chunk (outlier bounds are then
+                computed per chunk rather than over the whole range)
+            fields: Fields to fetch (default: DEFAULT_ENTRY_FIELDS); None
+                fetches whole documents
+            
+        Returns:
+            Iterator of DataFrames with up to ``chunk_size`` readings each, in
+            date order. A single summary line is printed once the stream ends
+            
+        Raises:
+            ValueError: If chunk_size is not positive (raised on the call,
+                before iteration starts)
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        return self._iter_readings(start_time, end_time, chunk_size, clean_data, fields)
+    
+    def _iter_readings(self, start_time: Union[datetime, int], end_time: Union[datetime, int],
+                       chunk_size: int, clean_data: bool,
+                       fields: Optional[Sequence[str]]) -> Iterator[pd.DataFrame]:
+        if self.collection is None:
+            print("✗ Not connected to collection")
+            return
+        
+        if fields is not None and clean_data:
+            fields = list(fields) + [f for f in _CLEAN_REQUIRED_FIELDS if f not in fields]
+        columns = list(fields) if fields is not None else None
+        
+        query = self._time_range_query(start_time, end_time)
+        cursor = self.collection.find(query, build_projection(fields)).sort("date", 1).batch_size(chunk_size)
+        
+        fetched = kept = chunks = 0
+        try:
+            chunk = []
+            for doc in cursor:
+                chunk.append(doc)
+                if len(chunk) >= chunk_size:
+                    df = self._readings_chunk(chunk, columns, clean_data)
+                    fetched, kept, chunks = fetched + len(chunk), kept + len(df), chunks + 1
+                    yield df
+                    chunk = []
+            if chunk:
+                df = self._readings_chunk(chunk, columns, clean_data)
+                fetched, kept, chunks = fetched + len(chunk), kept + len(df), chunks + 1
+                yield df
+        finally:
+            cursor.close()
+        self._print_stream_summary(fetched, kept, chunks)
+    
+    def _readings_chunk(self, docs: List[Dict[str, Any]], columns: Optional[List[str]],
+                        clean_data: bool) -> pd.DataFrame:
+        """Convert one streamed chunk of readings to a DataFrame (cleaned quietly)."""
+        df = pd.DataFrame(docs, columns=columns)
+        return self._clean_dataframe(df, verbose=False) if clean_data else df
+    
+    @staticmethod
+    def _print_stream_summary(fetched: int, kept: int, chunks: int) -> None:
+        """Print the one summary line of a finished stream."""
+        removed = f" ({fetched - kept} removed by cleaning)" if kept != fetched else ""
+        print(f"✓ Streamed {kept} readings in {chunks} chunks{removed}")
+    
+    def iter_dataframe_for_period(self, period_type: str = 'last_week', start_date: Optional[datetime] = None,
+                                  end_date: Optional[datetime] = None, chunk_size: int = 10000,
+                                  clean_data: bool = False,
+                                  fields: Optional[Sequence[str]] = DEFAULT_ENTRY_FIELDS) -> Iterator[pd.DataFrame]:
+        """Stream CGM data for a time period as bounded-size DataFrame chunks.
+        
+        Streaming counterpart of get_dataframe_for_period() for long ranges.
+        
+        Args:
+            period_type: 'last_24h', 'last_week', 'last_month', or 'custom'
+            start_date: For custom period (datetime object)
+            end_date: For custom period (datetime object)
+            chunk_size: Maximum number of readings per chunk
+            clean_data: Whether to clean each chunk
+            fields: Fields to fetch (default: DEFAULT_ENTRY_FIELDS)
+            
+        Returns:
+            Iterator of DataFrames with up to ``chunk_size`` readings each, in
+            date order
+            
+        Raises:
+            ValueError: If chunk_size is not positive (raised on the call)
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        return self._iter_period(period_type, start_date, end_date, chunk_size, clean_data, fields)
+    
+    def _iter_period(self, period_type: str, start_date: Optional[datetime],
+                     end_date: Optional[datetime], chunk_size: int, clean_data: bool,
+                     fields: Optional[Sequence[str]]) -> Iterator[pd.DataFrame]:
+        window = self._resolve_period(period_type, start_date, end_date)
+        if window is None:
+            print("✗ Invalid period_type or missing dates for custom period")
+            return
+        
+        yield from self._iter_readings(window[0], window[1], chunk_size, clean_data, fields)
+    
+    @staticmethod
+    def _resolve_period(period_type: str, start_date: Optional[datetime] = None,
+                        end_date: Optional[datetime] = None) -> Optional[Tuple[datetime, datetime]]:
+        """Resolve a period name to a (start, end) window.
+        
+        Args:
+            period_type: 'last_24h', 'last_week', 'last_month', or 'custom'
+            start_date: For custom period (datetime object)
+            end_date: For custom period (datetime object)
+            
+        Returns:
+            (start, end) datetimes, or None if the period is invalid
+        """
+        if period_type in PERIODS:
+            end_time = datetime.now()
+            return end_time - PERIODS[period_type], end_time
+        if period_type == 'custom' and start_date and end_date:
+            return start_date, end_date
+        return None
+    
+    def analyze_period(self, period_type: str = 'last_week', start_date: Optional[datetime] = None,
+                       end_date: Optional[datetime] = None, server_side: bool = True) -> Dict[str, Any]:
+        """Analyze a time period without downloading its readings.
+        
+        Produces the same summary as analyze_dataframe(get_dataframe_for_period(...))
+        but computes it with aggregation pipelines over the entries collection,
+        so only a few kilobytes of results cross the network:
+        
+        1. A glucose histogram ($group by sgv, at most a few hundred buckets)
+           gives the outlier bounds, basic stats and time in range.
+        2. A $facet over the in-bounds readings gives the hourly and day-of-week
+           averages and the time span.
+        
+        Args:
+            period_type: 'last_24h', 'last_week', 'last_month', or 'custom'
+            start_date: For custom period (datetime object)
+            end_date: For custom period (datetime object)
+            server_side: Compute with aggregation pipelines (False, or a backend
+                without aggregation support, downloads the readings and uses
+                analyze_dataframe)
+            
+        Returns:
+            dict: Analysis summary with the same keys as analyze_dataframe
+        """
+        if not server_side or not getattr(self.db_conn, 'supports_aggregation', True):
+            return self.analyze_dataframe(self.get_dataframe_for_period(period_type, start_date, end_date))
+        
+        if self.collection is None:
+            print("✗ Not connected to collection")
+            return {"error": "Not connected"}
+        
+        window = self._resolve_period(period_type, start_date, end_date)
+        if window is None:
+            print("✗ Invalid period_type or missing dates for custom period")
+            return {"error": "Invalid period"}
+        
+        query = self._time_range_query(*window)
+        
+        # Pass 1: glucose histogram, which gives the outlier bounds
+        histogram = list(self.collection.aggregate(_histogram_pipeline(query)))
+        bounds = _histogram_bounds(histogram)
+        if bounds is None:
+            return {"error": "Empty DataFrame"}
+        
+        # Pass 2: temporal patterns over the in-bounds readings
+        facets = list(self.collection.aggregate(_temporal_facets_pipeline(query, *bounds)))[0]
+        return _period_analysis(histogram, bounds, facets)
+    
+    def get_downsampled(self, start_date: datetime, end_date: datetime, bucket: str = '1h',
+                        stats: Sequence[str] = DEFAULT_DOWNSAMPLE_STATS,
+                        server_side: bool = True) -> pd.DataFrame:
+        """Get glucose statistics per time bucket, e.g. for long-range charts.
+        
+        The readings are grouped by time bucket in MongoDB ($group on the
+        millisecond timestamp), so two years of 5-minute readings come back
+        as about 17k hourly or 730 daily rows. Percentiles use $percentile
+        (MongoDB 7.0+, approximate); older servers send each bucket's values
+        and the percentiles are computed locally.
+        
+        Like analyze_period, the statistics cover every sensor reading above
+        zero, without the outlier filtering of _clean_dataframe.
+        
+        Args:
+            start_date: Start of the range (datetime object)
+            end_date: End of the range (datetime object)
+            bucket: Bucket width: '15min', '1h' or '1d' (aligned to UTC)
+            stats: Statistics per bucket: 'count', 'mean', 'min', 'max',
+                'std', 'median' or percentiles such as 'p10' and 'p90'
+            server_side: Aggregate in the database (False, or a backend
+                without aggregation support, downloads the dates and glucose
+                values and groups them locally)
+            
+        Returns:
+            pandas.DataFrame with 'datetime' (bucket start, UTC), 'count' and
+            one column per requested statistic; buckets without readings are
+            left out
+            
+        Raises:
+            ValueError: If the bucket or a statistic is not supported
+        """
+        bucket_ms, columns, quantiles = _downsample_spec(bucket, stats)
+        
+        if self.collection is None:
+            print("✗ Not connected to collection")
+            return pd.DataFrame(columns=columns)
+        
+        query = self._time_range_query(start_date, end_date)
+        
+        if not server_side or not getattr(self.db_conn, 'supports_aggregation', True):
+            df = find_columnar(self.collection, query, {'date': 'float64', 'sgv': 'float64'})
+            result = _downsample_locally(df, bucket_ms, columns[2:], quantiles)
+        else:
+            result = self._downsample_server_side(query, bucket_ms, columns[2:], quantiles)
+        
+        print(f"✓ Downsampled to {len(result)} {bucket} buckets")
+        return _downsample_result(result, columns)
+    
+    def _downsample_server_side(self, query: Dict[str, Any], bucket_ms: int, stats: List[str],
+                                quantiles: Dict[str, float]) -> pd.DataFrame:
+        """Group readings by time bucket with an aggregation pipeline.
+        
+        Args:
+            query: Entries query for the time range
+            bucket_ms: Bucket width in milliseconds
+            stats: Statistics to compute
+            quantiles: Percentile statistics -> quantile (see _percentile_stats)
+            
+        Returns:
+            DataFrame with 'bucket' (start in ms), 'count' and the statistics
+        """
+        from pymongo.errors import OperationFailure
+        
+        with stage('cgm.downsample'):
+            try:
+                buckets = list(self.collection.aggregate(
+                    _downsample_pipeline(query, bucket_ms, stats, quantiles, percentile=True)))
+            except OperationFailure:
+                # $percentile needs MongoDB 7.0
+                buckets = list(self.collection.aggregate(
+                    _downsample_pipeline(query, bucket_ms, stats, quantiles, percentile=False)))
+        return _downsample_buckets_frame(buckets, stats, quantiles)
     
     def analyze_dataframe(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Perform basic analysis on CGM DataFrame.
@@ -403,6 +986,131 @@ class CGMDataAccess:
         return analysis
 
 
+def _histogram_summary(values: np.ndarray, counts: np.ndarray) -> Dict[str, float]:
+    """Summary statistics of a glucose histogram (value -> count).
+    
+    Reproduces pandas' mean/median/std (sample, ddof=1)/min/max for the
+    readings the histogram describes.
+    
+    Args:
+        values: Distinct glucose values, sorted ascending
+        counts: Number of readings with each value
+        
+    Returns:
+        dict with count, mean, median, std, min and max
+    """
+    n = int(counts.sum())
+    if n == 0:
+        return {'count': 0, 'mean': np.nan, 'median': np.nan, 'std': np.nan, 'min': np.nan, 'max': np.nan}
+    
+    mean = float((values * counts).sum() / n)
+    std = float(np.sqrt(((values - mean) ** 2 * counts).sum() / (n - 1))) if n > 1 else np.nan
+    
+    # Median from the cumulative counts (average of the middle pair when n is even)
+    cumulative = np.cumsum(counts)
+    lower = values[np.searchsorted(cumulative, (n - 1) // 2 + 1)]
+    upper = values[np.searchsorted(cumulative, n // 2 + 1)]
+    
+    return {
+        'count': n,
+        'mean': mean,
+        'median': float((lower + upper) / 2),
+        'std': std,
+        'min': float(values[0]),
+        'max': float(values[-1]),
+    }
+
+
+def _histogram_pipeline(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Aggregation that counts the readings per glucose value."""
+    return [
+        {'$match': dict(query, sgv={'$gt': 0})},
+        {'$group': {'_id': '$sgv', 'count': {'$sum': 1}}},
+        {'$sort': {'_id': 1}},
+    ]
+
+
+def _histogram_arrays(histogram: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Split histogram buckets into glucose values and counts."""
+    values = np.array([float(bucket['_id']) for bucket in histogram])
+    counts = np.array([bucket['count'] for bucket in histogram], dtype=np.int64)
+    return values, counts
+
+
+def _histogram_bounds(histogram: List[Dict[str, Any]]) -> Optional[Tuple[float, float]]:
+    """Get the outlier bounds of _clean_dataframe from a glucose histogram.
+    
+    Returns:
+        (lower, upper) bounds, or None if no reading falls inside them
+    """
+    if not histogram:
+        return None
+    values, counts = _histogram_arrays(histogram)
+    overall = _histogram_summary(values, counts)
+    lower_bound = max(20, overall['mean'] - 4 * overall['std'])
+    upper_bound = min(600, overall['mean'] + 4 * overall['std'])
+    if not counts[(values >= lower_bound) & (values <= upper_bound)].sum():
+        return None
+    return lower_bound, upper_bound
+
+
+def _temporal_facets_pipeline(query: Dict[str, Any], lower_bound: float,
+                              upper_bound: float) -> List[Dict[str, Any]]:
+    """Aggregation for the hourly and weekday averages and the time span."""
+    # UTC hour and weekday straight from the millisecond timestamps
+    # (1970-01-01 was a Thursday, weekday 3 with 0=Monday)
+    day_number = {'$floor': {'$divide': ['$date', 86_400_000]}}
+    hour = {'$floor': {'$divide': [{'$mod': ['$date', 86_400_000]}, 3_600_000]}}
+    day_of_week = {'$mod': [{'$add': [day_number, 3]}, 7]}
+    return [
+        {'$match': dict(query, sgv={'$gt': 0, '$gte': lower_bound, '$lte': upper_bound})},
+        {'$facet': {
+            'by_hour': [{'$group': {'_id': hour, 'avg': {'$avg': '$sgv'}}}],
+            'by_day_of_week': [{'$group': {'_id': day_of_week, 'avg': {'$avg': '$sgv'}}}],
+            'span': [{'$group': {'_id': None, 'first': {'$min': '$date'}, 'last': {'$max': '$date'}}}],
+        }},
+    ]
+
+
+def _period_analysis(histogram: List[Dict[str, Any]], bounds: Tuple[float, float],
+                     facets: Dict[str, Any]) -> Dict[str, Any]:
+    """Assemble the analyze_dataframe summary from the two aggregation results."""
+    values, counts = _histogram_arrays(histogram)
+    in_bounds = (values >= bounds[0]) & (values <= bounds[1])
+    values, counts = values[in_bounds], counts[in_bounds]
+    stats = _histogram_summary(values, counts)
+    
+    def percent(low: float, high: float) -> float:
+        return float(counts[(values >= low) & (values < high)].sum() / stats['count'] * 100)
+    
+    span = facets['span'][0]
+    span_ms = float(span['last']) - float(span['first'])
+    
+    return {
+        "basic_stats": {
+            "total_readings": stats['count'],
+            "avg_glucose": stats['mean'],
+            "median_glucose": stats['median'],
+            "std_glucose": stats['std'],
+            "min_glucose": stats['min'],
+            "max_glucose": stats['max'],
+        },
+        "time_in_range": {
+            "low_percent": percent(0, 70),
+            "normal_percent": percent(70, 180),
+            "high_percent": percent(180, 250),
+            "very_high_percent": percent(250, float('inf')),
+        },
+        "temporal_patterns": {
+            "avg_by_hour": {int(b['_id']): float(b['avg']) for b in sorted(facets['by_hour'], key=lambda b: b['_id'])},
+            "avg_by_day_of_week": {int(b['_id']): float(b['avg']) for b in sorted(facets['by_day_of_week'], key=lambda b: b['_id'])},
+        },
+        "data_quality": {
+            "time_span_hours": span_ms / 3_600_000,
+            "readings_per_day": stats['count'] / (int(span_ms // 86_400_000) + 1),
+        }
+    }
+
 def test_time_range_queries():
     """Test time-range query functionality."""
     print("=== Testing Time-Range Queries ===")
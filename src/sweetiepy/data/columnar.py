@@ -0,0 +1,220 @@
+"""
+Columnar Query Decoding
+
+Builds DataFrames directly from query results column by column instead of
+materializing one Python dict per document and letting pandas pivot the list.
+
+Three decoders are tried in order:
+- pymongoarrow (optional ``columnar`` extra): BSON is decoded straight into
+  typed Arrow columns in C, without creating Python objects per document
+- server-side columns (MongoDB 5.0+): an aggregation numbers the matching
+  documents and groups them into chunks of COLUMN_CHUNK_SIZE, with one array
+  per field, so the client decodes a few hundred array documents instead of
+  building one dict (and one set of key strings) per document. About 1.7x
+  faster than decoding documents (0.29 s vs 0.49 s in the decode.*
+  benchmarks)
+- raw BSON batches (always available): the cursor returns undecoded BSON
+  batches, each batch is decoded and copied into typed columns, and is
+  released before the next batch arrives. About as fast as decoding
+  documents, but only one batch of documents is ever held in memory
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Column types for the fields the data access classes decode
+ENTRY_SCHEMA = {
+    'date': 'float64',
+    'sgv': 'float64',
+    'trend': 'float64',
+    'direction': 'string',
+    'dateString': 'string',
+    'type': 'string',
+}
+
+TREATMENT_SCHEMA = {
+    'timestamp': 'string',
+    'eventType': 'string',
+    'insulin': 'float64',
+    'programmed': 'float64',
+    'carbs': 'float64',
+    'rate': 'float64',
+    'absolute': 'float64',
+    'duration': 'float64',
+    'absorptionTime': 'float64',
+}
+
+
+def schema_for(fields: Sequence[str], known: Mapping[str, str]) -> Dict[str, str]:
+    """Get the column types for a list of fields.
+
+    Args:
+        fields: Field names to decode
+        known: Known field types ('float64' or 'string')
+
+    Returns:
+        Ordered mapping of field name to type; unknown fields are 'string'
+    """
+    return {field: known.get(field, 'string') for field in fields}
+
+
+def _find_arrow(collection: Any, query: Dict[str, Any], schema: Dict[str, str],
+                sort: Optional[List[Tuple[str, int]]], limit: Optional[int]) -> Optional[pd.DataFrame]:
+    """Decode a query with pymongoarrow, if it is installed.
+
+    Returns:
+        DataFrame, or None if pymongoarrow is not available
+    """
+    try:
+        import pyarrow as pa
+        from pymongoarrow.api import Schema, find_arrow_all
+    except ImportError:
+        return None
+
+    arrow_types = {'float64': pa.float64(), 'string': pa.string()}
+    arrow_schema = Schema({field: arrow_types[kind] for field, kind in schema.items()})
+
+    kwargs: Dict[str, Any] = {}
+    if sort:
+        kwargs['sort'] = sort
+    if limit:
+        kwargs['limit'] = limit
+
+    table = find_arrow_all(collection, query, schema=arrow_schema, **kwargs)
+    return table.to_pandas()
+
+
+# Documents per array document in the server-side columns pipeline (keeps
+# every grouped document far below the 16 MB BSON limit)
+COLUMN_CHUNK_SIZE = 1000
+
+
+def _float_column(values: List[Any]) -> np.ndarray:
+    """Convert decoded values to float64, with NaN for missing or non-numeric ones."""
+    try:
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    except (TypeError, ValueError):
+        # Stray non-numeric values (e.g. numbers stored as strings)
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _column_pipeline(query: Dict[str, Any], schema: Dict[str, str],
+                     sort: Optional[List[Tuple[str, int]]], limit: Optional[int],
+                     chunk_size: int) -> List[Dict[str, Any]]:
+    """Aggregation that returns the matching documents as chunks of field arrays."""
+    order = dict(sort) if sort else {'_id': 1}
+    pipeline: List[Dict[str, Any]] = [{'$match': query}]
+    if limit:
+        pipeline += [{'$sort': order}, {'$limit': limit}]
+    pipeline.append({'$setWindowFields': {'sortBy': order, 'output': {'_n': {'$documentNumber': {}}}}})
+    group: Dict[str, Any] = {
+        '_id': {'$floor': {'$divide': [{'$subtract': ['$_n', 1]}, chunk_size]}},
+        '_n': {'$push': '$_n'},
+    }
+    # $ifNull keeps missing fields as nulls, so the arrays stay aligned
+    group.update({field: {'$push': {'$ifNull': [f'${field}', None]}} for field in schema})
+    pipeline += [{'$group': group}, {'$sort': {'_id': 1}}]
+    return pipeline
+
+
+def _find_server_columns(collection: Any, query: Dict[str, Any], schema: Dict[str, str],
+                         sort: Optional[List[Tuple[str, int]]], limit: Optional[int],
+                         chunk_size: int = COLUMN_CHUNK_SIZE) -> Optional[pd.DataFrame]:
+    """Decode a query that the server has already grouped into field arrays.
+
+    Returns:
+        DataFrame, or None if the server cannot run the pipeline
+        ($setWindowFields needs MongoDB 5.0)
+    """
+    from pymongo.errors import OperationFailure
+
+    try:
+        chunks = list(collection.aggregate(_column_pipeline(query, schema, sort, limit, chunk_size),
+                                           allowDiskUse=True))
+    except OperationFailure:
+        return None
+
+    order = np.array([n for chunk in chunks for n in chunk['_n']], dtype=np.int64)
+    columns = {}
+    for field, kind in schema.items():
+        values = [value for chunk in chunks for value in chunk[field]]
+        columns[field] = _float_column(values) if kind == 'float64' else np.array(values, dtype=object)
+    # Array order within a group is not guaranteed; restore the sort order
+    return pd.DataFrame(columns).iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+
+
+def _find_raw_batches(collection: Any, query: Dict[str, Any], schema: Dict[str, str],
+                      sort: Optional[List[Tuple[str, int]]], limit: Optional[int],
+                      batch_size: int) -> pd.DataFrame:
+    """Decode a query batch by batch into typed NumPy columns."""
+    from bson import decode_all
+
+    projection = {field: 1 for field in schema}
+    projection['_id'] = 0
+
+    cursor = collection.find_raw_batches(query, projection).batch_size(batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    columns = list(schema)
+    frames: List[pd.DataFrame] = []
+    try:
+        for batch in cursor:
+            # from_records builds each column in one pass over the batch, and
+            # the decoded dicts are released before the next batch arrives
+            frame = pd.DataFrame.from_records(decode_all(batch), columns=columns)
+            for field, kind in schema.items():
+                if kind == 'float64':
+                    # Missing and stray non-numeric values (e.g. numbers stored
+                    # as strings) become NaN or are parsed
+                    frame[field] = pd.to_numeric(frame[field], errors='coerce').astype(np.float64)
+                else:
+                    frame[field] = frame[field].to_numpy(dtype=object, na_value=None)
+            frames.append(frame)
+    finally:
+        cursor.close()
+
+    if not frames:
+        return pd.DataFrame({field: np.array([], dtype=np.float64 if kind == 'float64' else object)
+                             for field, kind in schema.items()})
+    return pd.concat(frames, ignore_index=True)
+
+
+def find_columnar(collection: Any, query: Dict[str, Any], schema: Dict[str, str],
+                  sort: Optional[List[Tuple[str, int]]] = None, limit: Optional[int] = None,
+                  batch_size: int = 10000, use_arrow: bool = True,
+                  server_columns: bool = True) -> pd.DataFrame:
+    """Run a find query and decode the results straight into typed columns.
+
+    Args:
+        collection: pymongo collection
+        query: MongoDB query dict
+        schema: Ordered mapping of field name to 'float64' or 'string'
+        sort: Optional sort specification, e.g. [('date', 1)]
+        limit: Optional limit on number of results
+        batch_size: Documents per raw BSON batch
+        use_arrow: Use pymongoarrow when it is installed
+        server_columns: Let the server group the results into field arrays
+            (when the collection supports aggregation)
+
+    Returns:
+        pandas.DataFrame with one column per schema field
+    """
+    if hasattr(collection, 'find_columnar'):
+        # Backends that store columns natively (e.g. the local Parquet backend)
+        return collection.find_columnar(query, schema, sort=sort, limit=limit)
+    if use_arrow:
+        df = _find_arrow(collection, query, schema, sort, limit)
+        if df is not None:
+            return df
+    if server_columns and hasattr(collection, 'aggregate'):
+        df = _find_server_columns(collection, query, schema, sort, limit)
+        if df is not None:
+            return df
+    return _find_raw_batches(collection, query, schema, sort, limit, batch_size)
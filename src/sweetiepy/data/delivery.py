@@ -0,0 +1,298 @@
+"""
+Delivered Insulin Timeline
+
+The profile only says what basal rate was *scheduled*. What the pump actually
+delivered is the scheduled rate overridden by temp basals (each one running
+until its duration elapses or the next temp basal replaces it) and by
+suspends, during which nothing is delivered.
+
+This module combines the three sources into one non-overlapping,
+piecewise-constant timeline of delivery rates stored as NumPy arrays. Every
+boundary is resolved with ``searchsorted``, so looking up the rate at each CGM
+reading or integrating units per day needs no per-interval Python loop.
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .schedule import ProfileSchedule, ProfileTimeline
+
+NS_PER_HOUR = 3600 * 10**9
+NS_PER_MINUTE = 60 * 10**9
+
+
+def _to_ns(times: Union[pd.Series, pd.DatetimeIndex]) -> np.ndarray:
+    """Convert a datetime column to int64 nanoseconds since the epoch (UTC)."""
+    return pd.DatetimeIndex(times).as_unit('ns').asi8
+
+
+def _column(df: Optional[pd.DataFrame], name: str, default: float = np.nan) -> np.ndarray:
+    """Get a numeric column as floats (``default`` when absent)."""
+    if df is None or name not in df.columns:
+        return np.full(0 if df is None else len(df), default)
+    return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+class DeliveryTimeline:
+    """Piecewise-constant insulin delivery rates.
+
+    Segment ``i`` delivers ``rates[i]`` units/hour from ``starts[i]`` until
+    ``starts[i + 1]`` (the last one until ``end``). Cumulative units at each
+    segment start are precomputed, so integrating over any range is two
+    lookups.
+
+    Attributes:
+        starts: Sorted UTC segment start times (ns since epoch)
+        rates: Delivery rate of each segment (units/hour)
+        end: UTC end of the last segment (ns since epoch)
+
+    Example:
+        timeline = build_delivery_timeline(profiles, temp_basals, start, end)
+        df['delivered_basal'] = timeline.rate_at(df['dateTime'])
+    """
+
+    def __init__(self, starts: np.ndarray, rates: np.ndarray, end: int) -> None:
+        """Initialize a timeline from segment starts and rates.
+
+        Args:
+            starts: Sorted UTC segment start times (ns since epoch)
+            rates: Delivery rate of each segment (units/hour)
+            end: UTC end of the last segment (ns since epoch)
+        """
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.rates = np.asarray(rates, dtype=np.float64)
+        self.end = int(end)
+
+        bounds = np.append(self.starts, self.end)
+        units = np.nan_to_num(self.rates) * np.diff(bounds) / NS_PER_HOUR
+        self._cumulative = np.concatenate(([0.0], np.cumsum(units)))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __bool__(self) -> bool:
+        return len(self.starts) > 0
+
+    def __repr__(self) -> str:
+        return f"DeliveryTimeline({len(self)} segments)"
+
+    def rate_at(self, times: Union[pd.Series, pd.DatetimeIndex]) -> np.ndarray:
+        """Get the delivery rate at every timestamp.
+
+        Args:
+            times: Datetime series or index (naive values are treated as UTC)
+
+        Returns:
+            Float array of rates (units/hour), NaN outside the timeline
+        """
+        instants = _to_ns(times)
+        if not self:
+            return np.full(len(instants), np.nan)
+        idx = np.searchsorted(self.starts, instants, side='right') - 1
+        rates = self.rates[np.clip(idx, 0, None)]
+        return np.where((idx >= 0) & (instants < self.end), rates, np.nan)
+
+    def units_until(self, times: Union[pd.Series, pd.DatetimeIndex, np.ndarray]) -> np.ndarray:
+        """Get the units delivered from the timeline start up to each timestamp.
+
+        Args:
+            times: Datetime series/index, or int64 ns since epoch
+
+        Returns:
+            Float array of cumulative units (clamped to the timeline range)
+        """
+        instants = times if isinstance(times, np.ndarray) and times.dtype == np.int64 else _to_ns(times)
+        if not self:
+            return np.zeros(len(instants))
+        instants = np.clip(instants, self.starts[0], self.end)
+        idx = np.clip(np.searchsorted(self.starts, instants, side='right') - 1, 0, len(self) - 1)
+        partial = np.nan_to_num(self.rates[idx]) * (instants - self.starts[idx]) / NS_PER_HOUR
+        return self._cumulative[idx] + partial
+
+    def total(self, start: pd.Timestamp, end: pd.Timestamp) -> float:
+        """Get the units delivered between two times.
+
+        Args:
+            start: Range start
+            end: Range end
+
+        Returns:
+            Units delivered in the range
+        """
+        before, after = self.units_until(pd.DatetimeIndex([start, end]))
+        return float(after - before)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Get the segments as a DataFrame with 'start', 'end' and 'rate' columns."""
+        return pd.DataFrame({
+            'start': pd.DatetimeIndex(self.starts, tz='UTC'),
+            'end': pd.DatetimeIndex(np.append(self.starts[1:], self.end), tz='UTC'),
+            'rate': self.rates,
+        })
+
+
+def _scheduled_breakpoints(basal: Union[ProfileSchedule, ProfileTimeline],
+                           start_ns: int, end_ns: int, timezone: str) -> np.ndarray:
+    """Get every instant in a range where the scheduled basal may change.
+
+    Schedule breakpoints are local wall-clock times, so they are laid out on
+    each local day and converted to UTC (DST gaps shift forward).
+    """
+    if isinstance(basal, ProfileTimeline):
+        seconds = [s.breakpoints for s in basal.schedules.get('basal', []) if s]
+        seconds = np.unique(np.concatenate(seconds)) if seconds else np.array([0], dtype=np.int64)
+        version_starts = basal.start_times[(basal.start_times > start_ns) & (basal.start_times < end_ns)]
+    else:
+        seconds = basal.breakpoints if basal else np.array([0], dtype=np.int64)
+        version_starts = np.array([], dtype=np.int64)
+
+    local = pd.DatetimeIndex([start_ns, end_ns], tz='UTC').tz_convert(timezone).tz_localize(None)
+    days = pd.date_range(local[0].normalize() - pd.Timedelta(days=1), local[1].normalize(), freq='D')
+    wall = (days.as_unit('ns').asi8[:, None] + seconds[None, :] * 10**9).ravel()
+    instants = pd.DatetimeIndex(wall).tz_localize(timezone, ambiguous=np.zeros(len(wall), dtype=bool),
+                                                  nonexistent='shift_forward')
+    instants = instants.as_unit('ns').asi8
+    instants = instants[(instants > start_ns) & (instants < end_ns)]
+    return np.concatenate((instants, version_starts))
+
+
+def _scheduled_rates(basal: Union[ProfileSchedule, ProfileTimeline],
+                     instants: np.ndarray, timezone: str) -> np.ndarray:
+    """Look up the scheduled basal at UTC instants using local wall-clock time."""
+    times = pd.DatetimeIndex(instants, tz='UTC').tz_convert(timezone)
+    if isinstance(basal, ProfileTimeline):
+        return basal.lookup(times, 'basal')
+    return basal.lookup(times)
+
+
+def build_delivery_timeline(basal: Union[ProfileSchedule, ProfileTimeline],
+                            temp_basals: Optional[pd.DataFrame],
+                            start: pd.Timestamp, end: pd.Timestamp,
+                            suspends: Optional[pd.DataFrame] = None,
+                            resumes: Optional[pd.DataFrame] = None,
+                            timezone: str = 'UTC',
+                            time_col: str = 'dateTime') -> DeliveryTimeline:
+    """Build the delivered basal timeline for a time range.
+
+    Precedence, from lowest to highest: scheduled basal, temp basal, suspend.
+
+    - A temp basal runs for its ``duration`` (minutes) at ``absolute`` (or
+      ``rate``) units/hour, and is cut short by the next temp basal. A temp
+      basal with zero duration cancels the running one.
+    - A suspend delivers nothing until the next resume, for its ``duration``
+      when there is no resume, or until the end of the range.
+
+    Args:
+        basal: Scheduled basal as a single schedule or a profile history
+        temp_basals: Temp Basal treatments with ``time_col``, 'duration' and
+            'absolute' and/or 'rate'
+        start: Range start
+        end: Range end
+        suspends: Suspend Pump treatments with ``time_col`` (optional 'duration')
+        resumes: Resume Pump treatments with ``time_col``
+        timezone: Local timezone of the basal schedule
+        time_col: Name of the datetime column in the treatment DataFrames
+
+    Returns:
+        Compiled delivery timeline covering [start, end)
+    """
+    start_ns = int(_to_ns(pd.DatetimeIndex([pd.Timestamp(start)]))[0])
+    end_ns = int(_to_ns(pd.DatetimeIndex([pd.Timestamp(end)]))[0])
+
+    # Temp basals sorted by start, each truncated by the next one
+    if temp_basals is not None and not temp_basals.empty:
+        temp_starts = _to_ns(temp_basals[time_col])
+        temp_rates = _column(temp_basals, 'absolute')
+        temp_rates = np.where(np.isnan(temp_rates), _column(temp_basals, 'rate'), temp_rates)
+        temp_durations = np.nan_to_num(_column(temp_basals, 'duration'), nan=0.0)
+        order = np.argsort(temp_starts, kind='stable')
+        temp_starts, temp_rates = temp_starts[order], temp_rates[order]
+        temp_ends = temp_starts + (temp_durations[order] * NS_PER_MINUTE).astype(np.int64)
+        temp_ends[:-1] = np.minimum(temp_ends[:-1], temp_starts[1:])
+    else:
+        temp_starts = temp_ends = np.array([], dtype=np.int64)
+        temp_rates = np.array([], dtype=np.float64)
+
+    # Suspend intervals (may overlap; coverage is counted below)
+    if suspends is not None and not suspends.empty:
+        suspend_starts = np.sort(_to_ns(suspends[time_col]))
+        suspend_ends = np.full(len(suspend_starts), end_ns, dtype=np.int64)
+        durations = _column(suspends, 'duration')[np.argsort(_to_ns(suspends[time_col]), kind='stable')]
+        has_duration = ~np.isnan(durations) & (durations > 0)
+        suspend_ends[has_duration] = suspend_starts[has_duration] + (durations[has_duration] * NS_PER_MINUTE).astype(np.int64)
+        if resumes is not None and not resumes.empty:
+            resume_times = np.sort(_to_ns(resumes[time_col]))
+            nxt = np.searchsorted(resume_times, suspend_starts, side='right')
+            found = nxt < len(resume_times)
+            suspend_ends[found] = resume_times[nxt[found]]
+        suspend_ends_sorted = np.sort(suspend_ends)
+    else:
+        suspend_starts = suspend_ends = suspend_ends_sorted = np.array([], dtype=np.int64)
+
+    # Every instant where the delivered rate may change
+    bounds = np.unique(np.concatenate((
+        [start_ns],
+        _scheduled_breakpoints(basal, start_ns, end_ns, timezone),
+        temp_starts, temp_ends, suspend_starts, suspend_ends,
+    )))
+    bounds = bounds[(bounds >= start_ns) & (bounds < end_ns)]
+
+    rates = _scheduled_rates(basal, bounds, timezone)
+
+    if len(temp_starts):
+        idx = np.searchsorted(temp_starts, bounds, side='right') - 1
+        active = idx >= 0
+        active[active] = bounds[active] < temp_ends[idx[active]]
+        rates[active] = temp_rates[idx[active]]
+
+    if len(suspend_starts):
+        started = np.searchsorted(suspend_starts, bounds, side='right')
+        ended = np.searchsorted(suspend_ends_sorted, bounds, side='right')
+        rates[started > ended] = 0.0
+
+    # Merge neighbouring segments with the same rate
+    keep = np.ones(len(bounds), dtype=bool)
+    same = (rates[1:] == rates[:-1]) | (np.isnan(rates[1:]) & np.isnan(rates[:-1]))
+    keep[1:] = ~same
+    return DeliveryTimeline(bounds[keep], rates[keep], end_ns)
+
+
+def daily_insulin_totals(timeline: DeliveryTimeline, boluses: Optional[pd.DataFrame] = None,
+                         timezone: str = 'UTC', time_col: str = 'dateTime') -> pd.DataFrame:
+    """Integrate delivered basal and boluses into daily totals (TDD).
+
+    Days are local calendar days; the first and last day only count the part
+    covered by the timeline.
+
+    Args:
+        timeline: Delivered basal timeline
+        boluses: Bolus treatments with ``time_col`` and 'insulin'
+        timezone: Local timezone that defines the days
+        time_col: Name of the datetime column in ``boluses``
+
+    Returns:
+        DataFrame indexed by local date with 'basal', 'bolus' and 'total' units
+    """
+    if not timeline:
+        return pd.DataFrame(columns=['basal', 'bolus', 'total'])
+
+    local = pd.DatetimeIndex([timeline.starts[0], timeline.end - 1], tz='UTC').tz_convert(timezone)
+    days = pd.date_range(local[0].normalize(), local[1].normalize(), freq='D')
+    edges = pd.date_range(days[0], periods=len(days) + 1, freq='D')
+    edge_ns = edges.tz_convert('UTC').as_unit('ns').asi8
+    basal = np.diff(timeline.units_until(edge_ns))
+
+    bolus = np.zeros(len(days))
+    if boluses is not None and not boluses.empty:
+        times = _to_ns(boluses[time_col])
+        insulin = np.nan_to_num(_column(boluses, 'insulin'), nan=0.0)
+        day_idx = np.searchsorted(edge_ns, times, side='right') - 1
+        inside = (day_idx >= 0) & (day_idx < len(days)) & (times >= timeline.starts[0]) & (times < timeline.end)
+        bolus = np.bincount(day_idx[inside], weights=insulin[inside], minlength=len(days))
+
+    return pd.DataFrame({'basal': basal, 'bolus': bolus, 'total': basal + bolus},
+                        index=pd.Index(days.date, name='date'))
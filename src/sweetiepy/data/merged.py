@@ -8,24 +8,247 @@ and glucose outcomes.
 Key features:
 - Merges CGM readings with active basal rates, carb ratios, and insulin sensitivity factors
 - Handles time-based pump settings (different settings for different times of day)
+- Uses the profile version that was in effect at each reading, not just the current one
+- Fetches CGM readings and profiles concurrently on a small thread pool, and
+  treatments for the readings' exact span as soon as the readings arrive
 - Provides enriched dataframes for correlation analysis and time series analysis
 """
 
 from __future__ import annotations
 
-from typing import Dict, List, Any, Optional, Tuple
-from datetime import datetime, timedelta, time
+from typing import Callable, Dict, List, Any, Optional, Sequence, Tuple, Union
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
+from ..connection.instrumentation import stage
 from ..connection.mongodb import MongoDBConnection
 from .cgm import CGMDataAccess
 from .pump import PumpDataAccess
+from .schedule import ProfileSchedule, ProfileTimeline
+from .delivery import DeliveryTimeline, build_delivery_timeline
+from .onboard import ONBOARD_HISTORY_HOURS, add_onboard_columns
+from .windows import add_trailing_treatment_totals
 
-# Configure pandas to use PyArrow backend for better performance
-try:
-    pd.options.mode.dtype_backend = "pyarrow"
-except:
-    print("PyArrow backend not available, using default pandas backend")
+
+def add_settings_columns(cgm_df: pd.DataFrame, timeline: Optional[ProfileTimeline],
+                         schedules: Tuple[ProfileSchedule, ProfileSchedule, ProfileSchedule],
+                         timezone: Optional[str] = None) -> pd.DataFrame:
+    """Add the pump settings in effect at each CGM reading.
+    
+    Args:
+        cgm_df: Cleaned CGM DataFrame
+        timeline: Profile history for as-of lookups, or None
+        schedules: (basal, carb ratio, ISF) schedules of the current profile,
+            used when there is no timeline
+        timezone: Local timezone of the schedules. Reading times are
+            converted to it (naive times are UTC) before the time-of-day
+            lookup, as the delivered and scheduled basal timelines do; None
+            reads each time in its own timezone
+        
+    Returns:
+        The CGM DataFrame with the active_* columns, time features and a
+        'dateTime' column
+    """
+    # Use the correct datetime column name - prefer 'datetime' if available
+    datetime_col = None
+    for col in ['dateTime', 'datetime', 'date_time']:
+        if col in cgm_df.columns:
+            datetime_col = col
+            break
+    
+    if datetime_col is None:
+        # Find the datetime column
+        datetime_cols = [col for col in cgm_df.columns if 'date' in col.lower() and 'time' in col.lower()]
+        if datetime_cols:
+            datetime_col = datetime_cols[0]
+        else:
+            raise ValueError(f"No datetime column found in CGM data. Available columns: {list(cgm_df.columns)}")
+    
+    # Ensure the datetime column is properly converted
+    if not pd.api.types.is_datetime64_any_dtype(cgm_df[datetime_col]):
+        cgm_df[datetime_col] = pd.to_datetime(cgm_df[datetime_col])
+    
+    # Schedule entries are local wall-clock times
+    times = pd.DatetimeIndex(cgm_df[datetime_col])
+    if timezone:
+        times = (times if times.tz is not None else times.tz_localize('UTC')).tz_convert(timezone)
+    
+    # Add the settings that were in effect at each CGM reading. With a
+    # profile history this is an as-of join on profile start times;
+    # otherwise use the current profile.
+    if timeline:
+        cgm_df['active_basal'] = timeline.lookup(times, 'basal')
+        cgm_df['active_carb_ratio'] = timeline.lookup(times, 'carbratio')
+        cgm_df['active_isf'] = timeline.lookup(times, 'sens')
+        cgm_df['profile_start'] = timeline.start_at(times)
+    else:
+        basal, carb_ratio, isf = schedules
+        cgm_df['active_basal'] = basal.lookup(times)
+        cgm_df['active_carb_ratio'] = carb_ratio.lookup(times)
+        cgm_df['active_isf'] = isf.lookup(times)
+    
+    # Add time-based features for analysis
+    cgm_df['hour_of_day'] = cgm_df[datetime_col].dt.hour
+    cgm_df['day_of_week'] = cgm_df[datetime_col].dt.dayofweek
+    cgm_df['time_of_day_category'] = pd.cut(
+        cgm_df['hour_of_day'],
+        bins=[0, 6, 12, 18, 24],
+        labels=['Night', 'Morning', 'Afternoon', 'Evening'],
+        include_lowest=True
+    )
+    
+    # Ensure we have a consistent 'dateTime' column for downstream usage
+    if datetime_col != 'dateTime':
+        cgm_df['dateTime'] = cgm_df[datetime_col]
+    
+    return cgm_df
+
+
+def treatment_basal_timelines(treatments_df: pd.DataFrame,
+                              basal: Union[ProfileSchedule, ProfileTimeline],
+                              start: pd.Timestamp, end: pd.Timestamp,
+                              timezone: str) -> Tuple[DeliveryTimeline, DeliveryTimeline]:
+    """Build the delivered and scheduled basal timelines from mixed treatments.
+    
+    Args:
+        treatments_df: Treatments of every event type with 'eventType',
+            'dateTime', 'rate'/'absolute' and 'duration'
+        basal: Scheduled basal as a single schedule or a profile history
+        start: Range start
+        end: Range end
+        timezone: Local timezone of the basal schedule
+        
+    Returns:
+        Tuple of (delivered, scheduled) timelines covering [start, end)
+    """
+    events = treatments_df['eventType'] if 'eventType' in treatments_df.columns else None
+    
+    def rows(event_type: str) -> Optional[pd.DataFrame]:
+        return None if events is None else treatments_df[events == event_type]
+    
+    delivered = build_delivery_timeline(basal, rows('Temp Basal'), start, end,
+                                        suspends=rows('Suspend Pump'), resumes=rows('Resume Pump'),
+                                        timezone=timezone)
+    scheduled = build_delivery_timeline(basal, None, start, end, timezone=timezone)
+    return delivered, scheduled
+
+
+def add_treatment_context(df: pd.DataFrame, treatments_df: pd.DataFrame,
+                          lookback_hours: Union[int, Sequence[int]] = 4,
+                          include_onboard: bool = False,
+                          basal: Optional[Union[ProfileSchedule, ProfileTimeline]] = None,
+                          timezone: str = 'UTC') -> pd.DataFrame:
+    """Add trailing treatment totals (and optionally IOB/COB) to merged CGM data.
+    
+    Args:
+        df: Merged CGM DataFrame with a 'dateTime' column
+        treatments_df: Treatments covering the readings plus the longest lookback
+        lookback_hours: Lookback window(s) in hours
+        include_onboard: Also add 'iob' and 'cob' columns
+        basal: Scheduled basal (schedule or profile history). With it, 'iob'
+            is net IOB as Loop reports it: boluses plus temp basal and
+            suspend deviations from the schedule. Without it, boluses only.
+        timezone: Local timezone of the basal schedule
+        
+    Returns:
+        The merged DataFrame with the treatment columns added
+    """
+    if not treatments_df.empty and 'dateTime' in treatments_df.columns:
+        # Totals for every reading and window come from one set of prefix sums
+        with stage('merged.treatment_windows'):
+            df = add_trailing_treatment_totals(df, treatments_df, lookback_hours=lookback_hours)
+        if include_onboard:
+            with stage('merged.onboard'):
+                delivered = scheduled = None
+                if basal:
+                    delivered, scheduled = treatment_basal_timelines(
+                        treatments_df, basal,
+                        df['dateTime'].min() - pd.Timedelta(hours=ONBOARD_HISTORY_HOURS),
+                        df['dateTime'].max() + pd.Timedelta(minutes=1), timezone)
+                df = add_onboard_columns(df, treatments_df, basal=delivered, scheduled_basal=scheduled)
+    
+    return df
+
+
+def treatment_padding(lookback_hours: Union[int, Sequence[int]], include_onboard: bool) -> timedelta:
+    """History needed before the first reading for the treatment columns."""
+    windows = [lookback_hours] if isinstance(lookback_hours, (int, float)) else list(lookback_hours)
+    if include_onboard:
+        windows.append(ONBOARD_HISTORY_HOURS)
+    return timedelta(hours=max(windows))
+
+
+def reading_span(cgm_df: pd.DataFrame) -> Tuple[datetime, datetime]:
+    """First and last reading times of a cleaned CGM DataFrame (UTC)."""
+    return cgm_df['datetime'].min().to_pydatetime(), cgm_df['datetime'].max().to_pydatetime()
+
+
+def analyze_settings_correlation(df: pd.DataFrame) -> Dict[str, Any]:
+    """Analyze correlation between pump settings and glucose outcomes.
+    
+    Args:
+        df: Merged dataframe from get_merged_cgm_and_settings()
+        
+    Returns:
+        Dictionary with correlation analysis results
+    """
+    if df.empty:
+        return {'error': 'No data available for analysis'}
+    
+    # Determine glucose column name
+    glucose_col = 'glucose' if 'glucose' in df.columns else 'sgv'
+    
+    analysis = {
+        'data_summary': {
+            'total_readings': len(df),
+            'date_range': {
+                'start': df['dateTime'].min().isoformat(),
+                'end': df['dateTime'].max().isoformat()
+            },
+            'glucose_stats': {
+                'mean': float(df[glucose_col].mean()),
+                'std': float(df[glucose_col].std()),
+                'min': float(df[glucose_col].min()),
+                'max': float(df[glucose_col].max()),
+                'in_range_70_180': float((df[glucose_col].between(70, 180).sum() / len(df)) * 100)
+            }
+        }
+    }
+    
+    # Analyze by different basal rates
+    if 'active_basal' in df.columns and df['active_basal'].notna().any():
+        basal_groups = df.groupby('active_basal')[glucose_col].agg(['mean', 'std', 'count'])
+        analysis['basal_rate_analysis'] = basal_groups.to_dict('index')
+    
+    # Analyze by carb ratio
+    if 'active_carb_ratio' in df.columns and df['active_carb_ratio'].notna().any():
+        carb_ratio_groups = df.groupby('active_carb_ratio')[glucose_col].agg(['mean', 'std', 'count'])
+        analysis['carb_ratio_analysis'] = carb_ratio_groups.to_dict('index')
+    
+    # Analyze by ISF
+    if 'active_isf' in df.columns and df['active_isf'].notna().any():
+        isf_groups = df.groupby('active_isf')[glucose_col].agg(['mean', 'std', 'count'])
+        analysis['isf_analysis'] = isf_groups.to_dict('index')
+    
+    # Time of day patterns with settings
+    if 'hour_of_day' in df.columns:
+        hourly = df.groupby('hour_of_day').agg({
+            glucose_col: ['mean', 'std'],
+            'active_basal': 'first',
+            'active_carb_ratio': 'first',
+            'active_isf': 'first'
+        })
+        analysis['hourly_patterns'] = hourly.to_dict()
+    
+    # Calculate correlations if numeric columns exist
+    numeric_cols = [glucose_col, 'active_basal', 'active_carb_ratio', 'active_isf']
+    numeric_df = df[numeric_cols].select_dtypes(include=[np.number])
+    if len(numeric_df.columns) > 1:
+        correlations = numeric_df.corr()[glucose_col].drop(glucose_col).to_dict()
+        analysis['correlations'] = correlations
+    
+    return analysis
 
 
 class MergedDataAccess:
@@ -42,6 +265,10 @@ class MergedDataAccess:
     - Active insulin sensitivity factor at the time
     - Recent insulin and carb events (for context)
     
+    Independent fetches (CGM readings, profile history, treatments) run in
+    parallel on a small thread pool, so a merged dataset takes about as long
+    as its slowest query rather than the sum of them.
+    
     Example:
         with MergedDataAccess() as merged:
             # Get CGM data with active settings for each reading
@@ -52,18 +279,32 @@ class MergedDataAccess:
                      'active_isf']].head())
     """
     
-    def __init__(self) -> None:
-        """Initialize merged data access with CGM and pump data connections."""
-        self.cgm = CGMDataAccess()
-        self.pump = PumpDataAccess()
-        self.db_conn = MongoDBConnection()
+    def __init__(self, db_conn: Optional[MongoDBConnection] = None, max_workers: int = 3,
+                 profile_check_interval: float = 60.0) -> None:
+        """Initialize merged data access with CGM and pump data connections.
+        
+        Args:
+            db_conn: Optional existing connection. CGM and pump access share
+                this one connection (and its pooled client).
+            max_workers: Threads used for concurrent fetches (1 fetches one
+                query at a time)
+            profile_check_interval: Seconds cached profiles are trusted before
+                the newest profile version is checked again
+        """
+        self.db_conn = db_conn if db_conn is not None else MongoDBConnection()
+        self.cgm = CGMDataAccess(db_conn=self.db_conn)
+        self.pump = PumpDataAccess(db_conn=self.db_conn, profile_check_interval=profile_check_interval)
         self.database = None
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
         
-        # Cache for pump settings to avoid repeated queries
-        self._basal_profile_cache = None
-        self._carb_ratio_cache = None
-        self._isf_cache = None
-        self._profile_cache_time = None
+        # Compiled schedules of the current profile (see _refresh_profile_cache)
+        self._basal_schedule = ProfileSchedule.from_entries(None)
+        self._carb_ratio_schedule = ProfileSchedule.from_entries(None)
+        self._isf_schedule = ProfileSchedule.from_entries(None)
+        
+        # Full profile history for as-of lookups on historical readings
+        self._profile_timeline = None
     
     def __enter__(self) -> MergedDataAccess:
         """Context manager entry - connect to database."""
@@ -81,15 +322,12 @@ class MergedDataAccess:
         Returns:
             bool: True if connection successful, False otherwise
         """
-        # Connect all data sources
-        if not self.cgm.connect():
-            return False
-        if not self.pump.connect():
-            self.cgm.disconnect()
-            return False
+        # One connection serves both data sources, so only the first connect
+        # opens (and pings) the pool
         if not self.db_conn.connect():
-            self.cgm.disconnect()
-            self.pump.disconnect()
+            return False
+        if not self.cgm.connect() or not self.pump.connect():
+            self.db_conn.disconnect()
             return False
             
         self.database = self.db_conn.database
@@ -97,31 +335,95 @@ class MergedDataAccess:
     
     def disconnect(self) -> None:
         """Disconnect from the MongoDB database."""
-        if self.cgm:
-            self.cgm.disconnect()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
         if self.pump:
-            self.pump.disconnect()
+            self.pump.database = None
+        if self.cgm:
+            self.cgm.collection = None
         if self.db_conn:
             self.db_conn.disconnect()
             self.database = None
     
+    def _submit(self, call: Callable[[], Any]) -> Future:
+        """Start a fetch on the thread pool (or run it now with max_workers=1).
+        
+        Args:
+            call: Zero-argument callable issuing its own queries
+            
+        Returns:
+            Future holding the call's result
+        """
+        if self.max_workers == 1:
+            future: Future = Future()
+            try:
+                future.set_result(call())
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if self._executor is None:
+            # PyMongo clients are thread-safe, so the workers share one pool
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='sweetiepy-merged')
+        return self._executor.submit(call)
+    
+    def _run_concurrently(self, *calls: Callable[[], Any]) -> List[Any]:
+        """Run independent fetches on the thread pool and wait for all of them.
+        
+        Args:
+            *calls: Zero-argument callables, each issuing its own queries
+            
+        Returns:
+            The results, in the order of the calls
+        """
+        futures = [self._submit(call) for call in calls]
+        return [future.result() for future in futures]
+    
+    def _load_settings(self) -> Tuple[Optional[ProfileTimeline],
+                                      Tuple[ProfileSchedule, ProfileSchedule, ProfileSchedule]]:
+        """Load the profile history, or the current profile's schedules without one.
+        
+        Returns:
+            Tuple of (timeline, (basal, carb ratio, ISF) schedules)
+        """
+        with stage('merged.profile'):
+            timeline = self._refresh_profile_timeline()
+        if not timeline:
+            # Without a profile history fall back to the current profile
+            try:
+                self._refresh_profile_cache()
+            except Exception as e:
+                print(f"Warning: Could not refresh profile cache: {e}")
+        return timeline, (self._basal_schedule, self._carb_ratio_schedule, self._isf_schedule)
+    
     def _refresh_profile_cache(self) -> None:
-        """Refresh the cached pump profile settings.
+        """Refresh the current profile's compiled schedules.
         
-        Settings are cached for 5 minutes to avoid repeated database queries.
+        The pump caches the profile snapshot and reloads it only when a newer
+        profile has been stored, so this costs at most one small version check
+        per profile_check_interval (none for repeated lookups in a loop).
         """
-        now = datetime.now()
+        snapshot = self.pump.get_profile_snapshot()
+        self._basal_schedule = snapshot.schedules['basal']
+        self._carb_ratio_schedule = snapshot.schedules['carbratio']
+        self._isf_schedule = snapshot.schedules['sens']
+    
+    def _refresh_profile_timeline(self) -> Optional[ProfileTimeline]:
+        """Refresh the cached profile history.
         
-        # Check if cache is still valid (5 minute TTL)
-        if (self._profile_cache_time is not None and 
-            (now - self._profile_cache_time).seconds < 300):
-            return
+        The full history is loaded in a single query and reloaded only when
+        a newer profile has been stored.
         
-        # Refresh cache
-        self._basal_profile_cache = self.pump.get_basal_profile()
-        self._carb_ratio_cache = self.pump.get_carb_ratio_profile()
-        self._isf_cache = self.pump.get_insulin_sensitivity_profile()
-        self._profile_cache_time = now
+        Returns:
+            The compiled profile timeline, or None if it could not be loaded
+        """
+        try:
+            self._profile_timeline = self.pump.get_profile_timeline()
+        except Exception as e:
+            print(f"Warning: Could not load profile history: {e}")
+            self._profile_timeline = None
+        return self._profile_timeline
     
     def get_active_basal_at_time(self, dt: datetime) -> Optional[float]:
         """Get the basal rate that was active at a specific time.
@@ -134,89 +436,11 @@ class MergedDataAccess:
         """
         try:
             self._refresh_profile_cache()
-            
-            if not self._basal_profile_cache:
-                return None
         except Exception as e:
             print(f"Warning: Could not refresh profile cache: {e}")
             return None
         
-        # Extract time of day from datetime
-        time_of_day = dt.time()
-        
-        # Find the applicable basal rate for this time
-        # Basal profiles have 'time' (HH:MM:SS format) and 'value' fields
-        active_rate = None
-        
-        for i, entry in enumerate(self._basal_profile_cache):
-            # Parse the time string (format: "HH:MM:SS" or seconds since midnight)
-            if 'time' in entry:
-                # Handle time string format
-                entry_time_str = entry['time']
-                if ':' in entry_time_str:
-                    time_parts = entry_time_str.split(':')
-                    hour = int(time_parts[0])
-                    minute = int(time_parts[1])
-                    second = int(time_parts[2]) if len(time_parts) > 2 else 0
-                    entry_time = time(hour, minute, second)
-                else:
-                    # Handle seconds since midnight format
-                    seconds = int(entry['time'])
-                    hour = seconds // 3600
-                    minute = (seconds % 3600) // 60
-                    second = seconds % 60
-                    entry_time = time(hour, minute, second)
-            elif 'timeAsSeconds' in entry:
-                # Handle seconds since midnight
-                seconds = entry['timeAsSeconds']
-                hour = seconds // 3600
-                minute = (seconds % 3600) // 60
-                second = seconds % 60
-                entry_time = time(hour, minute, second)
-            else:
-                continue
-            
-            # Check if this entry applies to our time
-            if i + 1 < len(self._basal_profile_cache):
-                # Not the last entry - check if we're before the next entry
-                next_entry = self._basal_profile_cache[i + 1]
-                if 'time' in next_entry:
-                    next_time_str = next_entry['time']
-                    if ':' in next_time_str:
-                        time_parts = next_time_str.split(':')
-                        hour = int(time_parts[0])
-                        minute = int(time_parts[1])
-                        second = int(time_parts[2]) if len(time_parts) > 2 else 0
-                        next_time = time(hour, minute, second)
-                    else:
-                        seconds = int(next_entry['time'])
-                        hour = seconds // 3600
-                        minute = (seconds % 3600) // 60
-                        second = seconds % 60
-                        next_time = time(hour, minute, second)
-                elif 'timeAsSeconds' in next_entry:
-                    seconds = next_entry['timeAsSeconds']
-                    hour = seconds // 3600
-                    minute = (seconds % 3600) // 60
-                    second = seconds % 60
-                    next_time = time(hour, minute, second)
-                else:
-                    next_time = time(23, 59, 59)
-                
-                if entry_time <= time_of_day < next_time:
-                    active_rate = entry.get('value')
-                    break
-            else:
-                # Last entry - applies from this time until midnight
-                if entry_time <= time_of_day:
-                    active_rate = entry.get('value')
-                    break
-        
-        # If no rate found and time is before first entry, use last entry (wraps around midnight)
-        if active_rate is None and self._basal_profile_cache:
-            active_rate = self._basal_profile_cache[-1].get('value')
-        
-        return active_rate
+        return self._basal_schedule.value_at(dt)
     
     def get_active_carb_ratio_at_time(self, dt: datetime) -> Optional[float]:
         """Get the carb ratio that was active at a specific time.
@@ -228,77 +452,7 @@ class MergedDataAccess:
             The carb ratio (grams per unit), or None if not found
         """
         self._refresh_profile_cache()
-        
-        if not self._carb_ratio_cache:
-            return None
-        
-        # Similar logic to basal rates
-        time_of_day = dt.time()
-        active_ratio = None
-        
-        for i, entry in enumerate(self._carb_ratio_cache):
-            # Parse the time
-            if 'time' in entry:
-                entry_time_str = entry['time']
-                if ':' in entry_time_str:
-                    time_parts = entry_time_str.split(':')
-                    hour = int(time_parts[0])
-                    minute = int(time_parts[1])
-                    second = int(time_parts[2]) if len(time_parts) > 2 else 0
-                    entry_time = time(hour, minute, second)
-                else:
-                    seconds = int(entry['time'])
-                    hour = seconds // 3600
-                    minute = (seconds % 3600) // 60
-                    second = seconds % 60
-                    entry_time = time(hour, minute, second)
-            elif 'timeAsSeconds' in entry:
-                seconds = entry['timeAsSeconds']
-                hour = seconds // 3600
-                minute = (seconds % 3600) // 60
-                second = seconds % 60
-                entry_time = time(hour, minute, second)
-            else:
-                continue
-            
-            # Check if this entry applies
-            if i + 1 < len(self._carb_ratio_cache):
-                next_entry = self._carb_ratio_cache[i + 1]
-                if 'time' in next_entry:
-                    next_time_str = next_entry['time']
-                    if ':' in next_time_str:
-                        time_parts = next_time_str.split(':')
-                        hour = int(time_parts[0])
-                        minute = int(time_parts[1])
-                        second = int(time_parts[2]) if len(time_parts) > 2 else 0
-                        next_time = time(hour, minute, second)
-                    else:
-                        seconds = int(next_entry['time'])
-                        hour = seconds // 3600
-                        minute = (seconds % 3600) // 60
-                        second = seconds % 60
-                        next_time = time(hour, minute, second)
-                elif 'timeAsSeconds' in next_entry:
-                    seconds = next_entry['timeAsSeconds']
-                    hour = seconds // 3600
-                    minute = (seconds % 3600) // 60
-                    second = seconds % 60
-                    next_time = time(hour, minute, second)
-                else:
-                    next_time = time(23, 59, 59)
-                
-                if entry_time <= time_of_day < next_time:
-                    active_ratio = entry.get('value')
-                    break
-            else:
-                if entry_time <= time_of_day:
-                    active_ratio = entry.get('value')
-                    break
-        
-        if active_ratio is None and self._carb_ratio_cache:
-            active_ratio = self._carb_ratio_cache[-1].get('value')
-        
-        return active_ratio
+        return self._carb_ratio_schedule.value_at(dt)
     
     def get_active_isf_at_time(self, dt: datetime) -> Optional[float]:
         """Get the insulin sensitivity factor that was active at a specific time.
@@ -310,77 +464,7 @@ class MergedDataAccess:
             The ISF (mg/dL per unit), or None if not found
         """
         self._refresh_profile_cache()
-        
-        if not self._isf_cache:
-            return None
-        
-        # Similar logic to basal rates
-        time_of_day = dt.time()
-        active_isf = None
-        
-        for i, entry in enumerate(self._isf_cache):
-            # Parse the time
-            if 'time' in entry:
-                entry_time_str = entry['time']
-                if ':' in entry_time_str:
-                    time_parts = entry_time_str.split(':')
-                    hour = int(time_parts[0])
-                    minute = int(time_parts[1])
-                    second = int(time_parts[2]) if len(time_parts) > 2 else 0
-                    entry_time = time(hour, minute, second)
-                else:
-                    seconds = int(entry['time'])
-                    hour = seconds // 3600
-                    minute = (seconds % 3600) // 60
-                    second = seconds % 60
-                    entry_time = time(hour, minute, second)
-            elif 'timeAsSeconds' in entry:
-                seconds = entry['timeAsSeconds']
-                hour = seconds // 3600
-                minute = (seconds % 3600) // 60
-                second = seconds % 60
-                entry_time = time(hour, minute, second)
-            else:
-                continue
-            
-            # Check if this entry applies
-            if i + 1 < len(self._isf_cache):
-                next_entry = self._isf_cache[i + 1]
-                if 'time' in next_entry:
-                    next_time_str = next_entry['time']
-                    if ':' in next_time_str:
-                        time_parts = next_time_str.split(':')
-                        hour = int(time_parts[0])
-                        minute = int(time_parts[1])
-                        second = int(time_parts[2]) if len(time_parts) > 2 else 0
-                        next_time = time(hour, minute, second)
-                    else:
-                        seconds = int(next_entry['time'])
-                        hour = seconds // 3600
-                        minute = (seconds % 3600) // 60
-                        second = seconds % 60
-                        next_time = time(hour, minute, second)
-                elif 'timeAsSeconds' in next_entry:
-                    seconds = next_entry['timeAsSeconds']
-                    hour = seconds // 3600
-                    minute = (seconds % 3600) // 60
-                    second = seconds % 60
-                    next_time = time(hour, minute, second)
-                else:
-                    next_time = time(23, 59, 59)
-                
-                if entry_time <= time_of_day < next_time:
-                    active_isf = entry.get('value')
-                    break
-            else:
-                if entry_time <= time_of_day:
-                    active_isf = entry.get('value')
-                    break
-        
-        if active_isf is None and self._isf_cache:
-            active_isf = self._isf_cache[-1].get('value')
-        
-        return active_isf
+        return self._isf_schedule.value_at(dt)
     
     def get_merged_cgm_and_settings(self, days: int = 7) -> pd.DataFrame:
         """Get CGM data merged with active pump settings for each reading.
@@ -399,75 +483,28 @@ class MergedDataAccess:
                 - active_basal: Basal rate active at this time (units/hour)
                 - active_carb_ratio: Carb ratio active at this time (g/unit)
                 - active_isf: Insulin sensitivity factor active at this time (mg/dL per unit)
+                - profile_start: Start of the profile version in effect (when the
+                  profile history is available)
                 - hour_of_day: Hour of day (0-23)
                 - day_of_week: Day of week (0=Monday, 6=Sunday)
         """
-        # Get CGM data using the correct period types
-        if days == 1:
-            period_type = 'last_24h'
-        elif days <= 7:
-            period_type = 'last_week'
-        elif days <= 30:
-            period_type = 'last_month'
-        else:
-            # For more than 30 days, use custom period
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days)
-            cgm_df = self.cgm.get_dataframe_for_period(
-                'custom', start_date=start_date, end_date=end_date
-            )
-            
-        if days <= 30:
-            cgm_df = self.cgm.get_dataframe_for_period(period_type)
+        # Fetch exactly the requested window, with the profiles alongside
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        cgm_df, (timeline, schedules) = self._run_concurrently(
+            lambda: self.cgm.get_dataframe_for_period('custom', start_date=start_date, end_date=end_date),
+            self._load_settings,
+        )
         
         if cgm_df.empty:
             return pd.DataFrame()
         
-        # Check what columns are available in the CGM dataframe
-        print(f"CGM DataFrame columns: {list(cgm_df.columns)}")
-        
-        # Use the correct datetime column name - prefer 'datetime' if available
-        datetime_col = None
-        for col in ['dateTime', 'datetime', 'date_time']:
-            if col in cgm_df.columns:
-                datetime_col = col
-                break
-        
-        if datetime_col is None:
-            # Find the datetime column
-            datetime_cols = [col for col in cgm_df.columns if 'date' in col.lower() and 'time' in col.lower()]
-            if datetime_cols:
-                datetime_col = datetime_cols[0]
-            else:
-                raise ValueError(f"No datetime column found in CGM data. Available columns: {list(cgm_df.columns)}")
-        
-        # Ensure the datetime column is properly converted
-        if not pd.api.types.is_datetime64_any_dtype(cgm_df[datetime_col]):
-            cgm_df[datetime_col] = pd.to_datetime(cgm_df[datetime_col])
-        
-        # Add active settings for each CGM reading
-        cgm_df['active_basal'] = cgm_df[datetime_col].apply(self.get_active_basal_at_time)
-        cgm_df['active_carb_ratio'] = cgm_df[datetime_col].apply(self.get_active_carb_ratio_at_time)
-        cgm_df['active_isf'] = cgm_df[datetime_col].apply(self.get_active_isf_at_time)
-        
-        # Add time-based features for analysis
-        cgm_df['hour_of_day'] = cgm_df[datetime_col].dt.hour
-        cgm_df['day_of_week'] = cgm_df[datetime_col].dt.dayofweek
-        cgm_df['time_of_day_category'] = pd.cut(
-            cgm_df['hour_of_day'],
-            bins=[0, 6, 12, 18, 24],
-            labels=['Night', 'Morning', 'Afternoon', 'Evening'],
-            include_lowest=True
-        )
-        
-        # Ensure we have a consistent 'dateTime' column for downstream usage
-        if datetime_col != 'dateTime':
-            cgm_df['dateTime'] = cgm_df[datetime_col]
-        
-        return cgm_df
+        with stage('merged.settings'):
+            return add_settings_columns(cgm_df, timeline, schedules, self.pump.timezone)
     
     def get_merged_with_recent_treatments(self, days: int = 7, 
-                                         lookback_hours: int = 4) -> pd.DataFrame:
+                                         lookback_hours: Union[int, Sequence[int]] = 4,
+                                         include_onboard: bool = False) -> pd.DataFrame:
         """Get CGM data with settings and recent treatment context.
         
         This method adds information about recent insulin and carb events to provide
@@ -476,63 +513,41 @@ class MergedDataAccess:
         
         Args:
             days: Number of days of data to retrieve
-            lookback_hours: How many hours to look back for recent treatments
+            lookback_hours: How many hours to look back for recent treatments, or
+                a list of lookbacks (e.g. [1, 2, 4, 6]) computed in a single pass
+            include_onboard: Also add reconstructed insulin and carbs on board
+                ('iob' and 'cob' columns) at each reading. 'iob' is net IOB:
+                boluses plus temp basal and suspend deviations from the
+                scheduled basal
             
         Returns:
             DataFrame with CGM readings, active settings, and recent treatment info
+            (``insulin_last_<N>h`` and ``carbs_last_<N>h`` for each lookback)
         """
-        # Get base merged data
-        df = self.get_merged_cgm_and_settings(days=days)
-        
-        if df.empty:
-            return df
-        
-        # Get treatments for the same period plus lookback
+        # Readings and profiles are fetched concurrently. Treatments cover the
+        # readings' exact span plus the longest lookback, so they are fetched
+        # once the readings arrive, while the profiles may still be loading.
         end_date = datetime.now()
-        start_date = end_date - timedelta(days=days + 1)  # Extra day for lookback
+        start_date = end_date - timedelta(days=days)
+        cgm_future = self._submit(
+            lambda: self.cgm.get_dataframe_for_period('custom', start_date=start_date, end_date=end_date))
+        settings_future = self._submit(self._load_settings)
         
-        # Get treatments data using correct period format
-        if days + 1 == 1:
-            treatments_df = self.pump.get_dataframe_for_period('last_24h')
-        elif days + 1 <= 7:
-            treatments_df = self.pump.get_dataframe_for_period('last_week')
-        elif days + 1 <= 30:
-            treatments_df = self.pump.get_dataframe_for_period('last_month')
-        else:
-            treatments_df = self.pump.get_dataframe_for_period('last_3_months')
-        
-        if not treatments_df.empty and 'dateTime' in treatments_df.columns:
-            # For each CGM reading, calculate recent insulin and carbs
-            recent_insulin = []
-            recent_carbs = []
-            
-            for _, cgm_row in df.iterrows():
-                cgm_time = cgm_row['dateTime']
-                lookback_start = cgm_time - timedelta(hours=lookback_hours)
-                
-                # Find treatments in lookback window
-                mask = (treatments_df['dateTime'] >= lookback_start) & \
-                       (treatments_df['dateTime'] <= cgm_time)
-                recent_treatments = treatments_df[mask]
-                
-                # Sum recent insulin
-                if 'insulin' in recent_treatments.columns:
-                    insulin_sum = recent_treatments['insulin'].sum()
-                    recent_insulin.append(insulin_sum if not pd.isna(insulin_sum) else 0)
-                else:
-                    recent_insulin.append(0)
-                
-                # Sum recent carbs
-                if 'carbs' in recent_treatments.columns:
-                    carbs_sum = recent_treatments['carbs'].sum()
-                    recent_carbs.append(carbs_sum if not pd.isna(carbs_sum) else 0)
-                else:
-                    recent_carbs.append(0)
-            
-            df[f'insulin_last_{lookback_hours}h'] = recent_insulin
-            df[f'carbs_last_{lookback_hours}h'] = recent_carbs
+        cgm_df = cgm_future.result()
+        if cgm_df.empty:
+            return pd.DataFrame()
         
-        return df
+        first, last = reading_span(cgm_df)
+        padding = treatment_padding(lookback_hours, include_onboard)
+        treatments_future = self._submit(
+            lambda: self.pump.get_dataframe_for_period(start_date=first, end_date=last, padding=padding))
+        
+        timeline, schedules = settings_future.result()
+        with stage('merged.settings'):
+            df = add_settings_columns(cgm_df, timeline, schedules, self.pump.timezone)
+        treatments_df = treatments_future.result()
+        return add_treatment_context(df, treatments_df, lookback_hours, include_onboard,
+                                     basal=timeline or schedules[0], timezone=self.pump.timezone)
     
     def analyze_settings_correlation(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Analyze correlation between pump settings and glucose outcomes.
@@ -541,65 +556,10 @@ class MergedDataAccess:
             df: Merged dataframe from get_merged_cgm_and_settings()
             
         Returns:
-            Dictionary with correlation analysis results
+            Dictionary with correlation analysis results (see
+            analyze_settings_correlation)
         """
-        if df.empty:
-            return {'error': 'No data available for analysis'}
-        
-        # Determine glucose column name
-        glucose_col = 'glucose' if 'glucose' in df.columns else 'sgv'
-        
-        analysis = {
-            'data_summary': {
-                'total_readings': len(df),
-                'date_range': {
-                    'start': df['dateTime'].min().isoformat(),
-                    'end': df['dateTime'].max().isoformat()
-                },
-                'glucose_stats': {
-                    'mean': float(df[glucose_col].mean()),
-                    'std': float(df[glucose_col].std()),
-                    'min': float(df[glucose_col].min()),
-                    'max': float(df[glucose_col].max()),
-                    'in_range_70_180': float((df[glucose_col].between(70, 180).sum() / len(df)) * 100)
-                }
-            }
-        }
-        
-        # Analyze by different basal rates
-        if 'active_basal' in df.columns and df['active_basal'].notna().any():
-            basal_groups = df.groupby('active_basal')[glucose_col].agg(['mean', 'std', 'count'])
-            analysis['basal_rate_analysis'] = basal_groups.to_dict('index')
-        
-        # Analyze by carb ratio
-        if 'active_carb_ratio' in df.columns and df['active_carb_ratio'].notna().any():
-            carb_ratio_groups = df.groupby('active_carb_ratio')[glucose_col].agg(['mean', 'std', 'count'])
-            analysis['carb_ratio_analysis'] = carb_ratio_groups.to_dict('index')
-        
-        # Analyze by ISF
-        if 'active_isf' in df.columns and df['active_isf'].notna().any():
-            isf_groups = df.groupby('active_isf')[glucose_col].agg(['mean', 'std', 'count'])
-            analysis['isf_analysis'] = isf_groups.to_dict('index')
-        
-        # Time of day patterns with settings
-        if 'hour_of_day' in df.columns:
-            hourly = df.groupby('hour_of_day').agg({
-                glucose_col: ['mean', 'std'],
-                'active_basal': 'first',
-                'active_carb_ratio': 'first',
-                'active_isf': 'first'
-            })
-            analysis['hourly_patterns'] = hourly.to_dict()
-        
-        # Calculate correlations if numeric columns exist
-        numeric_cols = [glucose_col, 'active_basal', 'active_carb_ratio', 'active_isf']
-        numeric_df = df[numeric_cols].select_dtypes(include=[np.number])
-        if len(numeric_df.columns) > 1:
-            correlations = numeric_df.corr()[glucose_col].drop(glucose_col).to_dict()
-            analysis['correlations'] = correlations
-        
-        return analysis
-
+        return analyze_settings_correlation(df)
 
 def main():
     """Test the merged data access functionality."""
@@ -1,12 +1,18 @@
 from __future__ import annotations
 
-from ..connection.mongodb import MongoDBConnection
+from ..connection.instrumentation import stage
+from ..connection.mongodb import MongoDBConnection, build_projection, load_environment
+from .columnar import TREATMENT_SCHEMA, find_columnar, schema_for
+from .delivery import DeliveryTimeline, build_delivery_timeline, daily_insulin_totals
+from .schedule import ProfileSnapshot, ProfileTimeline, profile_version
 from datetime import datetime, timedelta
 import json
+import os
+import time
 import pandas as pd
 import numpy as np
 import pytz
-from typing import List, Dict, Any, Optional, Union
+from typing import Iterable, List, Dict, Any, Optional, Sequence, Tuple, Union
 
 # TIMEZONE DATA CORRUPTION ISSUE
 # ===============================
@@ -20,47 +26,171 @@ from typing import List, Dict, Any, Optional, Union
 # This module includes fixes to handle this corruption transparently
 # while maintaining compatibility with properly stored data.
 
+# Trailing UTC marker ('Z', '+00:00', '+0000') that Loop writes on local times
+_UTC_MARKER = r'(?:Z|[+-]00:?00)$'
+# Any other trailing UTC offset, which is a real offset and kept
+_UTC_OFFSET = r'[+-]\d\d:?\d\d$'
+
+
+def _as_utc(dt: datetime, timezone: str) -> datetime:
+    """Convert a datetime to UTC, treating naive values as wall-clock time in ``timezone``."""
+    if dt.tzinfo is None:
+        dt = pytz.timezone(timezone).localize(dt)
+    return dt.astimezone(pytz.UTC)
+
+
+def _localize_wall_clock(naive_series: pd.Series, local_timezone: str,
+                         ambiguous: Union[bool, str], nonexistent: str) -> pd.Series:
+    """Localize naive wall-clock times, resolving DST transitions."""
+    if isinstance(ambiguous, bool):
+        # tz_localize takes a per-element array for a fixed DST choice
+        ambiguous = np.full(len(naive_series), ambiguous)
+    return naive_series.dt.tz_localize(local_timezone, ambiguous=ambiguous, nonexistent=nonexistent)
+
+
 def _fix_corrupted_treatment_timestamps(timestamp_series: pd.Series, 
-                                       local_timezone: str = 'US/Eastern') -> pd.Series:
+                                       local_timezone: str = 'US/Eastern',
+                                       ambiguous: Union[bool, str] = False,
+                                       nonexistent: str = 'shift_forward') -> pd.Series:
     """Fix corrupted treatment timestamps that are stored as local time with UTC markers.
     
+    Only the UTC marker ('Z' or a zero offset) is treated as corrupt: those
+    timestamps are read as local wall-clock times and re-localized in one
+    vectorized ``tz_localize`` call. Timestamps with a real non-zero offset
+    are converted to the local timezone unchanged, and timestamps without
+    any offset are localized as wall-clock times. Wall-clock times that are
+    ambiguous or nonexistent at DST transitions are resolved explicitly
+    rather than raising.
+    
     Args:
         timestamp_series: Pandas series of timestamp strings or datetime objects
         local_timezone: The actual timezone the data is in (default: US/Eastern)
+        ambiguous: How to resolve wall-clock times that occur twice when DST
+            ends: False for standard time (the default, as pytz's
+            ``localize``), True for daylight time, or 'NaT' / 'raise'
+        nonexistent: How to resolve wall-clock times skipped when DST starts:
+            'shift_forward' (default), 'shift_backward', 'NaT' or 'raise'
         
     Returns:
         Pandas series with corrected timezone-aware timestamps
+        
+    Raises:
+        ValueError: If ambiguous is 'infer'. Inferring needs the rows in
+            true chronological order, which a sort on the stored wall-clock
+            strings cannot give inside the repeated hour.
     """
+    if isinstance(ambiguous, str) and ambiguous == 'infer':
+        raise ValueError("ambiguous='infer' is not supported; use False, True, 'NaT' or 'raise'")
     if timestamp_series.empty:
         return timestamp_series
     
-    # Convert to datetime if not already
-    if not pd.api.types.is_datetime64_any_dtype(timestamp_series):
-        datetime_series = pd.to_datetime(timestamp_series)
-    else:
-        datetime_series = timestamp_series
-    
-    # Check if timestamps are timezone-aware and marked as UTC
-    if datetime_series.dt.tz is not None:
-        # If marked as UTC but actually local time, fix the timezone
-        local_tz = pytz.timezone(local_timezone)
-        
+    if pd.api.types.is_datetime64_any_dtype(timestamp_series):
+        tz = timestamp_series.dt.tz
+        if tz is None:
+            return timestamp_series
+        if str(tz) != 'UTC':
+            return timestamp_series.dt.tz_convert(local_timezone)
         # Remove the incorrect UTC marker and treat as local time
-        naive_series = datetime_series.dt.tz_localize(None)
-        
-        # Properly localize as the actual local timezone
-        corrected_series = naive_series.apply(lambda dt: local_tz.localize(dt) if pd.notna(dt) else dt)
-        
-        return corrected_series
+        return _localize_wall_clock(timestamp_series.dt.tz_localize(None), local_timezone,
+                                    ambiguous, nonexistent)
+    
+    # Strip only the corrupt UTC marker; real offsets stay in the text
+    wall_clock = timestamp_series.astype('string').str.replace(_UTC_MARKER, '', regex=True)
+    has_offset = wall_clock.str.contains(_UTC_OFFSET, na=False).to_numpy(dtype=bool)
     
-    return datetime_series
+    localized = _localize_wall_clock(pd.to_datetime(wall_clock[~has_offset], format='ISO8601'),
+                                     local_timezone, ambiguous, nonexistent)
+    if not has_offset.any():
+        return localized
+    
+    offset_times = pd.to_datetime(wall_clock[has_offset], utc=True, format='ISO8601')
+    combined = pd.concat([localized, offset_times.dt.tz_convert(local_timezone)])
+    # Restore the input order
+    positions = np.concatenate([np.flatnonzero(~has_offset), np.flatnonzero(has_offset)])
+    return combined.iloc[np.argsort(positions, kind='stable')]
+
+# Fields fetched for treatment DataFrames (everything else stays on the server)
+DEFAULT_TREATMENT_FIELDS = (
+    'timestamp', 'eventType', 'insulin', 'carbs',
+    'rate', 'absolute', 'duration', 'absorptionTime',
+)
+
+# Fields relevant to each event type, used to build compact per-type tables
+EVENT_TYPE_FIELDS = {
+    'Correction Bolus': ('insulin', 'programmed', 'duration', 'type'),
+    'Temp Basal': ('rate', 'absolute', 'duration', 'temp'),
+    'Carb Correction': ('carbs', 'absorptionTime', 'foodType'),
+    'Site Change': ('notes', 'enteredBy'),
+    'Suspend Pump': ('duration', 'reason'),
+    'Resume Pump': ('reason',),
+}
+
+# Event types the delivered-insulin timeline is built from
+DELIVERY_EVENT_TYPES = ('Temp Basal', 'Suspend Pump', 'Resume Pump', 'Correction Bolus')
+
+
+def _split_by_event_type(docs: Iterable[Dict[str, Any]],
+                         columns: Dict[str, List[str]]) -> Dict[str, pd.DataFrame]:
+    """Split treatment documents into one DataFrame per requested event type.
 
-# Configure pandas to use PyArrow backend for better performance
-try:
-    pd.options.mode.dtype_backend = "pyarrow"
-except:
-    # Fallback if PyArrow backend isn't available in this pandas version
-    print("PyArrow backend not available, using default pandas backend")
+    Args:
+        docs: Treatment documents, e.g. a cursor
+        columns: Columns to keep for each event type
+
+    Returns:
+        Dict of event type -> DataFrame (types without documents are left out)
+    """
+    rows: Dict[str, List[Dict[str, Any]]] = {event_type: [] for event_type in columns}
+    for doc in docs:
+        bucket = rows.get(doc.get('eventType'))
+        if bucket is not None:
+            bucket.append(doc)
+    return {event_type: pd.DataFrame(bucket, columns=columns[event_type])
+            for event_type, bucket in rows.items() if bucket}
+
+
+# Projection for backends that cannot run _profile_history_pipeline()
+_PROFILE_HISTORY_PROJECTION = {'startDate': 1, 'created_at': 1, 'mills': 1, 'defaultProfile': 1, 'store': 1}
+
+
+def _profile_schedules_stage() -> Dict[str, Any]:
+    """Projection stage that reduces each named profile to its schedules."""
+    return {'$project': {
+        'startDate': 1,
+        'created_at': 1,
+        'mills': 1,
+        'defaultProfile': 1,
+        'store': {'$arrayToObject': {'$map': {
+            'input': {'$objectToArray': {'$ifNull': ['$store', {}]}},
+            'as': 'named',
+            'in': {
+                'k': '$$named.k',
+                'v': {
+                    'basal': '$$named.v.basal',
+                    'carbratio': '$$named.v.carbratio',
+                    'sens': '$$named.v.sens',
+                    'timezone': '$$named.v.timezone',
+                },
+            },
+        }}},
+    }}
+
+
+# Profile order shared by every profile query. '_id' breaks ties between
+# documents with the same 'startDate', so the last document of the history
+# and the newest document always have the same version.
+_PROFILE_OLDEST_FIRST = [('startDate', 1), ('_id', 1)]
+_PROFILE_NEWEST_FIRST = [('startDate', -1), ('_id', -1)]
+
+
+def _profile_history_pipeline() -> List[Dict[str, Any]]:
+    """Aggregation that projects each named profile to its schedules, oldest first."""
+    return [{'$sort': dict(_PROFILE_OLDEST_FIRST)}, _profile_schedules_stage()]
+
+
+def _current_profile_pipeline() -> List[Dict[str, Any]]:
+    """Aggregation that projects the newest profile document to its schedules."""
+    return [{'$sort': dict(_PROFILE_NEWEST_FIRST)}, {'$limit': 1}, _profile_schedules_stage()]
 
 
 class PumpDataAccess:
@@ -87,10 +217,44 @@ class PumpDataAccess:
                 treatments = pump.get_bolus_data(days=7)
     """
 
-    def __init__(self) -> None:
-        """Initialize pump data access with MongoDB connection."""
-        self.db_conn = MongoDBConnection()
+    def __init__(self, db_conn: Optional[MongoDBConnection] = None,
+                 timezone: Optional[str] = None,
+                 dst_ambiguous: Union[bool, str] = False,
+                 dst_nonexistent: str = 'shift_forward',
+                 profile_check_interval: float = 60.0) -> None:
+        """Initialize pump data access with MongoDB connection.
+        
+        Args:
+            db_conn: Optional existing connection to use (e.g. one shared with
+                other data access classes)
+            timezone: The pump's local timezone, used for naive datetimes and to
+                correct treatment timestamps (default: the LOOP_TIMEZONE
+                environment variable, else US/Eastern)
+            dst_ambiguous: How to resolve repeated wall-clock times when DST
+                ends (see _fix_corrupted_treatment_timestamps)
+            dst_nonexistent: How to resolve skipped wall-clock times when DST
+                starts (see _fix_corrupted_treatment_timestamps)
+            profile_check_interval: Seconds a cached profile is trusted before
+                the newest profile version is checked again (0 checks on
+                every call)
+        """
+        if isinstance(dst_ambiguous, str) and dst_ambiguous == 'infer':
+            raise ValueError("dst_ambiguous='infer' is not supported; use False, True, 'NaT' or 'raise'")
+        load_environment()
+        self.db_conn = db_conn if db_conn is not None else MongoDBConnection()
+        self.timezone = timezone or os.getenv('LOOP_TIMEZONE', 'US/Eastern')
+        self.dst_ambiguous = dst_ambiguous
+        self.dst_nonexistent = dst_nonexistent
+        self.profile_check_interval = profile_check_interval
         self.database = None
+        
+        # Compiled profiles, kept until a newer profile document is stored
+        self._profile_snapshot: Optional[ProfileSnapshot] = None
+        self._profile_timeline: Optional[ProfileTimeline] = None
+        self._profile_timeline_version = None
+        # Newest stored profile version and when it was last seen
+        self._latest_profile_version = None
+        self._profile_checked_at: Optional[float] = None
     
     def __enter__(self) -> PumpDataAccess:
         """Context manager entry - connect to database.
@@ -124,16 +288,30 @@ class PumpDataAccess:
             self.db_conn.disconnect()
             self.database = None
 
+    def _to_utc(self, dt: datetime) -> datetime:
+        """Convert a datetime to UTC, treating naive values as local pump time.
+        
+        Args:
+            dt: Naive (local) or timezone-aware datetime
+            
+        Returns:
+            Timezone-aware UTC datetime
+        """
+        return _as_utc(dt, self.timezone)
+
     def get_treatments(self, limit: int = 10, event_type: Optional[str] = None, 
                       start_date: Optional[datetime] = None, 
-                      end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+                      end_date: Optional[datetime] = None,
+                      fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
         """Get treatment data from the treatments collection.
 
         Args:
             limit: Maximum number of documents to return
             event_type: Filter by event type (e.g., 'Bolus', 'Temp Basal')
-            start_date: Start date for filtering
-            end_date: End date for filtering
+            start_date: Start date for filtering (naive datetimes are local pump time)
+            end_date: End date for filtering (naive datetimes are local pump time)
+            fields: Optional list of fields to return (e.g. DEFAULT_TREATMENT_FIELDS);
+                None returns whole documents
 
         Returns:
             List of treatment documents
@@ -141,31 +319,27 @@ class PumpDataAccess:
         if self.database is None:
             raise ConnectionError("Not connected to database. Call connect() first.")
 
-        # Build query
+        query = self._treatments_query(self.timezone, event_type, start_date, end_date)
+
+        # Execute query
+        treatments = list(self.database.treatments.find(query, build_projection(fields)).sort('timestamp', -1).limit(limit))
+
+        return treatments
+
+    @staticmethod
+    def _treatments_query(timezone: str, event_type: Optional[str] = None,
+                          start_date: Optional[datetime] = None,
+                          end_date: Optional[datetime] = None) -> Dict[str, Any]:
+        """Build the get_treatments() filter for a pump in ``timezone``."""
         query = {}
 
         if event_type:
             query['eventType'] = event_type
 
         if start_date or end_date:
-            date_query = {}
-            if start_date:
-                # Convert to UTC if timezone-naive (assumes local time)
-                if start_date.tzinfo is None:
-                    start_date = pytz.timezone('US/Eastern').localize(start_date).astimezone(pytz.UTC)
-                date_query['$gte'] = start_date.isoformat().replace('+00:00', 'Z')
-            if end_date:
-                # Convert to UTC if timezone-naive (assumes local time)
-                if end_date.tzinfo is None:
-                    end_date = pytz.timezone('US/Eastern').localize(end_date).astimezone(pytz.UTC)
-                date_query['$lte'] = end_date.isoformat().replace('+00:00', 'Z')
-            if date_query:
-                query['timestamp'] = date_query
+            query['timestamp'] = PumpDataAccess._timestamp_range(timezone, start_date, end_date)
 
-        # Execute query
-        treatments = list(self.database.treatments.find(query).sort('timestamp', -1).limit(limit))
-
-        return treatments
+        return query
 
     def get_bolus_data(self, days: int = 7) -> List[Dict[str, Any]]:
         """Get bolus data for the specified number of days.
@@ -180,11 +354,8 @@ class PumpDataAccess:
         start_date = end_date - timedelta(days=days)
         
         # Convert to UTC (assumes local time for naive datetimes)
-        eastern = pytz.timezone('US/Eastern')
-        if start_date.tzinfo is None:
-            start_date = eastern.localize(start_date).astimezone(pytz.UTC)
-        if end_date.tzinfo is None:
-            end_date = eastern.localize(end_date).astimezone(pytz.UTC)
+        start_date = self._to_utc(start_date)
+        end_date = self._to_utc(end_date)
 
         return self.get_treatments(
             event_type='Correction Bolus',
@@ -206,11 +377,8 @@ class PumpDataAccess:
         start_date = end_date - timedelta(days=days)
         
         # Convert to UTC (assumes local time for naive datetimes)
-        eastern = pytz.timezone('US/Eastern')
-        if start_date.tzinfo is None:
-            start_date = eastern.localize(start_date).astimezone(pytz.UTC)
-        if end_date.tzinfo is None:
-            end_date = eastern.localize(end_date).astimezone(pytz.UTC)
+        start_date = self._to_utc(start_date)
+        end_date = self._to_utc(end_date)
 
         return self.get_treatments(
             event_type='Temp Basal',
@@ -232,11 +400,8 @@ class PumpDataAccess:
         start_date = end_date - timedelta(days=days)
         
         # Convert to UTC (assumes local time for naive datetimes)
-        eastern = pytz.timezone('US/Eastern')
-        if start_date.tzinfo is None:
-            start_date = eastern.localize(start_date).astimezone(pytz.UTC)
-        if end_date.tzinfo is None:
-            end_date = eastern.localize(end_date).astimezone(pytz.UTC)
+        start_date = self._to_utc(start_date)
+        end_date = self._to_utc(end_date)
 
         return self.get_treatments(
             event_type='Carb Correction',
@@ -245,17 +410,103 @@ class PumpDataAccess:
             limit=1000
         )
 
-    def get_dataframe_for_period(self, period: str, 
-                                event_types: Optional[List[str]] = None) -> pd.DataFrame:
+    @staticmethod
+    def _stored_timestamp(timezone: str, dt: datetime) -> str:
+        """Format a datetime the way corrupted treatment timestamps are stored.
+        
+        Treatment timestamps hold local wall-clock time with a UTC marker (see
+        _fix_corrupted_treatment_timestamps), so query bounds must be local
+        wall-clock strings too for the window to match the corrected times.
+        
+        Args:
+            timezone: Pump timezone the wall-clock times are stored in
+            dt: Naive (local) or timezone-aware datetime
+            
+        Returns:
+            ISO timestamp string with a 'Z' suffix
+        """
+        local = _as_utc(dt, timezone).astimezone(pytz.timezone(timezone))
+        return local.replace(tzinfo=None).isoformat() + 'Z'
+
+    @staticmethod
+    def _timestamp_range(timezone: str, start_date: Optional[datetime],
+                         end_date: Optional[datetime]) -> Dict[str, str]:
+        """Build the 'timestamp' filter that every treatment query uses.
+        
+        Args:
+            timezone: Pump timezone (naive bounds are wall-clock times there)
+            start_date: Inclusive window start, or None for no lower bound
+            end_date: Inclusive window end, or None for no upper bound
+            
+        Returns:
+            Range filter with bounds in the stored format (see _stored_timestamp)
+        """
+        bounds = {}
+        if start_date:
+            bounds['$gte'] = PumpDataAccess._stored_timestamp(timezone, start_date)
+        if end_date:
+            bounds['$lte'] = PumpDataAccess._stored_timestamp(timezone, end_date)
+        return bounds
+
+    def get_dataframe_for_period(self, period: Optional[str] = None, 
+                                event_types: Optional[List[str]] = None,
+                                fields: Optional[Sequence[str]] = DEFAULT_TREATMENT_FIELDS,
+                                columnar: bool = False,
+                                start_date: Optional[datetime] = None,
+                                end_date: Optional[datetime] = None,
+                                padding: timedelta = timedelta(0)) -> pd.DataFrame:
         """Get treatment data as a pandas DataFrame for a specified period.
         
+        Either a named period or an exact window (start_date/end_date) can be
+        requested. ``padding`` widens the window backwards, e.g. by the longest
+        lookback of a trailing-window join, so only the treatments the join
+        needs are fetched.
+        
         Args:
-            period: Time period - 'last_24h', 'last_week', 'last_month', 'last_3_months'
+            period: Time period - 'last_24h', 'last_week', 'last_month', 'last_3_months';
+                ignored when start_date is given
             event_types: List of event types to include (default: all treatments)
+            fields: Fields to fetch from the server (default: DEFAULT_TREATMENT_FIELDS);
+                None fetches whole documents. 'timestamp' is always included.
+            columnar: Decode results straight into typed columns (pymongoarrow if
+                installed, otherwise raw BSON batches) instead of building one
+                dict per document
+            start_date: Window start (naive datetimes are local pump time)
+            end_date: Window end (default: now)
+            padding: Extra time fetched before the window start
             
         Returns:
             pandas.DataFrame: Treatment data with timestamp conversion
         """
+        query, fields = self._period_query(self.timezone, period, event_types, fields,
+                                           start_date, end_date, padding)
+        
+        if self.database is None:
+            raise ConnectionError("Not connected to database. Call connect() first.")
+        
+        # Get data
+        if columnar:
+            schema = schema_for(fields if fields is not None else DEFAULT_TREATMENT_FIELDS, TREATMENT_SCHEMA)
+            df = find_columnar(self.database.treatments, query, schema, sort=[('timestamp', -1)])
+            if df.empty:
+                return pd.DataFrame()
+            return self._treatments_frame(df, fields)
+        
+        with stage('pump.fetch'):
+            treatments = list(self.database.treatments.find(query, build_projection(fields)).sort('timestamp', -1))
+        
+        return self._treatments_frame(treatments, fields)
+
+    @staticmethod
+    def _period_query(timezone: str, period: Optional[str], event_types: Optional[List[str]],
+                      fields: Optional[Sequence[str]], start_date: Optional[datetime],
+                      end_date: Optional[datetime],
+                      padding: timedelta) -> Tuple[Dict[str, Any], Optional[List[str]]]:
+        """Build the get_dataframe_for_period() filter and field list for a pump in ``timezone``.
+        
+        Returns:
+            Tuple of (query, fields with 'timestamp' included)
+        """
         # Define time periods
         periods = {
             'last_24h': 1,
@@ -264,46 +515,50 @@ class PumpDataAccess:
             'last_3_months': 90
         }
         
-        if period not in periods:
-            raise ValueError(f"Unsupported period '{period}'. Use: {list(periods.keys())}")
-        
-        days = periods[period]
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
+        if start_date is None:
+            if period not in periods:
+                raise ValueError(f"Unsupported period '{period}'. Use: {list(periods.keys())} "
+                                 "or pass start_date/end_date")
+            end_date = datetime.now()
+            start_date = end_date - timedelta(days=periods[period])
+        elif end_date is None:
+            end_date = datetime.now()
         
-        # Convert to UTC (assumes local time for naive datetimes)
-        eastern = pytz.timezone('US/Eastern')
-        if start_date.tzinfo is None:
-            start_date = eastern.localize(start_date).astimezone(pytz.UTC)
-        if end_date.tzinfo is None:
-            end_date = eastern.localize(end_date).astimezone(pytz.UTC)
-        
-        # Build query
-        query = {
-            'timestamp': {
-                '$gte': start_date.isoformat().replace('+00:00', 'Z'),
-                '$lte': end_date.isoformat().replace('+00:00', 'Z')
-            }
-        }
+        # Build query in the stored (local wall-clock) timestamp format
+        query = {'timestamp': PumpDataAccess._timestamp_range(timezone, start_date - padding, end_date)}
         
         if event_types:
             query['eventType'] = {'$in': event_types}
         
-        if self.database is None:
-            raise ConnectionError("Not connected to database. Call connect() first.")
-        
-        # Get data
-        treatments = list(self.database.treatments.find(query).sort('timestamp', -1))
+        if fields is not None and 'timestamp' not in fields:
+            fields = ['timestamp'] + list(fields)
         
-        if not treatments:
-            return pd.DataFrame()
+        return query, (list(fields) if fields is not None else None)
+
+    def _treatments_frame(self, treatments: Union[List[Dict[str, Any]], pd.DataFrame],
+                          fields: Optional[Sequence[str]]) -> pd.DataFrame:
+        """Build a treatment DataFrame with corrected 'dateTime' values.
         
-        # Convert to DataFrame
-        df = pd.DataFrame(treatments)
+        Args:
+            treatments: Treatment documents, or an already decoded DataFrame
+            fields: Columns to build from documents (None for all fields)
+        """
+        if isinstance(treatments, pd.DataFrame):
+            df = treatments
+        else:
+            if not treatments:
+                return pd.DataFrame()
+            
+            # Convert to DataFrame
+            with stage('pump.dataframe'):
+                df = pd.DataFrame(treatments, columns=list(fields) if fields is not None else None)
         
         # Convert timestamp to datetime with timezone correction
         if 'timestamp' in df.columns:
-            df['dateTime'] = _fix_corrupted_treatment_timestamps(df['timestamp'])
+            with stage('pump.timezone_fix'):
+                df['dateTime'] = _fix_corrupted_treatment_timestamps(
+                    df['timestamp'], self.timezone,
+                    ambiguous=self.dst_ambiguous, nonexistent=self.dst_nonexistent)
             
             if not df.empty:
                 print("⚠️  Applied timezone correction for treatment data")
@@ -311,6 +566,105 @@ class PumpDataAccess:
         
         return df
 
+    def get_treatment_tables(self, event_types: Optional[Sequence[str]] = None,
+                             days: int = 7,
+                             start_date: Optional[datetime] = None,
+                             end_date: Optional[datetime] = None,
+                             fields_by_type: Optional[Dict[str, Sequence[str]]] = None,
+                             columnar: bool = False) -> Dict[str, pd.DataFrame]:
+        """Get several treatment types in one query, split into one table per type.
+        
+        A single ``eventType: {'$in': [...]}`` query fetches every requested
+        type, projected to the union of their fields. The results are then
+        split by event type, and each table holds only that type's columns,
+        with numeric columns as float64 and text columns as strings, instead
+        of one wide sparse object frame. There is no result limit.
+        
+        Args:
+            event_types: Event types to fetch (default: all of EVENT_TYPE_FIELDS)
+            days: Number of days to look back (ignored when start_date is given)
+            start_date: Window start (naive datetimes are local pump time)
+            end_date: Window end (default: now)
+            fields_by_type: Columns to keep per event type (default: EVENT_TYPE_FIELDS;
+                types without an entry get DEFAULT_TREATMENT_FIELDS)
+            columnar: Decode results straight into typed columns (pymongoarrow if
+                installed, otherwise raw BSON batches)
+            
+        Returns:
+            Dict mapping each requested event type to a DataFrame with
+            'timestamp', 'dateTime' and its own columns, sorted newest first
+            (empty DataFrames for types without treatments)
+        """
+        if self.database is None:
+            raise ConnectionError("Not connected to database. Call connect() first.")
+        
+        query, columns, union_fields = self._treatment_tables_query(event_types, days, start_date,
+                                                                    end_date, fields_by_type)
+        
+        # One round trip for every type, then split by eventType
+        if columnar:
+            df = find_columnar(self.database.treatments, query, schema_for(union_fields, TREATMENT_SCHEMA),
+                               sort=[('timestamp', -1)])
+            parts = {event_type: group[columns[event_type]].reset_index(drop=True)
+                     for event_type, group in df.groupby('eventType', sort=False)}
+        else:
+            cursor = self.database.treatments.find(query, build_projection(union_fields)).sort('timestamp', -1)
+            parts = _split_by_event_type(cursor, columns)
+        
+        return self._treatment_tables(parts, columns)
+
+    def _treatment_tables_query(self, event_types: Optional[Sequence[str]], days: int,
+                                start_date: Optional[datetime], end_date: Optional[datetime],
+                                fields_by_type: Optional[Dict[str, Sequence[str]]]
+                                ) -> Tuple[Dict[str, Any], Dict[str, List[str]], List[str]]:
+        """Build the get_treatment_tables() filter and columns.
+        
+        Returns:
+            Tuple of (query, columns of each event type, union of the fields to fetch)
+        """
+        fields_by_type = {**EVENT_TYPE_FIELDS, **(fields_by_type or {})}
+        if event_types is None:
+            event_types = list(EVENT_TYPE_FIELDS)
+        columns = {
+            event_type: ['timestamp'] + [f for f in fields_by_type.get(event_type, DEFAULT_TREATMENT_FIELDS)
+                                         if f not in ('timestamp', 'eventType')]
+            for event_type in event_types
+        }
+        
+        if start_date is None:
+            end_date = datetime.now()
+            start_date = end_date - timedelta(days=days)
+        elif end_date is None:
+            end_date = datetime.now()
+        
+        query = {
+            'timestamp': self._timestamp_range(self.timezone, start_date, end_date),
+            'eventType': {'$in': list(event_types)}
+        }
+        union_fields = ['eventType'] + list(dict.fromkeys(f for cols in columns.values() for f in cols))
+        return query, columns, union_fields
+
+    def _treatment_tables(self, parts: Dict[str, pd.DataFrame],
+                          columns: Dict[str, List[str]]) -> Dict[str, pd.DataFrame]:
+        """Type the columns of each event type's table and add corrected 'dateTime' values."""
+        tables: Dict[str, pd.DataFrame] = {}
+        for event_type in columns:
+            df = parts.get(event_type)
+            if df is None:
+                tables[event_type] = pd.DataFrame(columns=columns[event_type] + ['dateTime'])
+                continue
+            for col in columns[event_type][1:]:
+                if TREATMENT_SCHEMA.get(col) == 'float64':
+                    df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+                else:
+                    df[col] = df[col].astype('string')
+            df['dateTime'] = _fix_corrupted_treatment_timestamps(
+                df['timestamp'], self.timezone,
+                ambiguous=self.dst_ambiguous, nonexistent=self.dst_nonexistent)
+            tables[event_type] = df
+        
+        return tables
+
     def get_current_profile(self) -> Optional[Dict[str, Any]]:
         """Get the current profile settings.
 
@@ -321,84 +675,204 @@ class PumpDataAccess:
             raise ConnectionError("Not connected to database. Call connect() first.")
 
         # Get the most recent profile
-        profile = list(self.database.profile.find().sort('startDate', -1).limit(1))
+        profile = list(self.database.profile.find().sort(_PROFILE_NEWEST_FIRST).limit(1))
 
         if not profile:
             return None
 
         return profile[0]
 
-    def get_basal_profile(self) -> List[Dict[str, Any]]:
-        """Get the basal profile settings.
+    def get_profile_version(self) -> Optional[Tuple[Any, Any]]:
+        """Get the version of the newest stored profile.
+
+        One indexed query that returns only the newest document's 'startDate'
+        and '_id', used to revalidate cached profiles.
 
         Returns:
-            The basal profile settings
+            Tuple of (startDate, _id), or None if there are no profiles
         """
-        profile = self.get_current_profile()
+        if self.database is None:
+            raise ConnectionError("Not connected to database. Call connect() first.")
 
-        if not profile or 'store' not in profile:
-            return []
+        latest = list(self.database.profile.find({}, {'startDate': 1}).sort(_PROFILE_NEWEST_FIRST).limit(1))
+        return profile_version(latest[0]) if latest else None
 
-        # Get the default profile name
-        default_profile = profile.get('defaultProfile')
+    def _recent_profile_version(self) -> Tuple[bool, Optional[Tuple[Any, Any]]]:
+        """Get the newest profile version if it was seen within profile_check_interval.
 
-        if not default_profile or default_profile not in profile['store']:
-            # If no default profile, use the first one
-            if profile['store']:
-                default_profile = next(iter(profile['store']))
-            else:
-                return []
+        Returns:
+            Tuple of (still fresh, last seen version)
+        """
+        checked_at = self._profile_checked_at
+        fresh = checked_at is not None and time.monotonic() - checked_at < self.profile_check_interval
+        return fresh, self._latest_profile_version
+
+    def _record_profile_version(self, version: Optional[Tuple[Any, Any]]) -> None:
+        """Remember the newest profile version seen in a query result."""
+        self._latest_profile_version = version
+        self._profile_checked_at = time.monotonic()
+
+    def _checked_profile_version(self) -> Optional[Tuple[Any, Any]]:
+        """Get the newest profile version, querying at most once per check interval."""
+        fresh, version = self._recent_profile_version()
+        if not fresh:
+            version = self.get_profile_version()
+            self._record_profile_version(version)
+        return version
+
+    def _load_current_profile(self) -> Optional[Dict[str, Any]]:
+        """Load the newest profile document, projected to the schedules."""
+        if not getattr(self.db_conn, 'supports_aggregation', True):
+            latest = self.database.profile.find({}, _PROFILE_HISTORY_PROJECTION).sort(_PROFILE_NEWEST_FIRST).limit(1)
+        else:
+            latest = self.database.profile.aggregate(_current_profile_pipeline())
+        latest = list(latest)
+        return latest[0] if latest else None
+
+    def get_profile_snapshot(self) -> ProfileSnapshot:
+        """Get the current profile's schedules, compiled and cached.
+
+        The first call loads the newest profile with one projected query.
+        Later calls check the newest profile version (at most once per
+        profile_check_interval) and reload when a new profile has been stored.
 
-        # Get the basal profile
-        return profile['store'][default_profile].get('basal', [])
+        Returns:
+            ProfileSnapshot of the current default profile (empty if none)
+        """
+        if self.database is None:
+            raise ConnectionError("Not connected to database. Call connect() first.")
 
-    def get_carb_ratio_profile(self) -> List[Dict[str, Any]]:
-        """Get the carb ratio profile settings.
+        snapshot = self._profile_snapshot
+        if snapshot is None or snapshot.version != self._checked_profile_version():
+            snapshot = ProfileSnapshot.from_profile(self._load_current_profile())
+            self._profile_snapshot = snapshot
+            self._record_profile_version(snapshot.version)
+        return snapshot
+
+    def get_profile_history(self) -> List[Dict[str, Any]]:
+        """Get every profile document, oldest first, projected to the schedules.
+
+        Each named profile in 'store' is reduced to its basal, carb ratio and
+        insulin sensitivity schedules (plus timezone), so the full settings
+        history can be loaded in a single small query.
 
         Returns:
-            The carb ratio profile settings
+            Profile documents sorted by 'startDate' ascending
         """
-        profile = self.get_current_profile()
+        if self.database is None:
+            raise ConnectionError("Not connected to database. Call connect() first.")
 
-        if not profile or 'store' not in profile:
-            return []
+        if not getattr(self.db_conn, 'supports_aggregation', True):
+            # Backends without pipelines return whole documents instead
+            return list(self.database.profile.find({}, _PROFILE_HISTORY_PROJECTION).sort(_PROFILE_OLDEST_FIRST))
 
-        # Get the default profile name
-        default_profile = profile.get('defaultProfile')
+        return list(self.database.profile.aggregate(_profile_history_pipeline()))
 
-        if not default_profile or default_profile not in profile['store']:
-            # If no default profile, use the first one
-            if profile['store']:
-                default_profile = next(iter(profile['store']))
-            else:
-                return []
+    def get_profile_timeline(self) -> ProfileTimeline:
+        """Get the compiled history of profile settings for as-of lookups.
 
-        # Get the carb ratio profile
-        return profile['store'][default_profile].get('carbratio', [])
+        The timeline is cached and reloaded only when a newer profile has
+        been stored (checked at most once per profile_check_interval).
 
-    def get_insulin_sensitivity_profile(self) -> List[Dict[str, Any]]:
-        """Get the insulin sensitivity profile settings.
+        Returns:
+            ProfileTimeline covering every stored profile version
+        """
+        if (self._profile_timeline is not None and
+                self._profile_timeline_version == self._checked_profile_version()):
+            return self._profile_timeline
+
+        history = self.get_profile_history()
+        self._profile_timeline = ProfileTimeline.from_profiles(history)
+        self._profile_timeline_version = profile_version(history[-1]) if history else None
+        self._record_profile_version(self._profile_timeline_version)
+        return self._profile_timeline
+
+    def _delivery_window(self, days: int, start_date: Optional[datetime],
+                         end_date: Optional[datetime]) -> Tuple[datetime, datetime]:
+        """Resolve a delivery window to UTC bounds."""
+        end_date = self._to_utc(end_date or datetime.now())
+        start_date = self._to_utc(start_date) if start_date else end_date - timedelta(days=days)
+        return start_date, end_date
+
+    def _delivery_timeline(self, profile_timeline: ProfileTimeline, tables: Dict[str, pd.DataFrame],
+                           start_date: datetime, end_date: datetime) -> DeliveryTimeline:
+        """Build the delivery timeline from DELIVERY_EVENT_TYPES tables."""
+        return build_delivery_timeline(
+            profile_timeline, tables['Temp Basal'],
+            pd.Timestamp(start_date), pd.Timestamp(end_date),
+            suspends=tables['Suspend Pump'], resumes=tables['Resume Pump'],
+            timezone=self.timezone)
+
+    def _fetch_delivery(self, days: int, start_date: Optional[datetime],
+                        end_date: Optional[datetime]) -> Tuple[DeliveryTimeline, pd.DataFrame]:
+        """Build the delivery timeline and return it with the bolus table."""
+        start_date, end_date = self._delivery_window(days, start_date, end_date)
+        
+        # One query for every event type; the day before the window catches
+        # temp basals and suspends that were already running at its start
+        tables = self.get_treatment_tables(DELIVERY_EVENT_TYPES, start_date=start_date - timedelta(days=1),
+                                           end_date=end_date)
+        
+        timeline = self._delivery_timeline(self.get_profile_timeline(), tables, start_date, end_date)
+        return timeline, tables['Correction Bolus']
 
+    def get_delivery_timeline(self, days: int = 7, start_date: Optional[datetime] = None,
+                              end_date: Optional[datetime] = None) -> DeliveryTimeline:
+        """Get the basal insulin the pump actually delivered.
+        
+        Combines the scheduled basal from the profile history with temp basals
+        and suspends into a piecewise-constant rate timeline.
+        
+        Args:
+            days: Number of days to look back (ignored when start_date is given)
+            start_date: Window start (naive datetimes are local pump time)
+            end_date: Window end (default: now)
+            
         Returns:
-            The insulin sensitivity profile settings
+            DeliveryTimeline for the window, e.g. for
+            ``timeline.rate_at(cgm_df['dateTime'])``
         """
-        profile = self.get_current_profile()
+        timeline, _ = self._fetch_delivery(days, start_date, end_date)
+        return timeline
 
-        if not profile or 'store' not in profile:
-            return []
+    def get_daily_insulin_totals(self, days: int = 7, start_date: Optional[datetime] = None,
+                                 end_date: Optional[datetime] = None) -> pd.DataFrame:
+        """Get delivered basal, bolus and total daily insulin (TDD) per local day.
+        
+        Args:
+            days: Number of days to look back (ignored when start_date is given)
+            start_date: Window start (naive datetimes are local pump time)
+            end_date: Window end (default: now)
+            
+        Returns:
+            DataFrame indexed by date with 'basal', 'bolus' and 'total' units
+        """
+        timeline, boluses = self._fetch_delivery(days, start_date, end_date)
+        return daily_insulin_totals(timeline, boluses, timezone=self.timezone)
 
-        # Get the default profile name
-        default_profile = profile.get('defaultProfile')
+    def get_basal_profile(self) -> List[Dict[str, Any]]:
+        """Get the basal profile settings.
+
+        Returns:
+            The basal profile settings
+        """
+        return self.get_profile_snapshot().basal
+
+    def get_carb_ratio_profile(self) -> List[Dict[str, Any]]:
+        """Get the carb ratio profile settings.
 
-        if not default_profile or default_profile not in profile['store']:
-            # If no default profile, use the first one
-            if profile['store']:
-                default_profile = next(iter(profile['store']))
-            else:
-                return []
+        Returns:
+            The carb ratio profile settings
+        """
+        return self.get_profile_snapshot().carb_ratio
 
-        # Get the insulin sensitivity profile
-        return profile['store'][default_profile].get('sens', [])
+    def get_insulin_sensitivity_profile(self) -> List[Dict[str, Any]]:
+        """Get the insulin sensitivity profile settings.
+
+        Returns:
+            The insulin sensitivity profile settings
+        """
+        return self.get_profile_snapshot().isf
 
     def get_recent_pump_status(self, limit: int = 1) -> List[Dict[str, Any]]:
         """Get the most recent pump status.
@@ -490,11 +964,8 @@ class PumpDataAccess:
         start_date = end_date - timedelta(days=days)
         
         # Convert to UTC (assumes local time for naive datetimes)
-        eastern = pytz.timezone('US/Eastern')
-        if start_date.tzinfo is None:
-            start_date = eastern.localize(start_date).astimezone(pytz.UTC)
-        if end_date.tzinfo is None:
-            end_date = eastern.localize(end_date).astimezone(pytz.UTC)
+        start_date = self._to_utc(start_date)
+        end_date = self._to_utc(end_date)
 
         return self.get_treatments(
             event_type='Site Change',
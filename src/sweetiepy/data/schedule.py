@@ -0,0 +1,449 @@
+"""
+Compiled Time-of-Day Schedules
+
+Pump profiles store basal rates, carb ratios and insulin sensitivity factors as
+lists of ``{"time": "HH:MM:SS", "value": ...}`` entries. Looking those up one
+timestamp at a time means re-parsing every entry for every CGM reading.
+
+This module compiles a schedule once into NumPy arrays (seconds-of-day
+breakpoints plus values) so that an entire datetime column can be resolved
+with a single vectorized ``searchsorted`` call.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+SECONDS_PER_DAY = 86400
+
+
+def _entry_seconds(entry: Dict[str, Any]) -> Optional[int]:
+    """Get the start of a schedule entry as seconds since midnight.
+
+    Args:
+        entry: Profile schedule entry with 'time' ("HH:MM[:SS]" or seconds)
+            or 'timeAsSeconds'
+
+    Returns:
+        Seconds since midnight, or None if the entry has no usable time
+    """
+    if 'time' in entry:
+        time_value = str(entry['time'])
+        if ':' in time_value:
+            time_parts = time_value.split(':')
+            hour = int(time_parts[0])
+            minute = int(time_parts[1])
+            second = int(time_parts[2]) if len(time_parts) > 2 else 0
+            return hour * 3600 + minute * 60 + second
+        return int(float(time_value))
+    if 'timeAsSeconds' in entry:
+        return int(entry['timeAsSeconds'])
+    return None
+
+
+def seconds_of_day(times: Union[pd.Series, pd.DatetimeIndex]) -> np.ndarray:
+    """Get the wall-clock seconds since midnight for a datetime column.
+
+    Timezone-aware values are read in their own timezone, matching
+    ``datetime.time()`` on the individual timestamps.
+
+    Args:
+        times: Datetime series or index
+
+    Returns:
+        Integer array of seconds since midnight
+    """
+    if isinstance(times, pd.Series):
+        times = pd.DatetimeIndex(times)
+    return (times.hour * 3600 + times.minute * 60 + times.second).to_numpy(dtype=np.int64)
+
+
+class ProfileSchedule:
+    """A time-of-day schedule compiled into NumPy arrays.
+
+    The schedule is normalized so that its first breakpoint is at midnight:
+    if the profile starts later in the day, the last entry wraps around and
+    covers the time before the first entry, as it does on the pump.
+
+    Attributes:
+        breakpoints: Sorted start times of each segment (seconds since midnight)
+        values: Setting value for each segment
+
+    Example:
+        schedule = ProfileSchedule.from_entries(pump.get_basal_profile())
+        df['active_basal'] = schedule.lookup(df['datetime'])
+    """
+
+    def __init__(self, breakpoints: np.ndarray, values: np.ndarray) -> None:
+        """Initialize a schedule from breakpoint and value arrays.
+
+        Args:
+            breakpoints: Segment start times in seconds since midnight
+            values: Setting value for each segment
+        """
+        breakpoints = np.asarray(breakpoints, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+
+        order = np.argsort(breakpoints, kind='stable')
+        breakpoints = breakpoints[order]
+        values = values[order]
+
+        if len(breakpoints) and breakpoints[0] > 0:
+            # Before the first entry the previous day's last entry still applies
+            breakpoints = np.concatenate(([0], breakpoints))
+            values = np.concatenate((values[-1:], values))
+
+        self.breakpoints = breakpoints
+        self.values = values
+
+    @classmethod
+    def from_entries(cls, entries: Optional[List[Dict[str, Any]]]) -> ProfileSchedule:
+        """Compile a schedule from profile entries.
+
+        Args:
+            entries: Profile entries such as the 'basal', 'carbratio' or
+                'sens' arrays of a Nightscout profile
+
+        Returns:
+            Compiled schedule (empty if there are no usable entries)
+        """
+        breakpoints = []
+        values = []
+        for entry in entries or []:
+            seconds = _entry_seconds(entry)
+            if seconds is None:
+                continue
+            value = entry.get('value')
+            breakpoints.append(seconds)
+            values.append(np.nan if value is None else float(value))
+        return cls(np.array(breakpoints, dtype=np.int64), np.array(values, dtype=np.float64))
+
+    def __len__(self) -> int:
+        return len(self.breakpoints)
+
+    def __bool__(self) -> bool:
+        return len(self.breakpoints) > 0
+
+    def __repr__(self) -> str:
+        return f"ProfileSchedule({len(self)} segments)"
+
+    def lookup_seconds(self, seconds: np.ndarray) -> np.ndarray:
+        """Get the active value for each time of day.
+
+        Args:
+            seconds: Array of seconds since midnight
+
+        Returns:
+            Float array of active values (NaN if the schedule is empty)
+        """
+        seconds = np.asarray(seconds, dtype=np.int64)
+        if not self:
+            return np.full(seconds.shape, np.nan)
+        idx = np.searchsorted(self.breakpoints, seconds, side='right') - 1
+        return self.values[idx]
+
+    def lookup(self, times: Union[pd.Series, pd.DatetimeIndex]) -> np.ndarray:
+        """Get the active value at every timestamp of a datetime column.
+
+        Args:
+            times: Datetime series or index
+
+        Returns:
+            Float array of active values aligned with ``times``
+        """
+        return self.lookup_seconds(seconds_of_day(times))
+
+    def value_at(self, dt: datetime) -> Optional[float]:
+        """Get the active value at a single datetime.
+
+        Args:
+            dt: The datetime to look up
+
+        Returns:
+            The active value, or None if the schedule is empty
+        """
+        if not self:
+            return None
+        seconds = dt.hour * 3600 + dt.minute * 60 + dt.second
+        value = self.lookup_seconds(np.array([seconds]))[0]
+        return None if np.isnan(value) else float(value)
+
+
+def _profile_start(profile: Dict[str, Any]) -> Optional[pd.Timestamp]:
+    """Get the time a profile document took effect as a UTC timestamp.
+
+    Args:
+        profile: Nightscout profile document
+
+    Returns:
+        UTC timestamp, or None if the document has no usable start time
+    """
+    for field in ('startDate', 'created_at', 'mills'):
+        value = profile.get(field)
+        if value is None:
+            continue
+        try:
+            if isinstance(value, (int, float)):
+                return pd.Timestamp(int(value), unit='ms', tz='UTC')
+            start = pd.Timestamp(value)
+        except (ValueError, TypeError):
+            continue
+        if pd.isna(start):
+            continue
+        return start.tz_convert('UTC') if start.tzinfo else start.tz_localize('UTC')
+    return None
+
+
+def get_default_store(profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Get the active named profile from a profile document's 'store'.
+
+    Args:
+        profile: Nightscout profile document
+
+    Returns:
+        The default profile's settings, the first stored profile if there is
+        no valid default, or an empty dict
+    """
+    if not profile or not profile.get('store'):
+        return {}
+
+    default_profile = profile.get('defaultProfile')
+    if not default_profile or default_profile not in profile['store']:
+        # If no default profile, use the first one
+        default_profile = next(iter(profile['store']))
+
+    return profile['store'][default_profile] or {}
+
+
+def profile_version(profile: Optional[Dict[str, Any]]) -> Optional[Tuple[Any, Any]]:
+    """Get the key that identifies a stored profile version.
+
+    Args:
+        profile: Nightscout profile document (at least 'startDate' and '_id')
+
+    Returns:
+        Tuple of (startDate, _id), or None without a document
+    """
+    if not profile:
+        return None
+    return profile.get('startDate'), profile.get('_id')
+
+
+class ProfileSnapshot:
+    """The current pump profile with its schedules compiled once.
+
+    Holds the default named profile (basal, carb ratio and ISF schedules plus
+    timezone) together with the version of the document it came from, so a
+    cache can be revalidated by comparing the newest stored version instead
+    of reloading the document.
+
+    Attributes:
+        version: (startDate, _id) of the profile document, or None
+        store: The default named profile's settings
+        schedules: Compiled schedule per setting ('basal', 'carbratio', 'sens')
+
+    Example:
+        snapshot = pump.get_profile_snapshot()
+        df['active_basal'] = snapshot.schedules['basal'].lookup(df['datetime'])
+    """
+
+    SETTINGS = ('basal', 'carbratio', 'sens')
+
+    def __init__(self, store: Dict[str, Any], version: Optional[Tuple[Any, Any]] = None) -> None:
+        """Initialize a snapshot from a named profile.
+
+        Args:
+            store: Named profile settings ('basal', 'carbratio', 'sens', ...)
+            version: (startDate, _id) of the profile document
+        """
+        self.version = version
+        self.store = store
+        self.schedules = {setting: ProfileSchedule.from_entries(store.get(setting))
+                          for setting in self.SETTINGS}
+
+    @classmethod
+    def from_profile(cls, profile: Optional[Dict[str, Any]]) -> ProfileSnapshot:
+        """Build a snapshot from a profile document.
+
+        Args:
+            profile: Nightscout profile document, or None
+
+        Returns:
+            Snapshot of the document's default profile (empty without one)
+        """
+        return cls(get_default_store(profile), profile_version(profile))
+
+    @property
+    def basal(self) -> List[Dict[str, Any]]:
+        """Basal schedule entries."""
+        return self.store.get('basal', [])
+
+    @property
+    def carb_ratio(self) -> List[Dict[str, Any]]:
+        """Carb ratio schedule entries."""
+        return self.store.get('carbratio', [])
+
+    @property
+    def isf(self) -> List[Dict[str, Any]]:
+        """Insulin sensitivity schedule entries."""
+        return self.store.get('sens', [])
+
+    @property
+    def timezone(self) -> Optional[str]:
+        """The profile's timezone, if set."""
+        return self.store.get('timezone')
+
+    def __bool__(self) -> bool:
+        return bool(self.store)
+
+    def __repr__(self) -> str:
+        return f"ProfileSnapshot(version={self.version!r})"
+
+
+class ProfileTimeline:
+    """The history of pump profiles, compiled for as-of lookups.
+
+    Every profile version is compiled into ``ProfileSchedule`` objects, and
+    the versions are concatenated into one breakpoint array per setting
+    (offset by version so they never overlap). Resolving a datetime column is
+    then an as-of join on profile start times followed by a single
+    ``searchsorted`` over the combined breakpoints, with no per-row work.
+
+    Readings from before the first known profile use the earliest profile.
+
+    Attributes:
+        start_times: Sorted UTC start times of each profile version (ns)
+        schedules: Compiled schedules per setting ('basal', 'carbratio',
+            'sens'), one per version
+
+    Example:
+        timeline = ProfileTimeline.from_profiles(pump.get_profile_history())
+        df['active_basal'] = timeline.lookup(df['datetime'], 'basal')
+    """
+
+    SETTINGS = ('basal', 'carbratio', 'sens')
+
+    def __init__(self, start_times: np.ndarray,
+                 schedules: Dict[str, List[ProfileSchedule]]) -> None:
+        """Initialize a timeline from per-version start times and schedules.
+
+        Args:
+            start_times: Sorted UTC start time of each version (ns since epoch)
+            schedules: For each setting, one compiled schedule per version
+        """
+        self.start_times = np.asarray(start_times, dtype=np.int64)
+        self.schedules = schedules
+
+        # Concatenate every version's breakpoints, offset by version, so one
+        # searchsorted call can resolve readings from any version
+        self._combined: Dict[str, tuple] = {}
+        for setting, versions in schedules.items():
+            keys = []
+            values = []
+            for version, schedule in enumerate(versions):
+                offset = version * SECONDS_PER_DAY
+                if schedule:
+                    keys.append(schedule.breakpoints + offset)
+                    values.append(schedule.values)
+                else:
+                    keys.append(np.array([offset], dtype=np.int64))
+                    values.append(np.array([np.nan]))
+            if keys:
+                self._combined[setting] = (np.concatenate(keys), np.concatenate(values))
+
+    @classmethod
+    def from_profiles(cls, profiles: List[Dict[str, Any]]) -> ProfileTimeline:
+        """Compile a timeline from Nightscout profile documents.
+
+        Args:
+            profiles: Profile documents in any order; documents without a
+                start time are skipped
+
+        Returns:
+            Compiled profile timeline
+        """
+        dated = []
+        for profile in profiles:
+            start = _profile_start(profile)
+            if start is not None:
+                dated.append((start.value, profile))
+        dated.sort(key=lambda item: item[0])
+
+        start_times = np.array([start for start, _ in dated], dtype=np.int64)
+        schedules = {setting: [] for setting in cls.SETTINGS}
+        for _, profile in dated:
+            store = get_default_store(profile)
+            for setting in cls.SETTINGS:
+                schedules[setting].append(ProfileSchedule.from_entries(store.get(setting)))
+
+        return cls(start_times, schedules)
+
+    def __len__(self) -> int:
+        return len(self.start_times)
+
+    def __bool__(self) -> bool:
+        return len(self.start_times) > 0
+
+    def __repr__(self) -> str:
+        return f"ProfileTimeline({len(self)} versions)"
+
+    def version_at(self, times: Union[pd.Series, pd.DatetimeIndex]) -> np.ndarray:
+        """Get the index of the profile version in effect at each timestamp.
+
+        Args:
+            times: Datetime series or index (naive values are treated as UTC)
+
+        Returns:
+            Integer array of version indices aligned with ``times``
+        """
+        instants = pd.DatetimeIndex(times).as_unit('ns').asi8
+        version = np.searchsorted(self.start_times, instants, side='right') - 1
+        return np.clip(version, 0, None)
+
+    def start_at(self, times: Union[pd.Series, pd.DatetimeIndex]) -> pd.DatetimeIndex:
+        """Get the start time of the profile version in effect at each timestamp.
+
+        Args:
+            times: Datetime series or index
+
+        Returns:
+            UTC start times aligned with ``times``
+        """
+        return pd.DatetimeIndex(self.start_times[self.version_at(times)], tz='UTC')
+
+    def lookup(self, times: Union[pd.Series, pd.DatetimeIndex], setting: str) -> np.ndarray:
+        """Get the value of a setting in effect at every timestamp.
+
+        Args:
+            times: Datetime series or index
+            setting: 'basal', 'carbratio' or 'sens'
+
+        Returns:
+            Float array of active values aligned with ``times`` (NaN if no
+            profile version defines the setting)
+        """
+        if setting not in self.SETTINGS:
+            raise ValueError(f"Unsupported setting '{setting}'. Use: {list(self.SETTINGS)}")
+        if not self or setting not in self._combined:
+            return np.full(len(times), np.nan)
+
+        keys, values = self._combined[setting]
+        query = self.version_at(times) * SECONDS_PER_DAY + seconds_of_day(times)
+        idx = np.searchsorted(keys, query, side='right') - 1
+        return values[idx]
+
+    def latest(self, setting: str) -> ProfileSchedule:
+        """Get the most recent compiled schedule for a setting.
+
+        Args:
+            setting: 'basal', 'carbratio' or 'sens'
+
+        Returns:
+            The newest version's schedule (empty if there are no versions)
+        """
+        versions = self.schedules.get(setting) or []
+        return versions[-1] if versions else ProfileSchedule.from_entries(None)
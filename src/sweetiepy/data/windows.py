@@ -0,0 +1,112 @@
+"""
+Trailing Window Aggregation
+
+Computes totals of treatment values (insulin, carbs) over trailing time windows
+ending at each CGM reading. Event timestamps are sorted once, the values are
+turned into prefix sums, and every window boundary is located with
+``searchsorted``, so the cost is O((readings + treatments) log treatments)
+regardless of how many readings fall in each window.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+
+def _to_utc_ns(times: Union[pd.Series, pd.DatetimeIndex]) -> np.ndarray:
+    """Convert a datetime column to int64 nanoseconds since the epoch (UTC).
+
+    Args:
+        times: Datetime series or index (naive values are treated as UTC)
+
+    Returns:
+        Integer array of nanoseconds since the epoch
+    """
+    return pd.DatetimeIndex(times).as_unit('ns').asi8
+
+
+def trailing_window_sums(event_times: Union[pd.Series, pd.DatetimeIndex],
+                         event_values: Dict[str, Iterable[float]],
+                         query_times: Union[pd.Series, pd.DatetimeIndex],
+                         lookback_hours: Sequence[float]) -> Dict[str, Dict[float, np.ndarray]]:
+    """Sum event values over trailing windows ending at each query time.
+
+    A window for query time ``t`` covers events with
+    ``t - lookback <= event_time <= t``. Missing values count as zero.
+
+    Args:
+        event_times: Timestamps of the events (any order)
+        event_values: Value arrays aligned with ``event_times``, keyed by name
+        query_times: Timestamps at which windows end
+        lookback_hours: Window lengths in hours; all share one sort and
+            one set of prefix sums
+
+    Returns:
+        Mapping of value name -> window length -> totals aligned with
+        ``query_times``
+    """
+    event_ns = _to_utc_ns(event_times)
+    query_ns = _to_utc_ns(query_times)
+
+    # Drop events without a timestamp and sort the rest once
+    valid = event_ns != np.iinfo(np.int64).min
+    order = np.argsort(event_ns[valid], kind='stable')
+    event_ns = event_ns[valid][order]
+
+    prefix_sums = {}
+    for name, values in event_values.items():
+        values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        values = np.nan_to_num(values[valid][order], nan=0.0)
+        prefix_sums[name] = np.concatenate(([0.0], np.cumsum(values)))
+
+    upper = np.searchsorted(event_ns, query_ns, side='right')
+
+    totals: Dict[str, Dict[float, np.ndarray]] = {name: {} for name in event_values}
+    for hours in lookback_hours:
+        window_ns = int(pd.Timedelta(hours=hours).value)
+        lower = np.searchsorted(event_ns, query_ns - window_ns, side='left')
+        for name, cumulative in prefix_sums.items():
+            totals[name][hours] = cumulative[upper] - cumulative[lower]
+
+    return totals
+
+
+def add_trailing_treatment_totals(df: pd.DataFrame, treatments_df: pd.DataFrame,
+                                  lookback_hours: Union[float, Sequence[float]] = 4,
+                                  time_col: str = 'dateTime',
+                                  value_cols: Sequence[str] = ('insulin', 'carbs')) -> pd.DataFrame:
+    """Add trailing treatment totals as columns of a CGM DataFrame.
+
+    Adds one ``<value>_last_<hours>h`` column per value column and window,
+    e.g. ``insulin_last_4h`` and ``carbs_last_4h``.
+
+    Args:
+        df: CGM DataFrame with a datetime column
+        treatments_df: Treatment DataFrame with a datetime column
+        lookback_hours: One window length or several, in hours
+        time_col: Name of the datetime column in both DataFrames
+        value_cols: Treatment columns to total (absent columns total zero)
+
+    Returns:
+        The CGM DataFrame with the total columns added
+    """
+    if isinstance(lookback_hours, (int, float)):
+        lookback_hours = [lookback_hours]
+    lookback_hours: List[float] = list(lookback_hours)
+
+    event_values = {
+        col: treatments_df[col] if col in treatments_df.columns
+        else np.zeros(len(treatments_df))
+        for col in value_cols
+    }
+    totals = trailing_window_sums(treatments_df[time_col], event_values,
+                                  df[time_col], lookback_hours)
+
+    for hours in lookback_hours:
+        for col in value_cols:
+            df[f'{col}_last_{hours:g}h'] = totals[col][hours]
+
+    return df
@@ -0,0 +1,365 @@
+"""
+Benchmark Harness
+
+Measures the public data pipelines at several data sizes against a local
+stand-in database (synthetic data in a ``LocalConnection`` snapshot), so a
+performance change can be measured instead of guessed:
+
+- wall time (best of several runs)
+- peak Python memory (``tracemalloc``, one separate run; allocations made
+  inside Arrow are not traced)
+- documents per second (result rows / best wall time)
+
+Cold-start import time of the package is measured in fresh interpreters.
+Results are saved as JSON baselines and compared against an earlier baseline
+with a relative threshold. Run the suite with ``dev/run_benchmarks.py``.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+import pandas as pd
+
+SIZES = {'1d': 1, '30d': 30, '2y': 730, '10y': 3650}
+
+# Timing differences below this many seconds are treated as noise
+MIN_SECONDS_DELTA = 0.01
+
+
+def _count(result: Any) -> int:
+    """Number of documents or rows a pipeline returned."""
+    if isinstance(result, (pd.DataFrame, list)):
+        return len(result)
+    return 0
+
+
+def measure(func: Callable[[], Any], repeat: int = 3, setup: Optional[Callable[[], Any]] = None,
+            quiet: bool = True, docs: Optional[int] = None) -> Dict[str, float]:
+    """Time a callable and record its peak memory.
+
+    Args:
+        func: Callable to measure; receives ``setup()``'s result when ``setup``
+            is given
+        repeat: Number of timed runs; the fastest is reported
+        setup: Optional untimed callable run before every call
+        quiet: Hide anything the callable prints
+        docs: Documents processed per call (default: rows returned)
+
+    Returns:
+        Dict with 'seconds', 'peak_mb', 'docs' and 'docs_per_second'
+    """
+    def call():
+        args = (setup(),) if setup else ()
+        output = io.StringIO() if quiet else None
+        with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+            start = time.perf_counter()
+            result = func(*args)
+            return time.perf_counter() - start, result
+
+    timings = []
+    result = None
+    for _ in range(max(repeat, 1)):
+        seconds, result = call()
+        timings.append(seconds)
+
+    # Memory in a separate run: tracing slows the code down
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    seconds = min(timings)
+    docs = _count(result) if docs is None else docs
+    return {
+        'seconds': round(seconds, 6),
+        'peak_mb': round(peak / 2**20, 3),
+        'docs': docs,
+        'docs_per_second': round(docs / seconds, 1) if seconds > 0 else 0.0,
+    }
+
+
+def measure_import_time(statement: str = 'import sweetiepy', runs: int = 5) -> Dict[str, Any]:
+    """Measure a cold-start import in fresh interpreters.
+
+    Args:
+        statement: Import statement to time
+        runs: Number of interpreters; the fastest is reported
+
+    Returns:
+        Dict with 'seconds' and the heavy 'modules' the statement loaded
+    """
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "heavy = [m for m in ('pandas', 'numpy', 'pyarrow', 'pyarrow.parquet', 'pymongo', 'pytz', 'dotenv') if m in sys.modules]\n"
+        "print(elapsed, ','.join(heavy))\n"
+    )
+    timings = []
+    modules: List[str] = []
+    for _ in range(max(runs, 1)):
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                check=True).stdout.split()
+        timings.append(float(output[0]))
+        modules = output[1].split(',') if len(output) > 1 else []
+    return {'seconds': round(min(timings), 6), 'modules': modules}
+
+
+def prepare_data(root: Union[str, Path], days: int, seed: int = 0,
+                 timezone: str = 'US/Eastern') -> Path:
+    """Write a synthetic snapshot ending today, reusing one already made today.
+
+    Args:
+        root: Directory for the snapshot
+        days: Days of data
+        seed: Generator seed
+        timezone: Patient timezone
+
+    Returns:
+        Snapshot directory
+    """
+    from .synthetic import SyntheticNightscout
+
+    root = Path(root).expanduser()
+    today = pd.Timestamp.now(tz=timezone).normalize()
+    start = today - pd.Timedelta(days=days - 1)
+    marker = root / 'synthetic.json'
+    spec = {'days': days, 'seed': seed, 'timezone': timezone, 'start': start.isoformat()}
+
+    if marker.exists() and json.loads(marker.read_text()) == spec:
+        return root
+
+    root.mkdir(parents=True, exist_ok=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        SyntheticNightscout(days=days, start=start, seed=seed, timezone=timezone).write_local(root)
+    marker.write_text(json.dumps(spec))
+    return root
+
+
+class EncodedCollection:
+    """In-memory collection that serves pre-encoded BSON replies.
+
+    Stands in for a server collection so the columnar decoders and the
+    per-document path can be measured on the same bytes, without a network.
+    Queries are ignored: ``find_raw_batches`` returns the stored documents as
+    raw batches, and ``aggregate`` decodes the same documents pre-grouped into
+    field arrays, as the server-side columns pipeline would return them.
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]], fields: List[str],
+                 batch_size: int = 10000) -> None:
+        from bson import encode
+
+        from ..data.columnar import COLUMN_CHUNK_SIZE
+
+        self.batches = [b''.join(encode(doc) for doc in documents[i:i + batch_size])
+                        for i in range(0, len(documents), batch_size)]
+        grouped = []
+        for chunk, start in enumerate(range(0, len(documents), COLUMN_CHUNK_SIZE)):
+            docs = documents[start:start + COLUMN_CHUNK_SIZE]
+            group = {'_id': chunk, '_n': list(range(start + 1, start + len(docs) + 1))}
+            group.update({field: [doc.get(field) for doc in docs] for field in fields})
+            grouped.append(encode(group))
+        self.grouped = b''.join(grouped)
+
+    def find_raw_batches(self, query: Optional[Dict[str, Any]] = None,
+                         projection: Optional[Dict[str, Any]] = None) -> EncodedCollection:
+        return self
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs: Any) -> List[Dict[str, Any]]:
+        from bson import decode_all
+
+        return decode_all(self.grouped)
+
+    def batch_size(self, batch_size: int) -> EncodedCollection:
+        return self
+
+    def sort(self, *args: Any) -> EncodedCollection:
+        return self
+
+    def limit(self, limit: int) -> EncodedCollection:
+        return self
+
+    def close(self) -> None:
+        pass
+
+    def __iter__(self):
+        return iter(self.batches)
+
+
+def decode_benchmarks(documents: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Define the decoder benchmarks over the same encoded documents.
+
+    Args:
+        documents: Projected entries documents
+
+    Returns:
+        Benchmark definitions as in ``pipeline_benchmarks``
+    """
+    from bson import decode_all
+
+    from ..data.cgm import DEFAULT_ENTRY_FIELDS
+    from ..data.columnar import ENTRY_SCHEMA, _find_raw_batches, _find_server_columns, schema_for
+
+    collection = EncodedCollection(documents, list(DEFAULT_ENTRY_FIELDS))
+    schema = schema_for(DEFAULT_ENTRY_FIELDS, ENTRY_SCHEMA)
+
+    def documents_frame():
+        return pd.DataFrame([doc for batch in collection for doc in decode_all(batch)])
+
+    return {
+        'decode.documents': {'func': documents_frame},
+        'decode.raw_batches': {'func': lambda: _find_raw_batches(collection, {}, schema, None, None, 10000)},
+        'decode.server_columns': {'func': lambda: _find_server_columns(collection, {}, schema, None, None)},
+    }
+
+
+def pipeline_benchmarks(db_conn: Any, days: int) -> Dict[str, Dict[str, Any]]:
+    """Define the benchmarked pipelines for one data size.
+
+    Args:
+        db_conn: Connected database connection (e.g. ``LocalConnection``)
+        days: Days of data in the database
+
+    Returns:
+        Dict of name -> {'func': callable, optional 'setup' callable and
+        'docs' count for pipelines that do not return rows}
+    """
+    from ..connection.mongodb import build_projection
+    from ..data.cgm import DEFAULT_ENTRY_FIELDS, CGMDataAccess
+    from ..data.merged import MergedDataAccess
+    from ..data.pump import PumpDataAccess
+
+    end = datetime.now()
+    start = end - timedelta(days=days)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        cgm = CGMDataAccess(db_conn=db_conn)
+        pump = PumpDataAccess(db_conn=db_conn)
+        merged = MergedDataAccess(db_conn=db_conn)
+        cgm.connect()
+        pump.connect()
+        merged.connect()
+        raw = cgm.get_dataframe_for_period('custom', start, end, clean_data=False)
+        clean = cgm._clean_dataframe(raw.copy())
+    documents = list(db_conn.database.entries.find({}, build_projection(DEFAULT_ENTRY_FIELDS)))
+
+    return {
+        **decode_benchmarks(documents),
+        'cgm.get_dataframe_for_period': {'func': lambda: cgm.get_dataframe_for_period('custom', start, end)},
+        'cgm._clean_dataframe': {'func': cgm._clean_dataframe, 'setup': raw.copy},
+        'cgm.analyze_dataframe': {'func': lambda: cgm.analyze_dataframe(clean), 'docs': len(clean)},
+        'cgm.get_downsampled': {'func': lambda: cgm.get_downsampled(start, end, bucket='1h'), 'docs': len(raw)},
+        'pump.get_dataframe_for_period': {'func': lambda: pump.get_dataframe_for_period(start_date=start,
+                                                                                      end_date=end)},
+        'merged.get_merged_cgm_and_settings': {'func': lambda: merged.get_merged_cgm_and_settings(days=days)},
+        'merged.get_merged_with_recent_treatments': {
+            'func': lambda: merged.get_merged_with_recent_treatments(days=days)},
+    }
+
+
+def run_suite(data_dir: Union[str, Path], sizes: Sequence[str] = ('1d', '30d'), repeat: int = 3,
+              only: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Run every pipeline at each data size.
+
+    Args:
+        data_dir: Directory holding one synthetic snapshot per size
+        sizes: Keys of ``SIZES`` to run
+        repeat: Timed runs per pipeline
+        only: Optional substrings; only pipelines whose name contains one run
+
+    Returns:
+        Results dict with 'meta' and 'results' ('<size>/<pipeline>' -> metrics)
+    """
+    from ..connection.local import LocalConnection
+
+    results = {}
+    for statement in ('import sweetiepy', 'from sweetiepy import MongoDBConnection',
+                      'from sweetiepy import CGMDataAccess'):
+        metrics = measure_import_time(statement, runs=repeat)
+        results[f'import/{statement}'] = {'seconds': metrics['seconds']}
+        print(f"✓ import {statement:<50} {metrics['seconds'] * 1000:>10.1f} ms")
+
+    for size in sizes:
+        days = SIZES[size]
+        print(f"Preparing {size} of synthetic data...")
+        conn = LocalConnection(prepare_data(Path(data_dir) / size, days))
+        with contextlib.redirect_stdout(io.StringIO()):
+            conn.connect()
+        try:
+            for name, bench in pipeline_benchmarks(conn, days).items():
+                if only and not any(part in name for part in only):
+                    continue
+                metrics = measure(bench['func'], repeat=repeat, setup=bench.get('setup'),
+                                  docs=bench.get('docs'))
+                results[f'{size}/{name}'] = metrics
+                print(f"✓ {size:>4} {name:<45} {metrics['seconds'] * 1000:>10.1f} ms "
+                      f"{metrics['peak_mb']:>9.1f} MB {metrics['docs_per_second']:>12,.0f} docs/s")
+        finally:
+            with contextlib.redirect_stdout(io.StringIO()):
+                conn.disconnect()
+
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def save_results(results: Dict[str, Any], path: Union[str, Path]) -> None:
+    """Save benchmark results as JSON."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, sort_keys=True))
+
+
+def load_results(path: Union[str, Path]) -> Dict[str, Any]:
+    """Load benchmark results saved with ``save_results``."""
+    return json.loads(Path(path).read_text())
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any],
+                    threshold: float = 0.25) -> List[Dict[str, Any]]:
+    """Find benchmarks that got slower or use more memory than the baseline.
+
+    Args:
+        current: Results from ``run_suite``
+        baseline: Earlier results
+        threshold: Allowed relative increase (0.25 = 25%)
+
+    Returns:
+        One entry per regression with 'benchmark', 'metric', 'baseline',
+        'current' and 'change' (relative increase)
+    """
+    regressions = []
+    for name, metrics in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        for metric, slack in (('seconds', MIN_SECONDS_DELTA), ('peak_mb', 0.0)):
+            old, new = before.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            if new > old * (1 + threshold) and new - old > slack:
+                regressions.append({'benchmark': name, 'metric': metric, 'baseline': old,
+                                    'current': new, 'change': round(new / old - 1, 3)})
+    return regressions
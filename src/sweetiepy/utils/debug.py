@@ -1,12 +1,13 @@
 import os
 from urllib.parse import quote_plus
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
 
 def debug_connection_info():
     """Debug connection information without revealing password."""
+    from dotenv import load_dotenv
+    
+    # Load environment variables from .env file
+    load_dotenv()
+    
     username = os.getenv('MONGODB_USERNAME')
     password = os.getenv('MONGODB_PW')
     uri_template = os.getenv('MONGODB_URI')
@@ -0,0 +1,379 @@
+"""
+Synthetic Nightscout Data
+
+Generates realistic, deterministic Nightscout collections for tests and
+benchmarks, so scaling behaviour can be measured without a live database:
+
+- profile: basal/carb ratio/ISF schedules, re-tuned every few months
+- entries: a CGM reading every 5 minutes driven by meals and a daily
+  rhythm, with sensor gaps, warm-ups and duplicate uploads
+- treatments: meal carbs and boluses, Loop-style temp basals every 5 minutes,
+  suspends/resumes and site changes
+- devicestatus: Loop and pump status uploads
+
+Treatment timestamps can be written the way the affected uploader stores
+them (local wall-clock time with a UTC "Z" marker, see pump.py), so the
+timezone correction and DST transitions are exercised. The same seed always
+produces the same documents; every collection is generated lazily so a
+decade of data can be streamed into MongoDB or local files.
+
+Example:
+    data = SyntheticNightscout(days=365, seed=7)
+    data.load_into_mongo(MongoClient()['synthetic'])
+    data.write_local('~/snapshots/synthetic')
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+MINUTES_PER_READING = 5
+
+BASAL_SCHEDULE = [('00:00', 0.8), ('04:00', 1.0), ('09:00', 0.9), ('15:00', 0.85), ('21:00', 0.95)]
+CARB_RATIO_SCHEDULE = [('00:00', 10.0), ('11:00', 12.0), ('17:00', 11.0)]
+ISF_SCHEDULE = [('00:00', 50.0), ('06:00', 45.0), ('22:00', 55.0)]
+
+# Typical meal times (local hour) and carb sizes
+MEALS = [(7.5, 40), (12.5, 60), (18.5, 70)]
+
+DIRECTIONS = [(-3.0, 'DoubleDown', 7), (-2.0, 'SingleDown', 6), (-1.0, 'FortyFiveDown', 5),
+              (1.0, 'Flat', 4), (2.0, 'FortyFiveUp', 3), (3.0, 'SingleUp', 2)]
+
+
+def _schedule(entries: List[tuple], scale: float = 1.0) -> List[Dict[str, Any]]:
+    """Build Nightscout schedule entries from (time, value) pairs."""
+    result = []
+    for time_str, value in entries:
+        hours, minutes = (int(part) for part in time_str.split(':'))
+        result.append({'time': time_str, 'value': round(value * scale, 2),
+                       'timeAsSeconds': hours * 3600 + minutes * 60})
+    return result
+
+
+def _schedule_values(entries: List[tuple], local_hours: np.ndarray) -> np.ndarray:
+    """Look up a time-of-day schedule at fractional local hours."""
+    starts = np.array([int(t[:2]) + int(t[3:]) / 60 for t, _ in entries])
+    values = np.array([v for _, v in entries])
+    return values[np.searchsorted(starts, local_hours, side='right') - 1]
+
+
+class SyntheticNightscout:
+    """Deterministic generator of one patient's Nightscout collections.
+
+    Attributes:
+        days: Number of days generated
+        start: UTC start of the data
+        timezone: Patient's local timezone
+        seed: Random seed; equal seeds give equal documents
+    """
+
+    def __init__(self, days: int = 30, start: Union[str, pd.Timestamp] = '2024-01-01',
+                 seed: int = 0, timezone: str = 'US/Eastern',
+                 corrupt_timestamps: bool = True,
+                 gaps_per_week: float = 2.0,
+                 duplicate_rate: float = 0.002,
+                 devicestatus_minutes: int = 5) -> None:
+        """Configure the generator.
+
+        Args:
+            days: Number of days to generate (a decade is ~3650)
+            start: Local start date of the data
+            seed: Random seed
+            timezone: Local timezone used for meals, schedules and timestamps
+            corrupt_timestamps: Store treatment timestamps as local wall-clock
+                time with a 'Z' marker, like the affected uploader
+            gaps_per_week: Average number of CGM signal gaps per week
+            duplicate_rate: Fraction of CGM readings uploaded twice
+            devicestatus_minutes: Interval between devicestatus uploads
+        """
+        self.days = days
+        self.timezone = timezone
+        self.start = pd.Timestamp(start).tz_localize(timezone).tz_convert('UTC') \
+            if pd.Timestamp(start).tzinfo is None else pd.Timestamp(start).tz_convert('UTC')
+        self.seed = seed
+        self.corrupt_timestamps = corrupt_timestamps
+        self.gaps_per_week = gaps_per_week
+        self.duplicate_rate = duplicate_rate
+        self.devicestatus_minutes = devicestatus_minutes
+        self._glucose: Optional[tuple] = None
+        self._meals: Optional[tuple] = None
+
+    def _rng(self, stream: int) -> np.random.Generator:
+        """Independent random stream per collection, so call order never matters."""
+        return np.random.default_rng([self.seed, stream])
+
+    @property
+    def end(self) -> pd.Timestamp:
+        """UTC end of the data."""
+        return self.start + pd.Timedelta(days=self.days)
+
+    def _grid(self, minutes: int) -> pd.DatetimeIndex:
+        return pd.date_range(self.start, self.end, freq=f'{minutes}min', inclusive='left')
+
+    def _local_hours(self, times: pd.DatetimeIndex) -> np.ndarray:
+        local = times.tz_convert(self.timezone)
+        return np.asarray(local.hour + local.minute / 60 + local.second / 3600, dtype=np.float64)
+
+    def _format_treatment_time(self, times: pd.DatetimeIndex) -> np.ndarray:
+        if self.corrupt_timestamps:
+            times = times.tz_convert(self.timezone)
+        return np.asarray(times.strftime('%Y-%m-%dT%H:%M:%SZ'))
+
+    def meals(self) -> tuple:
+        """Meal times (UTC DatetimeIndex) and carbs (grams)."""
+        if self._meals is None:
+            rng = self._rng(1)
+            local_days = pd.date_range(self.start.tz_convert(self.timezone).normalize(),
+                                       periods=self.days + 1, freq='D')
+            times, carbs = [], []
+            for hour, grams in MEALS:
+                offsets = hour + rng.normal(0, 0.75, len(local_days))
+                times.append(local_days + pd.to_timedelta(offsets, unit='h'))
+                carbs.append(np.round(np.clip(rng.normal(grams, grams * 0.3, len(local_days)), 5, 150)))
+            # Occasional snacks
+            snacks = rng.random(len(local_days)) < 0.4
+            times.append(local_days[snacks] + pd.to_timedelta(rng.uniform(14, 22, snacks.sum()), unit='h'))
+            carbs.append(np.round(rng.uniform(8, 25, snacks.sum())))
+
+            meal_times = pd.DatetimeIndex(np.concatenate([t.tz_convert('UTC').as_unit('ns').asi8 for t in times]),
+                                          tz='UTC')
+            meal_carbs = np.concatenate(carbs)
+            keep = (meal_times >= self.start) & (meal_times < self.end)
+            order = np.argsort(meal_times[keep].asi8)
+            self._meals = (meal_times[keep][order], meal_carbs[keep][order])
+        return self._meals
+
+    def glucose(self) -> tuple:
+        """Reading times (UTC, every 5 minutes) and glucose values (mg/dL)."""
+        if self._glucose is None:
+            rng = self._rng(2)
+            times = self._grid(MINUTES_PER_READING)
+            n = len(times)
+            hours = self._local_hours(times)
+
+            # Daily rhythm (dawn phenomenon) plus slowly wandering noise
+            level = 120 + 15 * np.sin((hours - 4) / 24 * 2 * np.pi)
+            noise = np.cumsum(rng.normal(0, 2.0, n))
+            noise -= pd.Series(noise).rolling(288, min_periods=1).mean().to_numpy()
+
+            # Meal responses: rise over ~1 h, settle over ~3 h
+            meal_times, meal_carbs = self.meals()
+            steps = np.arange(0, 5 * 60, MINUTES_PER_READING) / 60
+            kernel = 3.0 * steps * np.exp(1 - steps)
+            meal_index = ((meal_times - self.start) // pd.Timedelta(minutes=MINUTES_PER_READING)).to_numpy()
+            impulses = np.bincount(meal_index.astype(np.int64), weights=meal_carbs, minlength=n)[:n]
+            response = np.convolve(impulses, kernel)[:n]
+
+            sgv = np.clip(np.round(level + noise + response), 40, 400)
+            self._glucose = (times, sgv)
+        return self._glucose
+
+    def profiles(self) -> List[Dict[str, Any]]:
+        """Profile documents, with basal re-tuned every ~90 days."""
+        rng = self._rng(3)
+        docs = []
+        for index, offset in enumerate(range(0, max(self.days, 1), 90)):
+            start = self.start + pd.Timedelta(days=offset)
+            scale = 1.0 if index == 0 else float(np.round(rng.uniform(0.9, 1.1), 2))
+            docs.append({
+                'defaultProfile': 'Default',
+                'startDate': start.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                'created_at': start.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                'mills': int(start.value // 10**6),
+                'units': 'mg/dl',
+                'store': {'Default': {
+                    'dia': 6,
+                    'timezone': self.timezone,
+                    'units': 'mg/dl',
+                    'basal': _schedule(BASAL_SCHEDULE, scale),
+                    'carbratio': _schedule(CARB_RATIO_SCHEDULE),
+                    'sens': _schedule(ISF_SCHEDULE),
+                    'target_low': [{'time': '00:00', 'value': 100, 'timeAsSeconds': 0}],
+                    'target_high': [{'time': '00:00', 'value': 110, 'timeAsSeconds': 0}],
+                }},
+            })
+        return docs
+
+    def entries(self) -> Iterator[Dict[str, Any]]:
+        """CGM entries with gaps, sensor warm-ups and duplicate uploads."""
+        rng = self._rng(4)
+        times, sgv = self.glucose()
+        n = len(times)
+
+        keep = np.ones(n, dtype=bool)
+        # Signal loss: short and occasionally long gaps
+        gap_count = rng.poisson(self.gaps_per_week * self.days / 7)
+        gap_starts = rng.integers(0, max(n, 1), gap_count)
+        gap_lengths = np.where(rng.random(gap_count) < 0.8, rng.integers(2, 12, gap_count),
+                               rng.integers(12, 48, gap_count))
+        # Two-hour warm-up after each 10-day sensor session
+        warmups = np.arange(288 * 10, n, 288 * 10)
+        for start, length in zip(np.concatenate([gap_starts, warmups]),
+                                 np.concatenate([gap_lengths, np.full(len(warmups), 24)])):
+            keep[start:start + length] = False
+
+        delta = np.diff(sgv, prepend=sgv[:1]) / MINUTES_PER_READING
+        bounds = np.array([limit for limit, _, _ in DIRECTIONS])
+        direction_index = np.searchsorted(bounds, delta, side='left')
+        names = [name for _, name, _ in DIRECTIONS] + ['DoubleUp']
+        trends = [trend for _, _, trend in DIRECTIONS] + [1]
+
+        jitter = rng.integers(0, 30, n)
+        date_ms = (times.as_unit('ns').asi8 // 10**6) + jitter * 1000
+        date_strings = pd.DatetimeIndex(date_ms * 10**6, tz='UTC').strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        duplicates = rng.random(n) < self.duplicate_rate
+
+        for i in np.flatnonzero(keep):
+            doc = {
+                'sgv': int(sgv[i]),
+                'date': float(date_ms[i]),
+                'dateString': date_strings[i],
+                'trend': trends[direction_index[i]],
+                'direction': names[direction_index[i]],
+                'device': 'share2',
+                'type': 'sgv',
+                'utcOffset': 0,
+                'sysTime': date_strings[i],
+            }
+            yield doc
+            if duplicates[i]:
+                yield dict(doc)
+
+    def treatments(self) -> Iterator[Dict[str, Any]]:
+        """Carbs, boluses, temp basals, suspends and site changes, oldest first."""
+        rng = self._rng(5)
+        events: List[tuple] = []
+
+        # Meals: carbs plus a bolus sized by the carb ratio
+        meal_times, meal_carbs = self.meals()
+        ratios = _schedule_values(CARB_RATIO_SCHEDULE, self._local_hours(meal_times))
+        absorption = rng.choice([120, 180, 240], len(meal_times))
+        meal_stamps = self._format_treatment_time(meal_times)
+        for stamp, ns, grams, ratio, minutes in zip(meal_stamps, meal_times.asi8, meal_carbs, ratios, absorption):
+            events.append((ns, {'eventType': 'Carb Correction', 'carbs': float(grams),
+                                'absorptionTime': int(minutes), 'timestamp': stamp}))
+            events.append((ns + 1, {'eventType': 'Correction Bolus', 'insulin': round(float(grams / ratio), 2),
+                                    'programmed': round(float(grams / ratio), 2), 'type': 'normal',
+                                    'timestamp': stamp}))
+
+        # Loop temp basals every 5 minutes, scaled by glucose
+        times, sgv = self.glucose()
+        scheduled = _schedule_values(BASAL_SCHEDULE, self._local_hours(times))
+        rates = np.round(np.clip(scheduled * (1 + (sgv - 120) / 150), 0, 4) / 0.05) * 0.05
+        cancels = rng.random(len(times)) < 0.02
+        stamps = self._format_treatment_time(times)
+        for stamp, ns, rate, cancel in zip(stamps, times.asi8, rates, cancels):
+            rate = round(float(rate), 2)
+            events.append((ns, {'eventType': 'Temp Basal', 'rate': rate, 'absolute': rate,
+                                'duration': 0 if cancel else 30, 'temp': 'absolute',
+                                'timestamp': stamp}))
+
+        # Occasional suspends (about twice a month) and a site change every 3 days
+        suspend_count = rng.poisson(self.days / 15)
+        suspend_times = self.start + pd.to_timedelta(np.sort(rng.uniform(0, self.days * 1440, suspend_count)),
+                                                     unit='min')
+        resume_times = suspend_times + pd.to_timedelta(rng.integers(10, 60, suspend_count), unit='min')
+        for ns, stamp in zip(suspend_times.asi8, self._format_treatment_time(suspend_times)):
+            events.append((ns, {'eventType': 'Suspend Pump', 'timestamp': stamp}))
+        for ns, stamp in zip(resume_times.asi8, self._format_treatment_time(resume_times)):
+            events.append((ns, {'eventType': 'Resume Pump', 'timestamp': stamp}))
+
+        site_times = self.start + pd.to_timedelta(np.arange(0, self.days, 3) * 1440
+                                                  + rng.uniform(600, 1200, len(range(0, self.days, 3))), unit='min')
+        for ns, stamp in zip(site_times.asi8, self._format_treatment_time(site_times)):
+            events.append((ns, {'eventType': 'Site Change', 'notes': 'Cannula changed',
+                                'enteredBy': 'synthetic', 'timestamp': stamp}))
+
+        events.sort(key=lambda event: event[0])
+        for _, doc in events:
+            doc['created_at'] = doc['timestamp']
+            yield doc
+
+    def devicestatus(self) -> Iterator[Dict[str, Any]]:
+        """Loop and pump status uploads."""
+        rng = self._rng(6)
+        times = self._grid(self.devicestatus_minutes)
+        iob = np.clip(rng.normal(1.5, 1.0, len(times)), -1, 8)
+        cob = np.clip(rng.normal(15, 15, len(times)), 0, 120)
+        reservoir = 200 - (np.arange(len(times)) * self.devicestatus_minutes / 60 * 2.0) % 180
+        stamps = np.asarray(times.strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+        for i, stamp in enumerate(stamps):
+            yield {
+                'created_at': stamp,
+                'device': 'loop://iPhone',
+                'loop': {'timestamp': stamp, 'iob': {'iob': round(float(iob[i]), 2), 'timestamp': stamp},
+                         'cob': {'cob': round(float(cob[i]), 1), 'timestamp': stamp}},
+                'pump': {'clock': stamp, 'reservoir': round(float(reservoir[i]), 1),
+                         'battery': {'percent': 80}, 'suspended': False},
+            }
+
+    def collections(self) -> Dict[str, Iterator[Dict[str, Any]]]:
+        """Lazy document iterators keyed by collection name."""
+        return {
+            'entries': self.entries(),
+            'treatments': self.treatments(),
+            'devicestatus': self.devicestatus(),
+            'profile': iter(self.profiles()),
+        }
+
+    def load_into_mongo(self, database: Any, batch_size: int = 10000) -> Dict[str, int]:
+        """Insert every collection into a MongoDB database.
+
+        Args:
+            database: pymongo Database (e.g. on a local mongod)
+            batch_size: Documents per insert_many call
+
+        Returns:
+            Number of documents inserted per collection
+        """
+        counts = {}
+        for name, docs in self.collections().items():
+            count = 0
+            batch = []
+            for doc in docs:
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    database[name].insert_many(batch, ordered=False)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                database[name].insert_many(batch, ordered=False)
+                count += len(batch)
+            counts[name] = count
+            print(f"✓ Inserted {count} documents into {name}")
+        return counts
+
+    def write_local(self, root: Union[str, Path]) -> Dict[str, int]:
+        """Write every collection as a local Parquet snapshot (see connection.local).
+
+        Args:
+            root: Snapshot directory
+
+        Returns:
+            Number of documents written per collection
+        """
+        from ..connection.local import write_collection
+
+        counts = {}
+        for name, docs in self.collections().items():
+            counts[name] = write_collection(root, name, docs)
+            print(f"✓ Wrote {counts[name]} documents to {name}.parquet")
+        return counts
+
+
+def generate_patients(count: int, seed: int = 0, **kwargs: Any) -> List[SyntheticNightscout]:
+    """Create generators for several patients with distinct seeds.
+
+    Args:
+        count: Number of patients
+        seed: Base seed (patient i uses seed + i)
+        **kwargs: Passed to SyntheticNightscout
+
+    Returns:
+        One generator per patient
+    """
+    return [SyntheticNightscout(seed=seed + i, **kwargs) for i in range(count)]
@@ -0,0 +1,217 @@
+"""Stand-in collections, cursors and connections shared by the tests."""
+
+import asyncio
+
+from sweetiepy.connection.local import LocalConnection
+
+_COMPARISONS = {
+    '$gt': lambda value, bound: value > bound,
+    '$gte': lambda value, bound: value >= bound,
+    '$lt': lambda value, bound: value < bound,
+    '$lte': lambda value, bound: value <= bound,
+    '$in': lambda value, bound: value in bound,
+}
+
+
+def matches(doc, query):
+    """Check a document against equality, $in and range conditions."""
+    for field, condition in (query or {}).items():
+        if not isinstance(condition, dict):
+            if doc.get(field) != condition:
+                return False
+        elif field not in doc or not all(_COMPARISONS[op](doc[field], bound)
+                                         for op, bound in condition.items()):
+            return False
+    return True
+
+
+def project(doc, projection):
+    """Apply an inclusion or exclusion projection to a document."""
+    if not projection:
+        return dict(doc)
+    included = [field for field, keep in projection.items() if keep and field != '_id']
+    if not included:
+        return {field: value for field, value in doc.items() if projection.get(field, 1)}
+    if projection.get('_id', 1):
+        included.insert(0, '_id')
+    return {field: doc[field] for field in included if field in doc}
+
+
+class FakeCursor:
+    """Query result with the pymongo cursor methods the library uses.
+
+    Like a server, it sorts and limits the whole documents and only applies
+    the projection to what it returns.
+    """
+
+    def __init__(self, docs=(), projection=None, plan=None):
+        self.docs = list(docs)
+        self.projection = projection
+        self.plan = plan
+        self.batch = None
+        self.closed = False
+
+    def sort(self, key_or_list, direction=1):
+        keys = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        for key, key_direction in reversed(keys):
+            self.docs.sort(key=lambda doc: doc.get(key), reverse=key_direction < 0)
+        return self
+
+    def limit(self, limit):
+        if limit:
+            del self.docs[limit:]
+        return self
+
+    def batch_size(self, batch_size):
+        self.batch = batch_size
+        return self
+
+    def close(self):
+        self.closed = True
+
+    def explain(self):
+        return {'queryPlanner': {'winningPlan': self.plan}}
+
+    def __iter__(self):
+        return (project(doc, self.projection) for doc in self.docs)
+
+
+class RecordingCollection:
+    """In-memory collection that records every query, projection, cursor and created index.
+
+    ``plan`` is the winning plan its cursors' explain() reports.
+    """
+
+    def __init__(self, documents=(), plan=None):
+        self.documents = list(documents)
+        self.plan = plan
+        self.queries = []
+        self.projections = []
+        self.cursors = []
+        self.created = []
+
+    def find(self, query=None, projection=None):
+        self.queries.append(query)
+        self.projections.append(projection)
+        cursor = FakeCursor((doc for doc in self.documents if matches(doc, query)), projection, self.plan)
+        self.cursors.append(cursor)
+        return cursor
+
+    def index_information(self):
+        indexes = {'_id_': {'key': [('_id', 1)]}}
+        indexes.update((index_name(keys), {'key': keys}) for keys in self.created)
+        return indexes
+
+    def create_index(self, keys):
+        self.created.append(keys)
+        return index_name(keys)
+
+
+def index_name(keys):
+    """Default MongoDB name of an index, e.g. 'date_-1'."""
+    return '_'.join(f'{field}_{direction}' for field, direction in keys)
+
+
+class FakeDatabase(dict):
+    """Collections by name, with the pymongo Database listing method."""
+
+    def list_collection_names(self):
+        return list(self)
+
+
+class CountingCollection:
+    """Wraps a collection and counts the queries sent to it."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.queries = 0
+
+    def find(self, *args, **kwargs):
+        self.queries += 1
+        return self.collection.find(*args, **kwargs)
+
+
+class WrappedDatabase:
+    """Database whose collections are wrapped on access, e.g. to delay or record queries."""
+
+    def __init__(self, database, wrap):
+        self.database = database
+        self.wrap = wrap
+
+    def __getitem__(self, name):
+        return self.wrap(name, self.database[name])
+
+    __getattr__ = __getitem__
+
+
+class WrappedLocalConnection(LocalConnection):
+    """LocalConnection whose collections pass through ``wrap(name, collection)``."""
+
+    def __init__(self, root, wrap):
+        super().__init__(root)
+        self.wrap = wrap
+
+    def connect(self):
+        if not super().connect():
+            return False
+        if not isinstance(self.database, WrappedDatabase):
+            self.database = WrappedDatabase(self.database, self.wrap)
+        return True
+
+
+class AsyncCursor:
+    """Async cursor over a local cursor, shaped like pymongo's AsyncCursor."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self.cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, limit):
+        self.cursor.limit(limit)
+        return self
+
+    def batch_size(self, batch_size):
+        return self
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(0)
+        return list(self.cursor)
+
+    async def __aiter__(self):
+        for doc in self.cursor:
+            await asyncio.sleep(0)
+            yield doc
+
+    async def close(self):
+        self.cursor.close()
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+
+class AsyncLocalConnection:
+    """Async connection over a local snapshot, shaped like AsyncMongoDBConnection."""
+
+    supports_aggregation = False
+
+    def __init__(self, root):
+        self.conn = LocalConnection(root)
+        self.database = None
+
+    async def connect(self):
+        if not self.conn.connect():
+            return False
+        self.database = WrappedDatabase(self.conn.database, lambda name, collection: AsyncCollection(collection))
+        return True
+
+    async def disconnect(self):
+        self.conn.disconnect()
+        self.database = None
@@ -0,0 +1,139 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sweetiepy.data.cgm import CGMDataAccess, _histogram_summary
+from sweetiepy.utils.synthetic import SyntheticNightscout
+
+
+def evaluate(expression, frame):
+    """Evaluate the arithmetic aggregation expressions analyze_period uses."""
+    if isinstance(expression, str) and expression.startswith('$'):
+        return frame[expression[1:]]
+    if not isinstance(expression, dict):
+        return expression
+    (operator, args), = expression.items()
+    values = [evaluate(arg, frame) for arg in args] if isinstance(args, list) else evaluate(args, frame)
+    if operator == '$floor':
+        return np.floor(values)
+    if operator == '$divide':
+        return values[0] / values[1]
+    if operator == '$mod':
+        return np.fmod(values[0], values[1])
+    if operator == '$add':
+        return values[0] + values[1]
+    if operator == '$subtract':
+        return values[0] - values[1]
+    raise NotImplementedError(operator)
+
+
+def match(frame, query):
+    """Apply a $match of equality and $gt/$gte/$lte conditions."""
+    keep = pd.Series(True, index=frame.index)
+    for field, condition in query.items():
+        column = frame[field]
+        if not isinstance(condition, dict):
+            keep &= column == condition
+            continue
+        for operator, bound in condition.items():
+            compare = {'$gt': column.gt, '$gte': column.ge, '$lte': column.le}[operator]
+            keep &= compare(bound).fillna(False)
+    return frame[keep]
+
+
+def group(frame, spec):
+    """Apply a $group whose accumulators are $sum: 1, $avg, $min or $max."""
+    key = spec['_id']
+    keys = pd.Series(0 if key is None else evaluate(key, frame), index=frame.index)
+    results = []
+    for value, rows in frame.groupby(keys):
+        bucket = {'_id': None if key is None else value}
+        for name, accumulator in spec.items():
+            if name == '_id':
+                continue
+            (operator, argument), = accumulator.items()
+            if operator == '$sum':
+                bucket[name] = len(rows) * argument
+            else:
+                column = evaluate(argument, rows)
+                bucket[name] = {'$avg': column.mean, '$min': column.min, '$max': column.max}[operator]()
+        results.append(bucket)
+    return results
+
+
+class FrameEntries:
+    """Stand-in for the entries collection that runs aggregations in pandas."""
+
+    def __init__(self, documents):
+        self.frame = pd.DataFrame(documents)
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        frame = self.frame
+        results = None
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == '$match':
+                frame = match(frame, spec)
+            elif name == '$group':
+                results = group(frame, spec)
+            elif name == '$sort':
+                (field, direction), = spec.items()
+                results.sort(key=lambda bucket: bucket[field], reverse=direction < 0)
+            elif name == '$facet':
+                results = [{facet: group(frame, stages[0]['$group']) for facet, stages in spec.items()}]
+            else:
+                raise NotImplementedError(name)
+        return iter(results)
+
+
+def test_analyze_period_matches_analyze_dataframe():
+    """The two aggregation passes reproduce the downloaded-DataFrame summary."""
+    documents = list(SyntheticNightscout(days=8, seed=2).entries())
+    # Readings _clean_dataframe drops: unusable values and an extreme outlier
+    documents[5]['sgv'] = 0
+    del documents[6]['sgv']
+    documents[7]['sgv'] = 595
+    documents[8]['type'] = 'mbg'
+    start = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    end = datetime(2024, 1, 8, 12, tzinfo=timezone.utc)
+
+    cgm = CGMDataAccess(db_conn=SimpleNamespace())
+    cgm.collection = FrameEntries(documents)
+    server = cgm.analyze_period('custom', start, end)
+
+    query = cgm._time_range_query(start, end)
+    in_window = [doc for doc in documents
+                 if query['date']['$gte'] <= doc['date'] <= query['date']['$lte']]
+    local = cgm.analyze_dataframe(cgm.to_dataframe(in_window))
+
+    assert len(cgm.collection.pipelines) == 2
+    assert server['basic_stats']['total_readings'] == local['basic_stats']['total_readings']
+    for section in ('basic_stats', 'time_in_range', 'data_quality'):
+        assert server[section] == pytest.approx(local[section]), section
+    for pattern in ('avg_by_hour', 'avg_by_day_of_week'):
+        assert server['temporal_patterns'][pattern] == pytest.approx(local['temporal_patterns'][pattern])
+
+
+def test_histogram_summary_matches_pandas():
+    rng = np.random.default_rng(4)
+    readings = pd.Series(rng.integers(40, 400, size=1001).astype(float))
+    counts = readings.value_counts().sort_index()
+
+    summary = _histogram_summary(counts.index.to_numpy(), counts.to_numpy())
+
+    assert summary == pytest.approx({
+        'count': len(readings),
+        'mean': readings.mean(),
+        'median': readings.median(),
+        'std': readings.std(),
+        'min': readings.min(),
+        'max': readings.max(),
+    })
+    # Even counts take the average of the middle pair
+    even = readings[:-1].value_counts().sort_index()
+    assert _histogram_summary(even.index.to_numpy(), even.to_numpy())['median'] == readings[:-1].median()
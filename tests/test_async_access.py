@@ -0,0 +1,160 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sweetiepy.connection.local import LocalConnection
+from sweetiepy.data.async_access import AsyncCGMDataAccess, AsyncMergedDataAccess, AsyncPumpDataAccess
+from sweetiepy.data.cgm import CGMDataAccess
+from sweetiepy.data.merged import MergedDataAccess
+from sweetiepy.data.pump import PumpDataAccess
+from sweetiepy.utils.benchmark import prepare_data
+
+from .conftest import AsyncLocalConnection
+
+
+def test_async_merged_matches_sync(tmp_path):
+    root = prepare_data(tmp_path, days=3)
+
+    async def fetch():
+        async with AsyncMergedDataAccess(db_conn=AsyncLocalConnection(root)) as merged:
+            return await merged.get_merged_with_recent_treatments(days=2, lookback_hours=[1, 4])
+
+    async_df = asyncio.run(fetch())
+    with MergedDataAccess(db_conn=LocalConnection(root)) as merged:
+        sync_df = merged.get_merged_with_recent_treatments(days=2, lookback_hours=[1, 4])
+
+    assert len(async_df) > 400
+    columns = ['dateTime', 'sgv', 'active_basal', 'active_isf', 'insulin_last_1h', 'carbs_last_4h']
+    pd.testing.assert_frame_equal(async_df[columns], sync_df[columns])
+
+
+def test_async_pump_treatments_and_profile(tmp_path):
+    root = prepare_data(tmp_path, days=2)
+
+    async def fetch():
+        async with AsyncPumpDataAccess(db_conn=AsyncLocalConnection(root)) as pump:
+            return await asyncio.gather(pump.get_dataframe_for_period('last_24h'),
+                                        pump.get_basal_profile(),
+                                        pump.get_insulin_on_board())
+
+    treatments, basal, iob = asyncio.run(fetch())
+
+    assert {'Temp Basal', 'Correction Bolus'} <= set(treatments['eventType'])
+    assert treatments['dateTime'].dt.tz is not None
+    assert basal[0]['time'] == '00:00'
+    assert iob is not None
+
+
+def test_async_cgm_matches_sync_readers(tmp_path):
+    """Streaming, per-day, downsampling and period analysis agree with the sync class."""
+    root = prepare_data(tmp_path, days=2)
+    with CGMDataAccess(db_conn=LocalConnection(root)) as cgm:
+        latest = datetime.fromtimestamp(cgm.get_recent_readings(1)[0]['date'] / 1000)
+        start, end = latest - timedelta(days=1), latest
+        sync_chunks = list(cgm.iter_readings(start, end, chunk_size=100))
+        sync_day = cgm.get_readings_for_date(latest)
+        sync_hourly = cgm.get_downsampled(start, end)
+        sync_analysis = cgm.analyze_period('custom', start, end)
+
+    async def fetch():
+        async with AsyncCGMDataAccess(db_conn=AsyncLocalConnection(root)) as cgm:
+            chunks = [chunk async for chunk in cgm.iter_readings(start, end, chunk_size=100)]
+            return (chunks, await cgm.get_readings_for_date(latest), await cgm.get_downsampled(start, end),
+                    await cgm.analyze_period('custom', start, end))
+
+    chunks, day, hourly, analysis = asyncio.run(fetch())
+
+    assert [len(chunk) for chunk in chunks] == [len(chunk) for chunk in sync_chunks]
+    pd.testing.assert_frame_equal(pd.concat(chunks), pd.concat(sync_chunks))
+    assert day == sync_day
+    pd.testing.assert_frame_equal(hourly, sync_hourly)
+    assert analysis == sync_analysis
+
+
+def test_async_iterators_validate_chunk_size_on_call():
+    cgm = AsyncCGMDataAccess(db_conn=AsyncLocalConnection('.'))
+
+    with pytest.raises(ValueError):
+        cgm.iter_readings(0, 1, chunk_size=0)
+    with pytest.raises(ValueError):
+        cgm.iter_dataframe_for_period('last_24h', chunk_size=-1)
+
+
+def test_async_merged_builds_features_off_the_event_loop(tmp_path, monkeypatch):
+    from sweetiepy.data import async_access
+
+    root = prepare_data(tmp_path, days=1)
+    threads = []
+    original = async_access.add_settings_columns
+
+    def recording_add_settings_columns(*args):
+        threads.append(threading.current_thread())
+        return original(*args)
+
+    monkeypatch.setattr(async_access, 'add_settings_columns', recording_add_settings_columns)
+
+    async def fetch():
+        async with AsyncMergedDataAccess(db_conn=AsyncLocalConnection(root)) as merged:
+            return await merged.get_merged_cgm_and_settings(days=1)
+
+    assert not asyncio.run(fetch()).empty
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_async_delivery_matches_sync(tmp_path):
+    root = prepare_data(tmp_path, days=3)
+    with PumpDataAccess(db_conn=LocalConnection(root)) as pump:
+        sync_tables = pump.get_treatment_tables(days=2)
+        sync_timeline = pump.get_delivery_timeline(days=2)
+        sync_totals = pump.get_daily_insulin_totals(days=2)
+        end = sync_timeline.end
+
+    async def fetch():
+        async with AsyncPumpDataAccess(db_conn=AsyncLocalConnection(root)) as pump:
+            return (await pump.get_treatment_tables(days=2), await pump.get_delivery_timeline(days=2),
+                    await pump.get_daily_insulin_totals(days=2))
+
+    tables, timeline, totals = asyncio.run(fetch())
+
+    assert tables.keys() == sync_tables.keys()
+    for event_type, table in tables.items():
+        pd.testing.assert_frame_equal(table, sync_tables[event_type])
+    # Both windows end at "now", so compare the shared part of the timeline
+    assert len(timeline) > 1 and abs(timeline.end - end) < 60 * 10**9
+    np.testing.assert_array_equal(timeline.rates[1:-1], sync_timeline.rates[1:-1])
+    pd.testing.assert_index_equal(totals.index, sync_totals.index)
+
+
+def test_async_merged_cancels_treatments_when_settings_fail(tmp_path, monkeypatch):
+    from sweetiepy.data import async_access
+
+    root = prepare_data(tmp_path, days=1)
+    cancelled = []
+
+    async def pending_treatments(**kwargs):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    def failing_add_settings_columns(*args):
+        raise ValueError("no datetime column")
+
+    monkeypatch.setattr(async_access, 'add_settings_columns', failing_add_settings_columns)
+
+    async def fetch():
+        async with AsyncMergedDataAccess(db_conn=AsyncLocalConnection(root)) as merged:
+            monkeypatch.setattr(merged.pump, 'get_dataframe_for_period', pending_treatments)
+            with pytest.raises(ValueError):
+                await merged.get_merged_with_recent_treatments(days=1)
+            for _ in range(3):
+                await asyncio.sleep(0)
+            # Checked before asyncio.run() cancels whatever is left over
+            return list(cancelled)
+
+    assert asyncio.run(fetch()) == [True]
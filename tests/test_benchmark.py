@@ -0,0 +1,37 @@
+import pandas as pd
+
+from sweetiepy.utils.benchmark import compare_results, measure, run_suite
+
+
+def test_measure_reports_time_memory_and_throughput():
+    metrics = measure(lambda: pd.DataFrame({'x': range(1000)}), repeat=2)
+
+    assert metrics['docs'] == 1000
+    assert metrics['seconds'] > 0
+    assert metrics['peak_mb'] > 0
+    assert metrics['docs_per_second'] > 0
+
+
+def test_compare_results_flags_regressions_beyond_threshold():
+    baseline = {'results': {'30d/a': {'seconds': 1.0, 'peak_mb': 10.0},
+                            '30d/b': {'seconds': 1.0, 'peak_mb': 10.0},
+                            '30d/c': {'seconds': 0.001, 'peak_mb': 1.0}}}
+    current = {'results': {'30d/a': {'seconds': 1.2, 'peak_mb': 10.0},
+                           '30d/b': {'seconds': 1.0, 'peak_mb': 20.0},
+                           '30d/c': {'seconds': 0.003, 'peak_mb': 1.0},
+                           '30d/new': {'seconds': 5.0, 'peak_mb': 1.0}}}
+
+    regressions = compare_results(current, baseline, threshold=0.25)
+
+    # 'c' tripled but stays within timing noise; 'new' has no baseline
+    assert [(r['benchmark'], r['metric']) for r in regressions] == [('30d/b', 'peak_mb')]
+
+
+def test_run_suite_on_one_day(tmp_path):
+    results = run_suite(tmp_path, sizes=['1d'], repeat=1, only=['cgm.'])
+
+    assert {name for name in results['results'] if name.startswith('1d/')} == {
+        '1d/cgm.get_dataframe_for_period', '1d/cgm._clean_dataframe', '1d/cgm.analyze_dataframe',
+        '1d/cgm.get_downsampled'}
+    assert results['results']['import/import sweetiepy']['seconds'] > 0
+    assert results['results']['1d/cgm.get_dataframe_for_period']['docs'] > 200
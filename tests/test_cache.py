@@ -0,0 +1,79 @@
+from sweetiepy.data.cache import MS_PER_DAY, DayPartitionCache, EntriesParquetStore
+
+from .conftest import RecordingCollection
+
+
+def make_docs(start_ms, count):
+    return [{'date': float(start_ms + i * 300_000), 'sgv': 100 + i % 50, 'type': 'sgv',
+             'direction': 'Flat', 'device': 'share2'} for i in range(count)]
+
+
+def test_store_syncs_incrementally(tmp_path):
+    """Only readings after the high-water mark are fetched on later syncs."""
+    day0 = 19800 * MS_PER_DAY
+    entries = RecordingCollection(make_docs(day0, 3 * 288))
+    store = EntriesParquetStore(tmp_path, overlap_ms=0)
+
+    assert store.sync(entries, day0) == 3 * 288
+    assert sorted(p.parent.name for p in tmp_path.glob('day=*/part.parquet')) == [
+        'day=2024-03-18', 'day=2024-03-19', 'day=2024-03-20']
+
+    entries.documents += make_docs(day0 + 3 * MS_PER_DAY, 10)
+    assert store.sync(entries, day0) == 10
+    assert entries.queries[-1]['date'] == {'$gt': store.high_water_mark - 10 * 300_000}
+
+    df = store.read(day0 + MS_PER_DAY, day0 + 4 * MS_PER_DAY)
+    assert len(df) == 2 * 288 + 10
+    assert df['date'].is_monotonic_increasing
+    assert 'device' not in df.columns
+
+
+def test_store_backfills_older_ranges_once(tmp_path):
+    """Asking for an older start fetches only the uncovered range."""
+    day0 = 19800 * MS_PER_DAY
+    entries = RecordingCollection(make_docs(day0, 2 * 288))
+    store = EntriesParquetStore(tmp_path)
+
+    store.sync(entries, day0 + MS_PER_DAY)
+    assert store.sync(entries, day0) >= 288
+    assert entries.queries[1]['date'] == {'$gte': day0, '$lt': day0 + MS_PER_DAY}
+    assert len(store.read(day0, day0 + 2 * MS_PER_DAY)) == 2 * 288
+
+    reopened = EntriesParquetStore(tmp_path)
+    assert reopened.covers(day0)
+    assert reopened.high_water_mark == store.high_water_mark
+
+
+def test_day_cache_refetches_only_open_days():
+    """Closed days come from memory; open days fetch only newer readings."""
+    day0 = 19800 * MS_PER_DAY
+    entries = RecordingCollection(make_docs(day0, 3 * 288))
+    cache = DayPartitionCache(settle_ms=3 * 3600 * 1000)
+    now = day0 + 2 * MS_PER_DAY + 12 * 3600 * 1000
+
+    df = cache.get(entries, now - 2 * MS_PER_DAY, now, now_ms=now)
+    assert len(df) == 2 * 288 + 1
+    assert entries.queries == [
+        {'type': 'sgv', 'date': {'$gte': day0, '$lt': day0 + 2 * MS_PER_DAY}},
+        {'type': 'sgv', 'date': {'$gte': day0 + 2 * MS_PER_DAY}},
+    ]
+
+    # Five minutes later only the open day is queried, from its newest reading
+    now += 300_000
+    df = cache.get(entries, now - 2 * MS_PER_DAY, now, now_ms=now)
+    assert len(df) == 2 * 288 + 1
+    assert entries.queries[-1] == {'type': 'sgv', 'date': {'$gt': day0 + 3 * MS_PER_DAY - 300_000}}
+    assert len(entries.queries) == 3
+
+
+def test_day_cache_evicts_least_recently_used():
+    """Closed days beyond the memory budget are dropped oldest-used first."""
+    day0 = 19800 * MS_PER_DAY
+    entries = RecordingCollection(make_docs(day0, 4 * 288))
+    now = day0 + 10 * MS_PER_DAY
+    cache = DayPartitionCache(max_bytes=1)
+
+    cache.get(entries, day0, day0 + 4 * MS_PER_DAY - 1, now_ms=now)
+    assert len(cache) == 1
+    cache.get(entries, day0 + 3 * MS_PER_DAY, day0 + 4 * MS_PER_DAY - 1, now_ms=now)
+    assert cache.stats['hits'] == 1
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from pymongo.errors import OperationFailure
+
+from sweetiepy.data.columnar import ENTRY_SCHEMA, _column_pipeline, find_columnar, schema_for
+from sweetiepy.utils.benchmark import EncodedCollection, decode_benchmarks
+
+FIELDS = ['date', 'sgv', 'direction', 'type']
+SCHEMA = schema_for(FIELDS, ENTRY_SCHEMA)
+
+
+def make_documents(count=2500):
+    documents = []
+    for i in range(count):
+        doc = {'date': 1000.0 * i, 'sgv': 100 + i % 50, 'type': 'sgv'}
+        if i % 3:
+            doc['direction'] = 'Flat'
+        documents.append(doc)
+    if count > 11:
+        documents[7]['sgv'] = '180'
+        del documents[11]['sgv']
+    return documents
+
+
+class ShuffledCollection(EncodedCollection):
+    """Returns the grouped arrays in a scrambled order, as $group may."""
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipeline = pipeline
+        chunks = super().aggregate(pipeline, **kwargs)
+        rng = np.random.default_rng(0)
+        for chunk in chunks:
+            order = rng.permutation(len(chunk['_n']))
+            for key, values in chunk.items():
+                if key != '_id':
+                    chunk[key] = [values[i] for i in order]
+        return chunks[::-1]
+
+
+class OldServerCollection(EncodedCollection):
+    """Rejects $setWindowFields, like MongoDB before 5.0."""
+
+    def aggregate(self, pipeline, **kwargs):
+        raise OperationFailure("Unrecognized pipeline stage name: '$setWindowFields'")
+
+
+def test_server_columns_match_raw_batches():
+    """Grouped arrays decode to the same frame as the per-batch decoder, in sort order."""
+    documents = make_documents()
+    collection = ShuffledCollection(documents, FIELDS)
+
+    server = find_columnar(collection, {'type': 'sgv'}, SCHEMA, sort=[('date', 1)], use_arrow=False)
+    raw = find_columnar(collection, {'type': 'sgv'}, SCHEMA, use_arrow=False, server_columns=False)
+
+    pd.testing.assert_frame_equal(server, raw)
+    assert server['date'].is_monotonic_increasing
+    assert server.loc[7, 'sgv'] == 180.0
+    assert np.isnan(server.loc[11, 'sgv'])
+    assert pd.isna(server.loc[0, 'direction'])
+
+    match, window, group, order = collection.pipeline
+    assert match == {'$match': {'type': 'sgv'}}
+    assert window['$setWindowFields']['sortBy'] == {'date': 1}
+    assert set(group['$group']) == {'_id', '_n', *FIELDS}
+    assert order == {'$sort': {'_id': 1}}
+
+
+def test_limited_queries_sort_before_numbering():
+    pipeline = _column_pipeline({}, SCHEMA, [('date', -1)], 10, 1000)
+
+    assert pipeline[1:3] == [{'$sort': {'date': -1}}, {'$limit': 10}]
+
+
+def test_old_servers_fall_back_to_raw_batches():
+    documents = make_documents(10)
+
+    df = find_columnar(OldServerCollection(documents, FIELDS), {}, SCHEMA, use_arrow=False)
+
+    assert df['date'].tolist() == [doc['date'] for doc in documents]
+
+
+def test_decode_benchmarks_build_the_same_frame():
+    """The decode.* benchmarks time equivalent work on the same bytes."""
+    benchmarks = decode_benchmarks(make_documents(300))
+
+    frames = {name: bench['func']() for name, bench in benchmarks.items()}
+
+    assert set(frames) == {'decode.documents', 'decode.raw_batches', 'decode.server_columns'}
+    assert len({len(df) for df in frames.values()}) == 1
+    pd.testing.assert_frame_equal(frames['decode.server_columns'], frames['decode.raw_batches'])
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from sweetiepy.data.delivery import build_delivery_timeline, daily_insulin_totals
+from sweetiepy.data.schedule import ProfileSchedule
+
+SCHEDULE = ProfileSchedule.from_entries([{'time': '00:00', 'value': 1.0}, {'time': '06:00', 'value': 1.5}])
+DAY_START = pd.Timestamp('2024-01-01', tz='US/Eastern')
+
+
+def hours(n):
+    return DAY_START + pd.Timedelta(hours=n)
+
+
+def test_temp_basals_and_suspends_override_schedule():
+    """Temps override the schedule, are cut by the next temp, and suspends win."""
+    temps = pd.DataFrame({'dateTime': [hours(1), hours(1.5), hours(20)],
+                          'absolute': [0.0, 2.0, 3.0], 'duration': [60, 30, 30]})
+    suspends = pd.DataFrame({'dateTime': [hours(10)]})
+    resumes = pd.DataFrame({'dateTime': [hours(12)]})
+
+    timeline = build_delivery_timeline(SCHEDULE, temps, hours(0), hours(24), suspends=suspends,
+                                       resumes=resumes, timezone='US/Eastern')
+
+    rates = timeline.rate_at(pd.DatetimeIndex([hours(0.5), hours(1.2), hours(1.7), hours(2.5),
+                                               hours(7), hours(11), hours(20.2), hours(21)]))
+    np.testing.assert_allclose(rates, [1.0, 0.0, 2.0, 1.0, 1.5, 0.0, 3.0, 1.5])
+    assert np.isnan(timeline.rate_at(pd.DatetimeIndex([hours(24)])))[0]
+    # 1 + 0.5*0 + 0.5*2 + 4 + 4*1.5 + 0 + 8*1.5 + 0.5*3 + 3.5*1.5
+    assert timeline.total(hours(0), hours(24)) == 1 + 1 + 4 + 6 + 12 + 1.5 + 5.25
+
+
+def test_daily_totals_split_local_days():
+    """Basal is integrated per local day and boluses are added to their day."""
+    timeline = build_delivery_timeline(SCHEDULE, None, hours(0), hours(48), timezone='US/Eastern')
+    boluses = pd.DataFrame({'dateTime': [hours(8), hours(30), hours(31)], 'insulin': [2.0, 1.0, 1.5]})
+
+    totals = daily_insulin_totals(timeline, boluses, timezone='US/Eastern')
+
+    assert list(totals['basal']) == [33.0, 33.0]
+    assert list(totals['bolus']) == [2.0, 2.5]
+    assert list(totals['total']) == [35.0, 35.5]
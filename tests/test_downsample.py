@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from pymongo.errors import OperationFailure
+
+from sweetiepy.connection.local import LocalConnection
+from sweetiepy.data.cgm import CGMDataAccess
+from sweetiepy.utils.benchmark import prepare_data
+
+
+class OldServerEntries:
+    """Stand-in for an entries collection on a server without $percentile."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        if 'percentiles' in pipeline[1]['$group']:
+            raise OperationFailure("Unrecognized expression '$percentile'")
+        return iter(self.buckets)
+
+
+def test_local_downsample_matches_readings(tmp_path):
+    """Buckets summarize every positive reading in the window."""
+    cgm = CGMDataAccess(db_conn=LocalConnection(prepare_data(tmp_path, days=3)))
+    assert cgm.connect()
+    end = datetime.now()
+    start = end - timedelta(days=2)
+
+    df = cgm.get_downsampled(start, end, bucket='1h', stats=['mean', 'max', 'p90'])
+    raw = cgm.get_dataframe_for_period('custom', start, end, clean_data=False, fields=('date', 'sgv'))
+
+    assert list(df.columns) == ['datetime', 'count', 'mean', 'max', 'p90']
+    assert 47 <= len(df) <= 49
+    assert df['count'].sum() == (raw['sgv'] > 0).sum()
+    assert (df['datetime'].dt.minute == 0).all()
+    first = raw[pd.to_datetime(raw['date'], unit='ms', utc=True).dt.floor('1h') == df['datetime'][0]]
+    assert df['mean'][0] == pytest.approx(first['sgv'].mean())
+    assert df['p90'][0] == pytest.approx(first['sgv'].quantile(0.9))
+
+
+def test_server_downsample_falls_back_without_percentile():
+    """Before MongoDB 7.0 the bucket values come back and percentiles are local."""
+    entries = OldServerEntries([
+        {'_id': 0.0, 'count': 3, 'min': 90, 'values': [90, 100, 140]},
+        {'_id': 900_000.0, 'count': 2, 'min': 110, 'values': [110, 120]},
+    ])
+    cgm = CGMDataAccess(db_conn=SimpleNamespace())
+    cgm.collection = entries
+
+    df = cgm.get_downsampled(datetime(2024, 1, 1), datetime(2024, 1, 2), bucket='15min',
+                             stats=['min', 'median'])
+
+    assert len(entries.pipelines) == 2
+    group = entries.pipelines[0][1]['$group']
+    assert group['_id'] == {'$subtract': ['$date', {'$mod': ['$date', 900_000]}]}
+    assert group['percentiles']['$percentile']['p'] == [0.5]
+    assert df['median'].tolist() == [100.0, 115.0]
+    assert df['datetime'][1] == pd.Timestamp('1970-01-01 00:15', tz='UTC')
+    assert np.array_equal(df['count'], [3, 2])
+
+
+def test_downsample_rejects_unknown_bucket_and_stat():
+    cgm = CGMDataAccess(db_conn=SimpleNamespace())
+    with pytest.raises(ValueError):
+        cgm.get_downsampled(datetime(2024, 1, 1), datetime(2024, 1, 2), bucket='5min')
+    with pytest.raises(ValueError):
+        cgm.get_downsampled(datetime(2024, 1, 1), datetime(2024, 1, 2), stats=['mode'])
@@ -0,0 +1,19 @@
+from sweetiepy.utils.benchmark import measure_import_time
+
+
+def test_package_import_is_cheap():
+    assert measure_import_time('import sweetiepy', runs=1)['modules'] == []
+
+
+def test_connection_import_defers_pymongo_and_dotenv():
+    assert measure_import_time('from sweetiepy import MongoDBConnection', runs=1)['modules'] == []
+
+
+def test_data_access_classes_load_on_first_access():
+    modules = measure_import_time('from sweetiepy import CGMDataAccess', runs=1)['modules']
+    # pandas 3 imports pyarrow itself when it is installed; nothing else may
+    pandas_modules = measure_import_time('import pandas', runs=1)['modules']
+    assert 'pandas' in modules
+    assert 'pymongo' not in modules
+    assert 'pyarrow.parquet' not in modules
+    assert 'pyarrow' not in modules or 'pyarrow' in pandas_modules
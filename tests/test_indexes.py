@@ -0,0 +1,49 @@
+from sweetiepy.connection.indexes import _query_shapes, check_indexes, plan_stages
+from sweetiepy.data.pump import _PROFILE_NEWEST_FIRST, PumpDataAccess
+
+from .conftest import FakeDatabase, RecordingCollection
+
+COLLSCAN_PLAN = {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}
+INDEXED_PLAN = {'queryPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'date_-1'}}}
+
+
+def test_plan_stages_handles_both_formats():
+    """Classic and slot-based explain() trees flatten to the same stages."""
+    assert plan_stages(COLLSCAN_PLAN) == [('SORT', None), ('COLLSCAN', None)]
+    assert plan_stages(INDEXED_PLAN) == [('FETCH', None), ('IXSCAN', 'date_-1')]
+
+
+def test_check_indexes_reports_and_creates():
+    """Scans and in-memory sorts are reported and fixed only when asked."""
+    database = FakeDatabase(entries=RecordingCollection(plan=COLLSCAN_PLAN),
+                            profile=RecordingCollection(plan=INDEXED_PLAN))
+
+    reports = check_indexes(database)
+    by_collection = {report['collection']: report for report in reports}
+    assert by_collection['entries']['collscan'] and by_collection['entries']['in_memory_sort']
+    assert by_collection['profile']['ok'] and by_collection['profile']['index_used'] == 'date_-1'
+    assert database['entries'].created == []
+
+    check_indexes(database, create=True)
+    assert database['entries'].created == [[('type', 1), ('date', -1)]]
+    assert database['profile'].created == []
+
+
+def test_query_shapes_come_from_the_data_access_queries(monkeypatch):
+    """The advisor explains the filters and sorts the classes actually send."""
+    def construct(*args, **kwargs):
+        raise AssertionError("PumpDataAccess was constructed")
+
+    # The filter builders are static, so no data access object (or .env read) is needed
+    monkeypatch.setattr(PumpDataAccess, '__init__', construct)
+    shapes = {shape['name']: shape for shape in _query_shapes()}
+
+    entries = shapes['CGM readings by time range']['filter']
+    assert entries['type'] == 'sgv' and set(entries['date']) == {'$gte', '$lte'}
+    by_type = shapes['Treatments by event type and time range']['filter']
+    assert by_type['eventType'] == {'$in': ['Temp Basal', 'Correction Bolus']}
+    # Treatment bounds use the stored local wall-clock format
+    assert by_type['timestamp']['$gte'].endswith('Z')
+    assert shapes['Treatments by time range']['filter']['timestamp'] == by_type['timestamp']
+    profile = shapes['Profiles by start date']
+    assert profile['sort'] == profile['index'] == _PROFILE_NEWEST_FIRST
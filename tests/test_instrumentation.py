@@ -0,0 +1,86 @@
+import csv
+import json
+from types import SimpleNamespace
+
+from sweetiepy.connection import instrumentation
+from sweetiepy.connection.instrumentation import QueryMetrics, stage
+from sweetiepy.connection.listener import MetricsCommandListener
+
+
+def event(name, command=None, request_id=1, **kwargs):
+    return SimpleNamespace(command_name=name, command=command or {}, request_id=request_id,
+                           connection_id=('localhost', 27017), **kwargs)
+
+
+def test_listener_records_latency_docs_bytes_and_getmores():
+    metrics = QueryMetrics(measure_bytes=True)
+    listener = MetricsCommandListener(metrics)
+
+    listener.started(event('find', {'find': 'entries', 'filter': {}}, request_id=1))
+    listener.succeeded(event('find', request_id=1, duration_micros=3000,
+                             reply={'cursor': {'firstBatch': [{'sgv': 100}] * 101, 'id': 5}, 'ok': 1}))
+    listener.started(event('getMore', {'getMore': 5, 'collection': 'entries'}, request_id=2))
+    listener.succeeded(event('getMore', request_id=2, duration_micros=40000,
+                             reply={'cursor': {'nextBatch': [{'sgv': 100}] * 50, 'id': 0}, 'ok': 1}))
+    listener.started(event('find', {'find': 'entries'}, request_id=3))
+    listener.failed(event('find', request_id=3, duration_micros=7000000))
+
+    commands = metrics.summary()['commands']
+    find, get_more = commands['find entries'], commands['getMore entries']
+    assert (find['count'], find['failures'], find['docs']) == (2, 1, 101)
+    assert find['bytes'] > 0
+    assert find['histogram']['<=5'] == 1 and find['histogram']['>5000'] == 1
+    assert (get_more['count'], get_more['docs']) == (1, 50)
+    assert get_more['mean_ms'] == 40.0
+
+
+def test_reply_bytes_are_opt_in(monkeypatch):
+    """By default replies are not re-encoded just to count their size."""
+    from sweetiepy.connection import listener as listener_module
+
+    def encode(reply):
+        raise AssertionError("reply was re-encoded")
+
+    monkeypatch.setattr(listener_module.bson, 'encode', encode)
+    metrics = QueryMetrics()
+    listener = MetricsCommandListener(metrics)
+
+    listener.started(event('find', {'find': 'entries'}))
+    listener.succeeded(event('find', duration_micros=1000,
+                             reply={'cursor': {'firstBatch': [{'sgv': 100}], 'id': 0}, 'ok': 1}))
+
+    find = metrics.summary()['commands']['find entries']
+    assert (find['docs'], find['bytes']) == (1, 0)
+
+
+def test_stage_timer_and_exports(tmp_path, monkeypatch):
+    metrics = QueryMetrics()
+    with stage('cgm.clean'):
+        pass
+    assert metrics.records() == []
+
+    monkeypatch.setattr(instrumentation, '_metrics', metrics)
+    with stage('cgm.clean'):
+        pass
+    assert metrics.summary()['stages']['cgm.clean']['count'] == 1
+
+    metrics.to_csv(tmp_path / 'calls.csv')
+    metrics.to_json(tmp_path / 'calls.json')
+    with open(tmp_path / 'calls.csv') as f:
+        rows = list(csv.DictReader(f))
+    assert [(r['kind'], r['name']) for r in rows] == [('stage', 'cgm.clean')]
+    assert 'cgm.clean' in json.loads((tmp_path / 'calls.json').read_text())['summary']['stages']
+
+
+def test_enable_reconfigures_an_active_collector(monkeypatch):
+    """Arguments apply even when SWEETIEPY_INSTRUMENT already created the collector."""
+    monkeypatch.setattr(instrumentation, '_metrics', None)
+    metrics = instrumentation.enable_instrumentation()
+    for index in range(3):
+        metrics.record_stage(f'stage{index}', 1.0)
+
+    again = instrumentation.enable_instrumentation(max_records=2, measure_bytes=True)
+
+    assert again is metrics
+    assert metrics.measure_bytes
+    assert [record['name'] for record in metrics.records()] == ['stage1', 'stage2']
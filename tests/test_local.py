@@ -0,0 +1,150 @@
+import pyarrow.parquet as pq
+
+from sweetiepy.connection.local import LocalConnection, snapshot_database, write_collection
+from sweetiepy.data.columnar import find_columnar
+
+
+def make_connection(tmp_path):
+    write_collection(tmp_path, 'entries', [
+        {'date': 1000.0, 'sgv': 100, 'type': 'sgv'},
+        {'date': 2000.0, 'sgv': 150, 'type': 'sgv', 'direction': 'Flat'},
+        {'date': 3000.0, 'type': 'mbg', 'mbg': 120},
+        {'date': 4000.0, 'sgv': '180', 'type': 'sgv'},
+    ])
+    write_collection(tmp_path, 'devicestatus', [
+        {'created_at': '2024-03-01T00:00:00Z', 'loop': {'iob': {'iob': 1.5}}},
+        {'created_at': '2024-03-02T00:00:00Z', 'pump': {'reservoir': 80}},
+    ])
+    conn = LocalConnection(tmp_path)
+    assert conn.connect()
+    return conn
+
+
+def test_find_supports_library_query_shapes(tmp_path):
+    """Range, $in and $exists filters, sorting, limits and projections work."""
+    database = make_connection(tmp_path).database
+
+    docs = list(database['entries'].find({'type': 'sgv', 'date': {'$gte': 1500, '$lte': 4000}},
+                                         {'date': 1, 'sgv': 1, '_id': 0}).sort('date', -1))
+    # sgv holds numbers and a string, and each value keeps its stored type
+    assert docs == [{'date': 4000.0, 'sgv': '180'}, {'date': 2000.0, 'sgv': 150}]
+    assert database.entries.count_documents({'type': {'$in': ['mbg']}}) == 1
+    assert database.entries.count_documents({'direction': {'$exists': False}}) == 3
+    assert database.entries.count_documents({'type': {'$ne': 'sgv'}}) == 1
+
+    latest = list(database.devicestatus.find({'loop': {'$exists': True}}).sort('created_at', -1).limit(1))
+    assert latest == [{'created_at': '2024-03-01T00:00:00Z', 'loop': {'iob': {'iob': 1.5}}}]
+
+
+def test_mixed_type_fields_compare_like_mongodb(tmp_path):
+    """Range filters and sorts on a field with mixed value types follow MongoDB's type order."""
+    write_collection(tmp_path, 'treatments', [
+        {'_id': 1, 'duration': 30}, {'_id': 2, 'duration': '5'}, {'_id': 3, 'duration': 100},
+        {'_id': 4, 'duration': 7.5}, {'_id': 5},
+    ])
+    conn = LocalConnection(tmp_path)
+    assert conn.connect()
+    treatments = conn.database.treatments
+
+    def durations(query, sort=1):
+        return [doc.get('duration') for doc in treatments.find(query).sort('duration', sort)]
+
+    assert durations({'duration': {'$gte': 20}}) == [30, 100]
+    assert durations({'duration': {'$lt': '6'}}) == ['5']
+    assert durations({'duration': {'$in': [30.0, '5']}}) == [30, '5']
+    assert durations({'duration': {'$ne': 30}}) == [None, 7.5, 100, '5']
+    assert durations({}, sort=-1) == ['5', 100, 30, 7.5, None]
+    assert treatments.count_documents({'duration': {'$exists': False}}) == 1
+    df = find_columnar(treatments, {}, {'duration': 'float64'}, sort=[('duration', 1)])
+    assert df['duration'].tolist()[1:] == [7.5, 30.0, 100.0, 5.0]
+
+
+def test_columnar_reads_use_local_columns(tmp_path):
+    """find_columnar decodes straight from the Arrow table."""
+    database = make_connection(tmp_path).database
+
+    df = find_columnar(database.entries, {'type': 'sgv'}, {'date': 'float64', 'sgv': 'float64'},
+                       sort=[('date', 1)])
+    assert df['sgv'].tolist() == [100.0, 150.0, 180.0]
+    assert df['sgv'].dtype == 'float64'
+
+
+def mixed_documents():
+    """Documents whose fields appear, change type and nest in later batches."""
+    docs = [{'date': float(i), 'sgv': 100 + i, 'type': 'sgv'} for i in range(7)]
+    docs[3]['sgv'] = 101.5
+    docs[4]['noise'] = 1
+    docs[6]['noise'] = 'light'
+    docs[2]['note'] = 'plain'
+    docs[5]['note'] = {'text': 'nested'}
+    docs[5]['late'] = True
+    return docs
+
+
+def test_batched_writes_match_a_single_batch(tmp_path):
+    """Conforming the batches gives the same columns as encoding everything at once."""
+    write_collection(tmp_path / 'whole', 'entries', mixed_documents())
+    write_collection(tmp_path / 'batched', 'entries', iter(mixed_documents()), batch_size=2)
+
+    whole = pq.read_table(tmp_path / 'whole' / 'entries.parquet')
+    batched = pq.read_table(tmp_path / 'batched' / 'entries.parquet')
+    assert batched.equals(whole, check_metadata=True)
+    assert batched.schema.field('sgv').type == 'double'
+    # noise is 1 in one batch and 'light' in another, so it is kept as JSON
+    assert batched.schema.field('noise').type == 'string'
+    assert list((tmp_path / 'batched').iterdir()) == [tmp_path / 'batched' / 'entries.parquet']
+
+    conn = LocalConnection(tmp_path / 'batched')
+    assert conn.connect()
+    docs = list(conn.database.entries.find({}).sort('date', 1))
+    assert docs[5]['note'] == {'text': 'nested'} and docs[2]['note'] == 'plain'
+    assert (docs[4]['noise'], docs[6]['noise']) == (1, 'light')
+
+
+class OnceCursor:
+    """Cursor that can only be iterated once, like a server cursor."""
+
+    def __init__(self, documents):
+        self.documents = iter(documents)
+        self.batch = None
+        self.closed = False
+
+    def batch_size(self, size):
+        self.batch = size
+        return self
+
+    def close(self):
+        self.closed = True
+
+    def __iter__(self):
+        return self.documents
+
+
+class StreamingDatabase:
+    def __init__(self, documents):
+        self.documents = documents
+        self.cursors = []
+
+    def __getitem__(self, name):
+        return self
+
+    def find(self, query):
+        self.cursors.append(OnceCursor(self.documents))
+        return self.cursors[-1]
+
+
+def test_snapshot_streams_cursor_batches(tmp_path, monkeypatch):
+    from sweetiepy.connection import local
+
+    encoded = []
+    encode_batch = local._encode_batch
+    monkeypatch.setattr(local, '_encode_batch', lambda docs: encoded.append(len(docs)) or encode_batch(docs))
+    database = StreamingDatabase(mixed_documents())
+
+    counts = snapshot_database(database, tmp_path, collections=['entries'], batch_size=3)
+
+    cursor, = database.cursors
+    assert counts == {'entries': 7}
+    assert encoded == [3, 3, 1]
+    assert (cursor.batch, cursor.closed) == (3, True)
+    assert pq.read_table(tmp_path / 'entries.parquet').num_rows == 7
@@ -0,0 +1,93 @@
+import threading
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from sweetiepy.connection.local import LocalConnection
+from sweetiepy.data.delivery import build_delivery_timeline
+from sweetiepy.data.merged import MergedDataAccess, add_settings_columns
+from sweetiepy.data.schedule import ProfileSchedule
+from sweetiepy.utils.benchmark import prepare_data
+
+from .conftest import WrappedLocalConnection
+
+
+class GatedCollection:
+    """Local collection whose first query waits at a barrier shared with other collections.
+
+    The barrier only opens while every gated collection has a query in
+    flight, so a run that completes proves those queries overlapped.
+    """
+
+    def __init__(self, collection, barrier, queries):
+        self.collection = collection
+        self.barrier = barrier
+        self.queries = queries
+
+    def _enter(self, query):
+        self.queries.append(query)
+        if self.barrier is not None and len(self.queries) == 1:
+            self.barrier.wait()
+
+    def find(self, query=None, *args, **kwargs):
+        self._enter(query)
+        return self.collection.find(query, *args, **kwargs)
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        self._enter(pipeline)
+        return self.collection.aggregate(pipeline, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+class Gate:
+    """Wraps collections so the named ones meet at one barrier and all record their queries."""
+
+    def __init__(self, gated):
+        self.barrier = threading.Barrier(len(gated), timeout=10)
+        self.gated = gated
+        self.queries = {}
+
+    def __call__(self, name, collection):
+        barrier = self.barrier if name in self.gated else None
+        return GatedCollection(collection, barrier, self.queries.setdefault(name, []))
+
+
+def test_merged_fetches_run_concurrently(tmp_path):
+    """Readings and profiles are fetched together; treatments cover the readings' span."""
+    root = prepare_data(tmp_path, days=3)
+
+    with MergedDataAccess(db_conn=LocalConnection(root), max_workers=1) as merged:
+        sequential_df = merged.get_merged_with_recent_treatments(days=2, lookback_hours=[1, 4])
+
+    gate = Gate({'entries', 'profile'})
+    with MergedDataAccess(db_conn=WrappedLocalConnection(root, wrap=gate), max_workers=3) as merged:
+        concurrent_df = merged.get_merged_with_recent_treatments(days=2, lookback_hours=[1, 4])
+        expected_bounds = merged.pump._timestamp_range(
+            merged.pump.timezone, concurrent_df['dateTime'].min() - timedelta(hours=4), concurrent_df['dateTime'].max())
+
+    assert not gate.barrier.broken
+    assert gate.queries['treatments'][0]['timestamp'] == expected_bounds
+    assert len(concurrent_df) > 400
+    pd.testing.assert_frame_equal(concurrent_df, sequential_df)
+
+
+def test_active_basal_matches_the_scheduled_basal_behind_iob():
+    """Settings are looked up on the same local clock as the net IOB basal schedule."""
+    timezone = 'US/Eastern'
+    basal = ProfileSchedule(np.arange(24) * 3600, np.arange(24) / 10)
+    flat = ProfileSchedule([0], [1.0])
+    times = pd.date_range('2024-03-09 00:00', periods=2 * 24 * 12, freq='5min', tz='UTC')
+    cgm_df = pd.DataFrame({'datetime': times, 'sgv': 120})
+
+    df = add_settings_columns(cgm_df, None, (basal, flat, flat), timezone)
+
+    scheduled = build_delivery_timeline(basal, None, times[0], times[-1] + pd.Timedelta(minutes=1),
+                                        timezone=timezone)
+    segment = np.searchsorted(scheduled.starts, times.as_unit('ns').asi8, side='right') - 1
+    np.testing.assert_array_equal(df['active_basal'].to_numpy(), scheduled.rates[segment])
+    # Eastern wall-clock hours, across the spring-forward change
+    assert df['active_basal'].iloc[0] == basal.value_at(times[0].tz_convert(timezone))
+    assert not np.array_equal(df['active_basal'].to_numpy(), basal.lookup(times))
@@ -0,0 +1,129 @@
+import threading
+
+import pymongo
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+
+from sweetiepy.connection import mongodb
+from sweetiepy.connection.mongodb import MongoDBConnection, close_shared_clients, get_shared_client
+
+URI = 'mongodb://user:pw@cluster.example/'
+
+
+class FakeClient:
+    """Stand-in for MongoClient that records its options and pings."""
+
+    fail_ping = False
+    ping_started = None
+    release_ping = None
+
+    def __init__(self, connection_string, **options):
+        self.connection_string = connection_string
+        self.options = options
+        self.pinged = False
+        self.closed = False
+        self.admin = self
+
+    def command(self, name):
+        if FakeClient.ping_started is not None:
+            FakeClient.ping_started.set()
+            FakeClient.release_ping.wait()
+        if FakeClient.fail_ping:
+            raise ServerSelectionTimeoutError('no servers')
+        self.pinged = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_clients(monkeypatch):
+    monkeypatch.setattr(pymongo, 'MongoClient', FakeClient)
+    monkeypatch.setattr(FakeClient, 'fail_ping', False)
+    monkeypatch.setattr(FakeClient, 'ping_started', None)
+    monkeypatch.setattr(FakeClient, 'release_ping', None)
+    close_shared_clients()
+    yield
+    close_shared_clients()
+
+
+def test_same_options_reuse_one_client():
+    client, created = get_shared_client(URI, max_pool_size=10)
+    again, created_again = get_shared_client(URI, max_pool_size=10)
+
+    assert created and not created_again
+    assert again is client
+    assert client.pinged
+
+
+def test_distinct_pool_options_get_distinct_clients():
+    small, _ = get_shared_client(URI, max_pool_size=10)
+    large, _ = get_shared_client(URI, max_pool_size=50)
+    warm, _ = get_shared_client(URI, max_pool_size=10, min_pool_size=2)
+
+    assert len({id(small), id(large), id(warm)}) == 3
+    assert large.options['maxPoolSize'] == 50
+    assert warm.options['minPoolSize'] == 2
+
+
+def test_failed_ping_is_not_registered(monkeypatch):
+    monkeypatch.setattr(FakeClient, 'fail_ping', True)
+    with pytest.raises(ServerSelectionTimeoutError):
+        get_shared_client(URI)
+    assert not mongodb._client_registry
+
+    monkeypatch.setattr(FakeClient, 'fail_ping', False)
+    client, created = get_shared_client(URI)
+    assert created and client.pinged
+
+
+def test_concurrent_callers_wait_for_the_ping(monkeypatch):
+    """A caller that finds the client registered never sees it unpinged."""
+    monkeypatch.setattr(FakeClient, 'ping_started', threading.Event())
+    monkeypatch.setattr(FakeClient, 'release_ping', threading.Event())
+    results = {}
+
+    def call(name):
+        results[name] = get_shared_client(URI)
+
+    creator = threading.Thread(target=call, args=('creator',))
+    creator.start()
+    assert FakeClient.ping_started.wait(5)
+    waiter = threading.Thread(target=call, args=('waiter',))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive() and 'waiter' not in results
+
+    FakeClient.release_ping.set()
+    creator.join(5)
+    waiter.join(5)
+
+    client, created = results['waiter']
+    assert not created
+    assert client is results['creator'][0]
+    assert client.pinged
+
+
+def test_registry_resets_after_pid_change(monkeypatch):
+    parent, _ = get_shared_client(URI)
+    monkeypatch.setattr(mongodb, '_registry_pid', -1)
+
+    child, created = get_shared_client(URI)
+
+    assert created and child is not parent
+    assert not parent.closed
+
+
+def test_explicit_zero_overrides_environment(monkeypatch):
+    monkeypatch.setenv('MONGODB_USERNAME', 'user')
+    monkeypatch.setenv('MONGODB_PW', 'pw')
+    monkeypatch.setenv('MONGODB_URI', 'mongodb://<username>:<password>@cluster.example/')
+    monkeypatch.setenv('MONGODB_MAX_POOL_SIZE', '20')
+    monkeypatch.setenv('MONGODB_MIN_POOL_SIZE', '5')
+    monkeypatch.setenv('MONGODB_MAX_IDLE_TIME_MS', '60000')
+
+    conn = MongoDBConnection(max_pool_size=0, min_pool_size=0, max_idle_time_ms=0)
+    defaults = MongoDBConnection()
+
+    assert (conn.max_pool_size, conn.min_pool_size, conn.max_idle_time_ms) == (0, 0, 0)
+    assert (defaults.max_pool_size, defaults.min_pool_size, defaults.max_idle_time_ms) == (20, 5, 60000)
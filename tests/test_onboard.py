@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from sweetiepy.data.onboard import (carbs_on_board, exponential_insulin_remaining,
+                                    insulin_on_board)
+
+START = pd.Timestamp('2024-03-01', tz='UTC')
+
+
+def minutes(*values):
+    return pd.DatetimeIndex([START + pd.Timedelta(minutes=v) for v in values])
+
+
+def test_insulin_curve_bounds():
+    """A dose is fully on board at injection and gone after DIA."""
+    remaining = exponential_insulin_remaining(np.array([-10, 0, 75, 360, 400]))
+    np.testing.assert_allclose(remaining[[0, 1, 3, 4]], [1, 1, 0, 0])
+    assert 0 < remaining[2] < 1
+
+
+def test_insulin_on_board_matches_direct_sum():
+    """The grid convolution agrees with summing each dose's curve."""
+    dose_minutes = np.array([0.0, 42.5, 130.2])
+    doses = np.array([2.0, 1.0, 3.0])
+    query = np.arange(-5, 600, 5.0)
+
+    iob = insulin_on_board(minutes(*query), minutes(*dose_minutes), doses)
+
+    offsets = query[:, None] - dose_minutes[None, :]
+    expected = (exponential_insulin_remaining(offsets) * (offsets >= 0) * doses).sum(axis=1)
+    np.testing.assert_allclose(iob, expected, atol=0.05)
+    assert iob[0] == 0 and iob[-1] == 0
+
+
+def test_carbs_on_board_is_exact():
+    """Linear absorption uses each entry's own absorption time."""
+    cob = carbs_on_board(minutes(-1, 0, 30, 60, 90, 120, 240),
+                         minutes(0, 60), [40, 30], absorption_minutes=[120, np.nan])
+
+    np.testing.assert_allclose(cob, [0, 40, 30, 50, 35, 20, 0])
+
+
+def test_merged_iob_counts_temp_basal_deviations():
+    """Merged IOB is net of the scheduled basal: a zero temp leaves negative IOB."""
+    from sweetiepy.data.merged import add_treatment_context
+    from sweetiepy.data.schedule import ProfileSchedule
+
+    schedule = ProfileSchedule.from_entries([{'time': '00:00', 'value': 1.0}])
+    readings = pd.DataFrame({'dateTime': minutes(0, 60, 120, 180)})
+    treatments = pd.DataFrame({
+        'dateTime': minutes(0, 0),
+        'eventType': ['Temp Basal', 'Correction Bolus'],
+        'absolute': [0.0, np.nan],
+        'duration': [60.0, np.nan],
+        'insulin': [np.nan, 1.0],
+        'carbs': [np.nan, np.nan],
+    })
+
+    bolus_only = add_treatment_context(readings.copy(), treatments, include_onboard=True)
+    net = add_treatment_context(readings.copy(), treatments, include_onboard=True,
+                                basal=schedule, timezone='UTC')
+
+    withheld = insulin_on_board(readings['dateTime'], minutes(*np.arange(1, 61)), np.full(60, 1 / 60))
+    np.testing.assert_allclose(net['iob'], bolus_only['iob'] - withheld, atol=0.02)
+    assert net['iob'][1] < bolus_only['iob'][1] - 0.5
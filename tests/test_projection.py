@@ -0,0 +1,70 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from sweetiepy.connection.mongodb import build_projection
+from sweetiepy.data.cgm import DEFAULT_ENTRY_FIELDS, CGMDataAccess
+
+from .conftest import RecordingCollection
+
+START = datetime(2024, 1, 1)
+END = datetime(2024, 1, 2)
+
+
+def recording_cgm(documents=()):
+    cgm = CGMDataAccess(db_conn=SimpleNamespace())
+    cgm.collection = RecordingCollection(documents)
+    return cgm
+
+
+def test_build_projection():
+    assert build_projection(None) is None
+    assert build_projection(['sgv', 'date']) == {'sgv': 1, 'date': 1, '_id': 0}
+    assert build_projection(('date', '_id')) == {'date': 1, '_id': 1}
+
+
+def test_readings_queries_pass_the_projection():
+    cgm = recording_cgm()
+
+    cgm.get_readings_by_time_range(START, END, fields=['sgv'])
+    cgm.get_last_24_hours(fields=('date', 'sgv'))
+    cgm.get_readings_by_time_range(START, END)
+
+    assert cgm.collection.projections == [
+        {'sgv': 1, '_id': 0},
+        {'date': 1, 'sgv': 1, '_id': 0},
+        None,
+    ]
+
+
+@pytest.mark.parametrize('fields, clean_data, expected', [
+    (DEFAULT_ENTRY_FIELDS, True, list(DEFAULT_ENTRY_FIELDS)),
+    (('direction',), True, ['direction', 'date', 'sgv']),
+    (('direction',), False, ['direction']),
+    (('sgv', '_id'), True, ['sgv', '_id', 'date']),
+])
+def test_period_fields_add_what_cleaning_needs(fields, clean_data, expected):
+    cgm = recording_cgm()
+
+    cgm.get_dataframe_for_period('custom', START, END, clean_data=clean_data, fields=fields)
+
+    projection, = cgm.collection.projections
+    assert list(projection) == expected + (['_id'] if '_id' not in expected else [])
+    assert projection['_id'] == (1 if '_id' in fields else 0)
+
+
+def test_dataframe_columns_follow_the_fields():
+    documents = [{'_id': i, 'date': START.timestamp() * 1000 + i * 300_000, 'sgv': 100 + i,
+                  'type': 'sgv', 'device': 'x'} for i in range(5)]
+
+    whole = recording_cgm(documents).get_dataframe_for_period('custom', START, END, clean_data=False,
+                                                              fields=None)
+    projected = recording_cgm(documents).get_dataframe_for_period('custom', START, END, clean_data=False,
+                                                                  fields=('sgv', 'direction'))
+
+    assert len(whole) == len(projected) == 5
+    assert set(whole.columns) == {'_id', 'date', 'sgv', 'type', 'device'}
+    # Requested fields missing from every document still become (empty) columns
+    assert list(projected.columns) == ['sgv', 'direction']
+    assert projected['direction'].isna().all()
@@ -0,0 +1,197 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+import pytz
+
+from sweetiepy.connection.local import LocalConnection, write_collection
+from sweetiepy.data.pump import DEFAULT_TREATMENT_FIELDS, PumpDataAccess, _fix_corrupted_treatment_timestamps
+
+from .conftest import CountingCollection, RecordingCollection
+
+
+def test_fix_matches_per_element_localize():
+    """The vectorized correction agrees with pytz localize, including DST days."""
+    timestamps = pd.Series([
+        '2024-03-01T08:00:00Z', '2024-07-01T08:00:00Z',
+        '2024-11-03T01:30:00Z',  # repeated hour: standard time
+        '2024-03-10T02:30:00Z',  # skipped hour: shifted forward
+    ])
+    fixed = _fix_corrupted_treatment_timestamps(timestamps)
+
+    eastern = pytz.timezone('US/Eastern')
+    assert fixed[0] == eastern.localize(pd.Timestamp('2024-03-01 08:00').to_pydatetime())
+    assert fixed[1] == eastern.localize(pd.Timestamp('2024-07-01 08:00').to_pydatetime())
+    assert fixed[2] == pd.Timestamp('2024-11-03 06:30', tz='UTC')
+    assert fixed[3] == pd.Timestamp('2024-03-10 07:00', tz='UTC')
+
+
+def test_fix_uses_configured_timezone_and_dst_policy():
+    """The timezone and DST resolution can be chosen by the caller."""
+    timestamps = pd.Series(['2024-11-03T01:30:00Z', '2024-03-10T02:30:00Z'])
+    fixed = _fix_corrupted_treatment_timestamps(timestamps, 'US/Pacific',
+                                                ambiguous=True, nonexistent='NaT')
+
+    assert fixed[0] == pd.Timestamp('2024-11-03 08:30', tz='UTC')
+    assert pd.isna(fixed[1])
+
+
+def test_fix_keeps_real_offsets():
+    """Only a UTC marker is corrupt; real offsets and naive times are kept as written."""
+    timestamps = pd.Series(['2024-07-01T08:00:00-07:00', '2024-07-01T08:00:00+00:00',
+                            '2024-07-01T08:00:00', None])
+    fixed = _fix_corrupted_treatment_timestamps(timestamps)
+
+    assert fixed[0] == pd.Timestamp('2024-07-01 15:00', tz='UTC')
+    assert fixed[1] == pd.Timestamp('2024-07-01 12:00', tz='UTC')
+    assert fixed[2] == pd.Timestamp('2024-07-01 12:00', tz='UTC')
+    assert pd.isna(fixed[3])
+    assert str(fixed.dt.tz) == 'US/Eastern'
+
+
+def test_fix_rejects_infer():
+    """Wall-clock sorted rows cannot tell the two repeated hours apart."""
+    with pytest.raises(ValueError):
+        _fix_corrupted_treatment_timestamps(pd.Series(['2024-11-03T01:45:00Z']), ambiguous='infer')
+
+
+def test_exact_window_queries_stored_local_time():
+    """An exact window plus padding is queried as local wall-clock strings."""
+    treatments = RecordingCollection()
+    pump = PumpDataAccess(db_conn=object(), timezone='US/Eastern')
+    pump.database = SimpleNamespace(treatments=treatments)
+
+    pump.get_dataframe_for_period(start_date=datetime(2024, 7, 1, 16, tzinfo=timezone.utc),
+                                  end_date=datetime(2024, 7, 1, 20, tzinfo=timezone.utc),
+                                  padding=timedelta(hours=2))
+
+    assert treatments.queries[0]['timestamp'] == {'$gte': '2024-07-01T10:00:00Z',
+                                                  '$lte': '2024-07-01T16:00:00Z'}
+
+
+def test_all_treatment_queries_share_the_stored_bounds():
+    """get_treatments, exact windows and treatment tables query the same local wall-clock bounds."""
+    treatments = RecordingCollection()
+    pump = PumpDataAccess(db_conn=object(), timezone='US/Eastern')
+    pump.database = SimpleNamespace(treatments=treatments)
+    start = datetime(2024, 7, 1, 16, tzinfo=timezone.utc)
+    end = datetime(2024, 7, 1, 20, tzinfo=timezone.utc)
+
+    pump.get_treatments(start_date=start, end_date=end)
+    pump.get_dataframe_for_period(start_date=start, end_date=end)
+    pump.get_treatment_tables(['Temp Basal'], start_date=start, end_date=end)
+
+    bounds = {'$gte': '2024-07-01T12:00:00Z', '$lte': '2024-07-01T16:00:00Z'}
+    assert [query['timestamp'] for query in treatments.queries] == [bounds] * 3
+
+
+def test_treatment_fields_become_projections():
+    """Requested fields are projected on the server; period frames always get 'timestamp'."""
+    treatments = RecordingCollection()
+    pump = PumpDataAccess(db_conn=object())
+    pump.database = SimpleNamespace(treatments=treatments)
+
+    pump.get_treatments(fields=['eventType', 'insulin'])
+    pump.get_treatments()
+    pump.get_dataframe_for_period('last_24h', fields=['insulin', '_id'])
+    pump.get_dataframe_for_period('last_24h', fields=None)
+    pump.get_dataframe_for_period('last_24h')
+
+    assert treatments.projections[:4] == [
+        {'eventType': 1, 'insulin': 1, '_id': 0},
+        None,
+        {'timestamp': 1, 'insulin': 1, '_id': 1},
+        None,
+    ]
+    assert treatments.projections[4] == {**{field: 1 for field in DEFAULT_TREATMENT_FIELDS}, '_id': 0}
+
+
+def test_treatment_tables_split_one_query():
+    """Several event types come back from one query as compact typed tables."""
+    treatments = RecordingCollection([
+        {'timestamp': '2024-07-01T12:00:00Z', 'eventType': 'Correction Bolus', 'insulin': 2.5},
+        {'timestamp': '2024-07-01T11:00:00Z', 'eventType': 'Temp Basal', 'rate': 1.2,
+         'absolute': 1.2, 'duration': 30, 'temp': 'absolute'},
+        {'timestamp': '2024-07-01T10:00:00Z', 'eventType': 'Carb Correction', 'carbs': '45'},
+    ])
+    pump = PumpDataAccess(db_conn=object())
+    pump.database = SimpleNamespace(treatments=treatments)
+
+    tables = pump.get_treatment_tables(['Correction Bolus', 'Temp Basal', 'Carb Correction', 'Site Change'],
+                                       start_date=datetime(2024, 7, 1), end_date=datetime(2024, 7, 2))
+
+    assert len(treatments.queries) == 1
+    assert list(tables['Temp Basal'].columns) == ['timestamp', 'rate', 'absolute', 'duration', 'temp', 'dateTime']
+    assert tables['Carb Correction']['carbs'].dtype == 'float64'
+    assert tables['Carb Correction']['carbs'].iloc[0] == 45
+    assert tables['Correction Bolus']['insulin'].iloc[0] == 2.5
+    assert tables['Site Change'].empty
+
+
+def profile_doc(_id, start, basal):
+    return {
+        '_id': _id, 'startDate': start, 'defaultProfile': 'Default',
+        'store': {'Default': {'basal': [{'time': '00:00', 'value': basal}],
+                              'carbratio': [{'time': '00:00', 'value': 10}],
+                              'sens': [{'time': '00:00', 'value': 50}]},
+                  'Exercise': {'basal': [{'time': '00:00', 'value': 0.2}]}},
+    }
+
+
+def write_profiles(root, *profiles):
+    write_collection(root, 'profile', [profile_doc(*profile) for profile in profiles])
+    conn = LocalConnection(root)
+    assert conn.connect()
+    return conn.database.profile
+
+
+def profile_pump(profiles, **kwargs):
+    pump = PumpDataAccess(db_conn=SimpleNamespace(supports_aggregation=False), **kwargs)
+    pump.database = SimpleNamespace(profile=profiles)
+    return pump
+
+
+def test_profile_snapshot_revalidates_once_per_interval(tmp_path):
+    """Repeated lookups reuse the snapshot without querying within the interval."""
+    profiles = CountingCollection(write_profiles(tmp_path, ('a', '2024-01-01T00:00:00Z', 0.8)))
+    pump = profile_pump(profiles)
+
+    assert pump.get_basal_profile() == [{'time': '00:00', 'value': 0.8}]
+    snapshot = pump.get_profile_snapshot()
+    for _ in range(24):
+        assert pump.get_carb_ratio_profile()[0]['value'] == 10
+        assert pump.get_insulin_sensitivity_profile()[0]['value'] == 50
+    assert pump.get_profile_snapshot() is snapshot
+    assert profiles.queries == 1
+
+
+def test_profile_snapshot_reloads_only_on_new_version(tmp_path):
+    """Once the interval has passed, one small version check revalidates the schedules."""
+    profiles = CountingCollection(write_profiles(tmp_path, ('a', '2024-01-01T00:00:00Z', 0.8)))
+    pump = profile_pump(profiles, profile_check_interval=0)
+
+    snapshot = pump.get_profile_snapshot()
+    assert pump.get_profile_snapshot() is snapshot
+    assert profiles.queries == 2
+
+    profiles.collection = write_profiles(tmp_path, ('b', '2024-02-01T00:00:00Z', 1.1))
+    assert pump.get_profile_snapshot().schedules['basal'].value_at(datetime(2024, 2, 2)) == 1.1
+    assert pump.get_profile_snapshot().version == ('2024-02-01T00:00:00Z', 'b')
+
+
+def test_profile_caches_agree_on_tied_start_dates(tmp_path):
+    """Profiles stored with the same startDate resolve to the same newest version."""
+    profiles = CountingCollection(write_profiles(
+        tmp_path, ('b', '2024-01-01T00:00:00Z', 1.1), ('a', '2024-01-01T00:00:00Z', 0.8)))
+    pump = profile_pump(profiles, profile_check_interval=0)
+
+    timeline = pump.get_profile_timeline()
+    snapshot = pump.get_profile_snapshot()
+    assert pump._profile_timeline_version == snapshot.version == ('2024-01-01T00:00:00Z', 'b')
+
+    # Both caches stay valid: each call costs one version check, never a reload
+    profiles.queries = 0
+    assert pump.get_profile_timeline() is timeline
+    assert pump.get_profile_snapshot() is snapshot
+    assert profiles.queries == 2
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from sweetiepy.data.schedule import ProfileSchedule, ProfileTimeline
+
+
+BASAL_PROFILE = [
+    {'time': '00:00', 'value': 0.8, 'timeAsSeconds': 0},
+    {'time': '06:30', 'value': 1.1, 'timeAsSeconds': 23400},
+    {'time': '22:00:00', 'value': 0.9, 'timeAsSeconds': 79200},
+]
+
+
+def test_lookup_matches_time_of_day():
+    """Each timestamp gets the value of the segment it falls in."""
+    schedule = ProfileSchedule.from_entries(BASAL_PROFILE)
+    times = pd.Series(pd.to_datetime([
+        '2024-03-01 00:00:00', '2024-03-01 06:29:59', '2024-03-01 06:30:00',
+        '2024-03-01 21:59:59', '2024-03-01 22:00:00', '2024-03-02 23:59:59',
+    ], utc=True))
+
+    np.testing.assert_allclose(schedule.lookup(times), [0.8, 0.8, 1.1, 1.1, 0.9, 0.9])
+    assert schedule.value_at(times[2].to_pydatetime()) == 1.1
+
+
+def test_schedule_wraps_before_first_entry():
+    """Times before the first entry use the last entry of the previous day."""
+    schedule = ProfileSchedule.from_entries([
+        {'timeAsSeconds': 3600, 'value': 40},
+        {'time': '12:00', 'value': 50},
+    ])
+    np.testing.assert_allclose(schedule.lookup_seconds(np.array([0, 3599, 3600, 43200])),
+                               [50, 50, 40, 50])
+
+
+def test_empty_schedule():
+    """An empty profile yields NaN for columns and None for single lookups."""
+    schedule = ProfileSchedule.from_entries([])
+    times = pd.Series(pd.to_datetime(['2024-03-01 12:00'], utc=True))
+
+    assert not schedule
+    assert np.isnan(schedule.lookup(times)).all()
+    assert schedule.value_at(times[0].to_pydatetime()) is None
+
+
+def test_timeline_uses_profile_in_effect():
+    """Readings get the profile version active at their own timestamp."""
+    profiles = [
+        {'startDate': '2024-03-10T00:00:00.000Z', 'defaultProfile': 'Default',
+         'store': {'Default': {'basal': [{'time': '00:00', 'value': 1.0}],
+                               'sens': [{'time': '00:00', 'value': 45}]}}},
+        {'startDate': '2024-01-01T00:00:00.000Z', 'defaultProfile': 'Default',
+         'store': {'Default': {'basal': [{'time': '00:00', 'value': 0.5},
+                                         {'time': '12:00', 'value': 0.7}]}}},
+    ]
+    timeline = ProfileTimeline.from_profiles(profiles)
+    times = pd.Series(pd.to_datetime([
+        '2023-12-31 13:00', '2024-02-01 06:00', '2024-02-01 13:00', '2024-03-10 13:00',
+    ], utc=True))
+
+    assert len(timeline) == 2
+    np.testing.assert_allclose(timeline.lookup(times, 'basal'), [0.7, 0.5, 0.7, 1.0])
+    sens = timeline.lookup(times, 'sens')
+    assert np.isnan(sens[:3]).all() and sens[3] == 45
+    assert timeline.start_at(times)[3] == pd.Timestamp('2024-03-10', tz='UTC')
+    assert timeline.latest('basal').value_at(times[0].to_pydatetime()) == 1.0
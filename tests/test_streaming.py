@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from sweetiepy.connection.local import LocalConnection
+from sweetiepy.data.cgm import CGMDataAccess
+from sweetiepy.utils.benchmark import prepare_data
+
+
+@pytest.fixture
+def cgm(tmp_path):
+    with CGMDataAccess(db_conn=LocalConnection(prepare_data(tmp_path, days=2))) as cgm:
+        yield cgm
+
+
+def latest_day(cgm):
+    latest = datetime.fromtimestamp(cgm.get_recent_readings(1)[0]['date'] / 1000)
+    return latest - timedelta(days=1), latest
+
+
+def test_chunks_cover_the_period_in_date_order(cgm):
+    start, end = latest_day(cgm)
+
+    chunks = list(cgm.iter_dataframe_for_period('custom', start, end, chunk_size=100))
+    whole = cgm.get_dataframe_for_period('custom', start, end, clean_data=False)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) == 100 for chunk in chunks[:-1])
+    assert 0 < len(chunks[-1]) <= 100
+    streamed = pd.concat(chunks, ignore_index=True)
+    assert streamed['date'].is_monotonic_increasing
+    assert sorted(streamed['date']) == sorted(whole['date'])
+
+
+def test_chunk_size_is_validated_on_call():
+    cgm = CGMDataAccess(db_conn=LocalConnection('.'))
+
+    with pytest.raises(ValueError):
+        cgm.iter_readings(0, 1, chunk_size=0)
+    with pytest.raises(ValueError):
+        cgm.iter_dataframe_for_period('last_24h', chunk_size=-1)
+
+
+def test_cleaned_stream_prints_one_summary(cgm, capsys):
+    start, end = latest_day(cgm)
+    capsys.readouterr()
+
+    chunks = list(cgm.iter_readings(start, end, chunk_size=50, clean_data=True, fields=('direction',)))
+
+    output = capsys.readouterr().out
+    assert 'Cleaning DataFrame' not in output
+    assert output.count('Streamed') == 1
+    assert f"Streamed {sum(len(chunk) for chunk in chunks)} readings in {len(chunks)} chunks" in output
+    # Cleaning needs the date and sgv fields, so they are fetched too
+    assert {'direction', 'date', 'sgv', 'datetime', 'glucose_category'} <= set(chunks[0].columns)
+
+
+def test_invalid_period_streams_nothing(cgm, capsys):
+    assert list(cgm.iter_dataframe_for_period('custom')) == []
+    assert 'Invalid period_type' in capsys.readouterr().out
@@ -0,0 +1,48 @@
+from sweetiepy.connection.local import LocalConnection
+from sweetiepy.utils.synthetic import SyntheticNightscout, generate_patients
+
+
+def test_same_seed_gives_same_documents():
+    first = SyntheticNightscout(days=2, seed=3)
+    second = SyntheticNightscout(days=2, seed=3)
+    other = SyntheticNightscout(days=2, seed=4)
+
+    assert list(first.entries()) == list(second.entries())
+    assert list(first.treatments()) == list(second.treatments())
+    assert list(first.entries()) != list(other.entries())
+
+
+def test_treatment_timestamps_use_local_wall_clock():
+    # 2024-03-10 crosses the spring-forward DST transition in US/Eastern
+    data = SyntheticNightscout(days=1, start='2024-03-10', timezone='US/Eastern')
+    temp_basals = [t for t in data.treatments() if t['eventType'] == 'Temp Basal']
+    assert temp_basals[0]['timestamp'] == '2024-03-10T00:00:00Z'
+    assert not any(t['timestamp'].startswith('2024-03-10T02:') for t in temp_basals)
+
+    honest = SyntheticNightscout(days=1, start='2024-03-10', corrupt_timestamps=False)
+    assert next(honest.treatments())['timestamp'].endswith('Z')
+    assert [t for t in honest.treatments() if t['eventType'] == 'Temp Basal'][0]['timestamp'] \
+        == '2024-03-10T05:00:00Z'
+
+
+def test_entries_have_gaps_and_duplicates():
+    data = SyntheticNightscout(days=14, gaps_per_week=5, duplicate_rate=0.01)
+    dates = [e['date'] for e in data.entries()]
+
+    assert len(dates) < 14 * 288
+    assert len(set(dates)) < len(dates)
+
+
+def test_write_local_round_trip(tmp_path):
+    counts = SyntheticNightscout(days=1, seed=1).write_local(tmp_path)
+    conn = LocalConnection(tmp_path)
+    assert conn.connect()
+
+    for name, count in counts.items():
+        assert conn.database[name].count_documents({}) == count
+    assert conn.database['profile'].find_one()['store']['Default']['timezone'] == 'US/Eastern'
+
+
+def test_generate_patients_uses_distinct_seeds():
+    patients = generate_patients(3, seed=10, days=1)
+    assert [p.seed for p in patients] == [10, 11, 12]
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from sweetiepy.data.windows import add_trailing_treatment_totals
+
+
+def test_trailing_totals_match_brute_force():
+    """Prefix-sum totals equal a direct mask-and-sum over each window."""
+    rng = np.random.default_rng(7)
+    cgm = pd.DataFrame({'dateTime': pd.date_range('2024-03-01', periods=300, freq='5min', tz='UTC')})
+    treatment_times = pd.Timestamp('2024-02-29 20:00', tz='UTC') + pd.to_timedelta(
+        rng.integers(0, 30 * 3600, 80), unit='s')
+    treatments = pd.DataFrame({
+        'dateTime': treatment_times.tz_convert('US/Eastern'),
+        'insulin': np.where(rng.random(80) < 0.5, rng.random(80) * 3, np.nan),
+        'carbs': np.where(rng.random(80) < 0.3, rng.integers(5, 60, 80), np.nan),
+    })
+
+    result = add_trailing_treatment_totals(cgm.copy(), treatments, lookback_hours=[1, 4])
+
+    for hours in (1, 4):
+        for col in ('insulin', 'carbs'):
+            expected = [
+                treatments.loc[(treatments['dateTime'] >= t - pd.Timedelta(hours=hours))
+                               & (treatments['dateTime'] <= t), col].sum()
+                for t in cgm['dateTime']
+            ]
+            np.testing.assert_allclose(result[f'{col}_last_{hours}h'], expected)
+
+
+def test_missing_value_column_totals_zero():
+    """A treatment frame without carbs yields zero carb totals."""
+    cgm = pd.DataFrame({'dateTime': pd.date_range('2024-03-01', periods=3, freq='h', tz='UTC')})
+    treatments = pd.DataFrame({'dateTime': cgm['dateTime'], 'insulin': [1.0, 2.0, 3.0]})
+
+    result = add_trailing_treatment_totals(cgm, treatments, lookback_hours=4)
+
+    np.testing.assert_allclose(result['insulin_last_4h'], [1.0, 3.0, 6.0])
+    np.testing.assert_allclose(result['carbs_last_4h'], [0.0, 0.0, 0.0])